@@ -0,0 +1,296 @@
+import argparse
+import gzip
+import os
+import threading
+import time
+from datetime import date, timedelta
+from export import export_rows
+from query_registry import POSTGRES_QUERIES
+
+# user_activity is range partitioned by month on created_at, so inserts
+# always land in a small current partition and old months are dropped
+# whole instead of deleted row by row.
+MONTHS_AHEAD = 3
+RETENTION_MONTHS = 12
+MAINTENANCE_INTERVAL = 6 * 60 * 60
+ARCHIVE_DIR = 'activity_archive'
+DEFAULT_PARTITION = 'user_activity_default'
+LEGACY_PARTITION = 'user_activity_legacy'
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def add_months(day, months):
+    """First day of the month ``months`` after day's month"""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month):
+    return f'user_activity_p{month:%Y_%m}'
+
+
+def _transaction(manager, statements):
+    """Run (sql, params) pairs in one transaction on the manager's connection"""
+    with manager.conn.cursor() as cursor:
+        cursor.execute('BEGIN')
+        try:
+            for statement, params in statements:
+                cursor.execute(statement, params)
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        cursor.execute('COMMIT')
+
+
+def _execute(manager, statement, params=None):
+    """Run a statement; returns the affected row count"""
+    with manager.conn.cursor() as cursor:
+        cursor.execute(statement, params)
+        return cursor.rowcount
+
+
+def is_partitioned(manager):
+    rows = manager.execute_query("SELECT relkind FROM pg_class WHERE oid = to_regclass('user_activity')")
+    return bool(rows) and rows[0].relkind == 'p'
+
+
+def list_partitions(manager):
+    """(name, starts, ends, is_default, estimated_rows) rows, oldest first"""
+    return manager.execute_query(POSTGRES_QUERIES.sql('activity.partitions'))
+
+
+def install(manager, today=None):
+    """Convert user_activity into a partitioned table; safe to re-run
+
+    The existing table becomes the partition for everything before next
+    month, and new partitions follow it. Views over user_activity are
+    recreated so they read the partitioned table. Runs in one transaction
+    and holds an exclusive lock on user_activity while the old rows are
+    checked against the partition bound and indexed.
+    """
+    if not is_partitioned(manager):
+        boundary = add_months(month_start(today or date.today()), 1)
+        views = manager.execute_query("""
+            SELECT DISTINCT v.oid::regclass::text AS name, pg_get_viewdef(v.oid) AS definition
+            FROM pg_depend d
+            JOIN pg_rewrite r ON r.oid = d.objid
+            JOIN pg_class v ON v.oid = r.ev_class
+            WHERE d.refobjid = to_regclass('user_activity') AND v.relkind = 'v'
+        """)
+        foreign_keys = manager.execute_query("""
+            SELECT pg_get_constraintdef(oid) AS definition
+            FROM pg_constraint
+            WHERE conrelid = to_regclass('user_activity') AND contype = 'f'
+        """)
+        statements = [
+            (f"ALTER TABLE user_activity RENAME TO {LEGACY_PARTITION}", None),
+            (f"UPDATE {LEGACY_PARTITION} SET created_at = now() WHERE created_at IS NULL", None),
+            (f"ALTER TABLE {LEGACY_PARTITION} ALTER COLUMN created_at SET NOT NULL", None),
+            (f"""CREATE TABLE user_activity
+                     (LIKE {LEGACY_PARTITION} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)
+                 PARTITION BY RANGE (created_at)""", None),
+            # A partitioned table's primary key must include the partition key
+            ("ALTER TABLE user_activity ADD PRIMARY KEY (id, created_at)", None),
+            ("CREATE INDEX user_activity_user_created_idx ON user_activity (user_id, created_at)", None),
+            (f"""ALTER TABLE user_activity ATTACH PARTITION {LEGACY_PARTITION}
+                 FOR VALUES FROM (MINVALUE) TO ('{boundary}')""", None),
+            # Catches rows beyond the partitions made ahead, should
+            # maintenance stop running; ensure_partitions moves them out
+            (f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF user_activity DEFAULT", None),
+        ]
+        statements += [(f"ALTER TABLE user_activity ADD {fk.definition}", None) for fk in foreign_keys]
+        statements += [(f"CREATE OR REPLACE VIEW {view.name} AS {view.definition}", None)
+                       for view in views]
+        _transaction(manager, statements)
+        print(f"✅ user_activity partitioned; existing rows kept in {LEGACY_PARTITION}")
+
+    manager.execute_query("""
+        CREATE TABLE IF NOT EXISTS user_activity_daily (
+            user_id UUID NOT NULL,
+            day DATE NOT NULL,
+            activity_type VARCHAR(50) NOT NULL,
+            events INTEGER NOT NULL,
+            PRIMARY KEY (user_id, day, activity_type)
+        )
+    """)
+    return ensure_partitions(manager, today=today)
+
+
+def ensure_partitions(manager, months_ahead=MONTHS_AHEAD, today=None):
+    """Create monthly partitions through months_ahead months from now;
+    returns the names created
+
+    Partitions continue from the last one even when it ended before this
+    month, e.g. after maintenance stopped for a while: the months missed
+    get partitions too, and their rows move there out of the default
+    partition, which retention never drops.
+    """
+    partitions = list_partitions(manager)
+    ranged = [partition for partition in partitions if partition.ends]
+    current = month_start(today or date.today())
+    month = max(partition.ends for partition in ranged) if ranged else current
+    has_default = any(partition.is_default for partition in partitions)
+
+    created = []
+    while month <= add_months(current, months_ahead):
+        name, ends = partition_name(month), add_months(month, 1)
+        if has_default and manager.execute_query(
+                f"SELECT 1 FROM {DEFAULT_PARTITION} WHERE created_at >= %s AND created_at < %s LIMIT 1",
+                (month, ends)):
+            # A new partition may not overlap rows in the default one, so
+            # they move into it before it is attached, in one transaction
+            _transaction(manager, [
+                (f"CREATE TABLE {name} (LIKE user_activity INCLUDING DEFAULTS INCLUDING CONSTRAINTS)",
+                 None),
+                (f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+                 f"WHERE created_at >= %s AND created_at < %s RETURNING *) "
+                 f"INSERT INTO {name} SELECT * FROM moved", (month, ends)),
+                (f"ALTER TABLE user_activity ATTACH PARTITION {name} "
+                 f"FOR VALUES FROM ('{month}') TO ('{ends}')", None),
+            ])
+        else:
+            _execute(manager, f"CREATE TABLE {name} PARTITION OF user_activity "
+                              f"FOR VALUES FROM ('{month}') TO ('{ends}')")
+        created.append(name)
+        month = ends
+    return created
+
+
+def rollup(manager, until=None):
+    """Aggregate complete days of activity into user_activity_daily; returns
+    the number of (user, day, activity type) rows written"""
+    until = until or date.today()
+    watermark = manager.execute_query(POSTGRES_QUERIES.sql('activity.rollup_watermark'))[0].day
+    start = watermark + timedelta(days=1) if watermark else '-infinity'
+    if watermark and start >= until:
+        return 0
+    return _execute(manager, POSTGRES_QUERIES.sql('activity.rollup'), (start, until))
+
+
+def archive_partition(manager, name, archive_dir=ARCHIVE_DIR):
+    """Write a partition's rows to archive_dir/<name>.jsonl.gz; returns the path"""
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f'{name}.jsonl.gz')
+    temporary = path + '.tmp'
+    records = manager.iter_query(f"SELECT * FROM {name}", use_replica=False)
+    with gzip.open(temporary, 'wt', encoding='utf-8') as out:
+        export_rows(records, out)
+    os.replace(temporary, path)
+    return path
+
+
+def apply_retention(manager, retention_months=RETENTION_MONTHS, archive_dir=None, today=None):
+    """Detach and drop partitions older than retention_months, archiving them
+    first when archive_dir is given; returns the names dropped
+
+    Every complete day is rolled up first, so dropped activity stays
+    counted in user_activity_daily.
+    """
+    today = today or date.today()
+    rollup(manager, today)
+    cutoff = add_months(month_start(today), -retention_months)
+    dropped = []
+    for partition in list_partitions(manager):
+        if partition.is_default or not partition.ends or partition.ends > cutoff:
+            continue
+        _execute(manager, f"ALTER TABLE user_activity DETACH PARTITION {partition.name}")
+        if archive_dir:
+            print(f"Archived {partition.name} to {archive_partition(manager, partition.name, archive_dir)}")
+        _execute(manager, f"DROP TABLE {partition.name}")
+        dropped.append(partition.name)
+    return dropped
+
+
+def maintain(manager, months_ahead=MONTHS_AHEAD, retention_months=RETENTION_MONTHS,
+             archive_dir=None):
+    """Create partitions ahead, roll up activity and apply retention"""
+    created = ensure_partitions(manager, months_ahead)
+    dropped = apply_retention(manager, retention_months, archive_dir)
+    return {"success": True, "created": created, "dropped": dropped,
+            "message": f"Created {len(created)} and dropped {len(dropped)} activity partitions"}
+
+
+class ActivityMaintenance:
+    """Runs ``maintain`` every ``interval`` seconds
+
+    The manager should be one the maintenance thread has to itself: its
+    transactions run on the manager's connection.
+    """
+
+    def __init__(self, manager, interval=MAINTENANCE_INTERVAL, months_ahead=MONTHS_AHEAD,
+                 retention_months=RETENTION_MONTHS, archive_dir=None):
+        self.manager = manager
+        self.interval = interval
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.archive_dir = archive_dir
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        return maintain(self.manager, self.months_ahead, self.retention_months, self.archive_dir)
+
+    def start(self):
+        """Maintain periodically in a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='activity-maintenance',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                print(self.run_once()['message'])
+            except Exception as e:
+                print(f"Warning: activity maintenance failed: {e}")
+
+
+# Example usage: python activity_partitions.py install (needs the PostgreSQL sample database)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FarmConnect user_activity partitions")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('install', help="partition user_activity and create the rollup table")
+    commands.add_parser('list', help="list partitions")
+    maintain_parser = commands.add_parser('maintain', help="create, roll up and drop partitions")
+    schedule_parser = commands.add_parser('schedule', help="maintain periodically")
+    schedule_parser.add_argument('--interval', type=float, default=MAINTENANCE_INTERVAL)
+    for command_parser in (maintain_parser, schedule_parser):
+        command_parser.add_argument('--months-ahead', type=int, default=MONTHS_AHEAD)
+        command_parser.add_argument('--retention-months', type=int, default=RETENTION_MONTHS)
+        command_parser.add_argument('--archive-dir', help="export dropped partitions here first")
+    args = parser.parse_args()
+
+    from postgresql_manager import PostgreSQLFarmConnectManager
+    manager = PostgreSQLFarmConnectManager()
+    try:
+        if args.command == 'install':
+            print(f"Created partitions: {', '.join(install(manager)) or 'none'}")
+        elif args.command == 'list':
+            for partition in list_partitions(manager):
+                bounds = ('DEFAULT' if partition.is_default
+                          else f"{partition.starts or 'MINVALUE'} .. {partition.ends}")
+                print(f"{partition.name:<28} {bounds:<26} ~{partition.estimated_rows:,} rows")
+        elif args.command == 'maintain':
+            print(maintain(manager, args.months_ahead, args.retention_months, args.archive_dir)['message'])
+        else:
+            maintenance = ActivityMaintenance(manager, args.interval, args.months_ahead,
+                                              args.retention_months, args.archive_dir)
+            print(maintenance.run_once()['message'])
+            maintenance.start()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                maintenance.stop()
+    finally:
+        manager.disconnect()
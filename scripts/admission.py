@@ -0,0 +1,210 @@
+import math
+import threading
+import time
+from collections import Counter, OrderedDict, namedtuple
+
+# Limits for one class of routes. Rates are requests per second; the burst
+# is the bucket size. max_in_flight caps concurrent requests of this class
+# on top of the server-wide cap, queue_timeout is how long a request may
+# wait for a free slot before it is shed.
+RouteBudget = namedtuple('RouteBudget', [
+    'client_rate', 'client_burst', 'route_rate', 'route_burst',
+    'max_in_flight', 'queue_timeout',
+])
+
+DEFAULT_BUDGETS = {
+    'read': RouteBudget(20.0, 40, 500.0, 1000, None, 0.5),
+    'write': RouteBudget(5.0, 10, 100.0, 200, None, 0.5),
+    # Expensive routes get their own, tighter budgets
+    'signup': RouteBudget(0.2, 3, 10.0, 20, 4, 0.25),
+    'signin': RouteBudget(0.5, 5, 20.0, 40, 4, 0.25),
+    'search': RouteBudget(2.0, 5, 50.0, 100, 8, 0.25),
+    # Uploads hold a worker for as long as the client takes to send the
+    # body, so only a few may run at once
+    'upload': RouteBudget(0.5, 5, 20.0, 40, 4, 0.25),
+    # A page shows many images and browsers cache them, so media is cheap
+    'media': RouteBudget(50.0, 100, 2000.0, 4000, None, 0.5),
+}
+
+# Server-wide concurrency: requests beyond MAX_IN_FLIGHT wait in a queue of
+# at most QUEUE_SIZE; anything beyond that is shed immediately.
+MAX_IN_FLIGHT = 16
+QUEUE_SIZE = 32
+# Client buckets kept per route class; the least recently seen client is
+# forgotten first, so memory stays bounded under a scan of many addresses.
+MAX_TRACKED_CLIENTS = 10000
+
+
+def scale_budgets(budgets, share):
+    """Budgets for one of several processes that together get the full rates
+
+    Rates and bursts are multiplied by share (e.g. 1/4 for each of four
+    workers); a burst never drops below one request.
+    """
+    return {
+        route: budget._replace(
+            client_rate=budget.client_rate * share,
+            client_burst=max(1, round(budget.client_burst * share)),
+            route_rate=budget.route_rate * share,
+            route_burst=max(1, round(budget.route_burst * share)),
+        )
+        for route, budget in budgets.items()
+    }
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at ``rate`` tokens per second"""
+
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated')
+
+    def __init__(self, rate, capacity, now):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = now
+
+    def take(self, now):
+        """Take a token; returns 0 when allowed, else seconds until one is available"""
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class ClientBuckets:
+    """Per-client token buckets with least-recently-used eviction"""
+
+    def __init__(self, rate, capacity, max_clients=MAX_TRACKED_CLIENTS):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_clients = max_clients
+        self._buckets = OrderedDict()
+
+    def take(self, client, now):
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = TokenBucket(self.rate, self.capacity, now)
+            if len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+        return bucket.take(now)
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+class Admission:
+    """Outcome of ``AdmissionController.admit``
+
+    ``status`` is None when the request may proceed; the caller must then
+    call ``release()`` once it is done. Otherwise it is the HTTP status to
+    answer with (429 or 503) and ``retry_after`` is in whole seconds.
+    """
+
+    __slots__ = ('controller', 'route', 'status', 'retry_after', 'message')
+
+    def __init__(self, controller, route, status=None, retry_after=None, message=None):
+        self.controller = controller
+        self.route = route
+        self.status = status
+        self.retry_after = retry_after
+        self.message = message
+
+    @property
+    def admitted(self):
+        return self.status is None
+
+    def release(self):
+        if self.admitted:
+            self.controller._release(self.route)
+
+
+class AdmissionController:
+    """Rate limiting and load shedding in front of the request handlers
+
+    Every check is O(1) and done under one lock: a per-client and a
+    per-route token bucket, then a slot in the server-wide and per-route
+    in-flight limits, waiting in a short queue when they are full.
+    """
+
+    def __init__(self, budgets=None, max_in_flight=MAX_IN_FLIGHT, queue_size=QUEUE_SIZE,
+                 max_clients=MAX_TRACKED_CLIENTS):
+        self.budgets = dict(DEFAULT_BUDGETS if budgets is None else budgets)
+        self.max_in_flight = max_in_flight
+        self.queue_size = queue_size
+        now = time.monotonic()
+        self._client_buckets = {
+            route: ClientBuckets(budget.client_rate, budget.client_burst, max_clients)
+            for route, budget in self.budgets.items()
+        }
+        self._route_buckets = {
+            route: TokenBucket(budget.route_rate, budget.route_burst, now)
+            for route, budget in self.budgets.items()
+        }
+        self._lock = threading.Lock()
+        self._slot_freed = threading.Condition(self._lock)
+        self._in_flight = 0
+        self._route_in_flight = Counter()
+        self._queued = 0
+        self.stats = Counter()
+
+    def admit(self, client, route):
+        """Decide whether a request of ``route`` class from ``client`` runs now"""
+        budget = self.budgets.get(route) or self.budgets['read']
+        route = route if route in self.budgets else 'read'
+
+        with self._lock:
+            now = time.monotonic()
+            wait = self._client_buckets[route].take(client, now)
+            if wait:
+                return self._reject(route, 429, wait, "Too many requests, slow down")
+            wait = self._route_buckets[route].take(now)
+            if wait:
+                return self._reject(route, 429, wait, "This service is busy, try again shortly")
+
+            if not self._has_slot(route, budget):
+                if self._queued >= self.queue_size:
+                    return self._reject(route, 503, 1, "Server overloaded, try again shortly")
+                deadline = now + budget.queue_timeout
+                self._queued += 1
+                try:
+                    while not self._has_slot(route, budget):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            return self._reject(route, 503, 1, "Server overloaded, try again shortly")
+                        self._slot_freed.wait(remaining)
+                finally:
+                    self._queued -= 1
+
+            self._in_flight += 1
+            self._route_in_flight[route] += 1
+            self.stats['admitted.' + route] += 1
+            return Admission(self, route)
+
+    def _has_slot(self, route, budget):
+        if self._in_flight >= self.max_in_flight:
+            return False
+        return budget.max_in_flight is None or self._route_in_flight[route] < budget.max_in_flight
+
+    def _reject(self, route, status, retry_after, message):
+        self.stats[f'rejected_{status}.{route}'] += 1
+        return Admission(self, route, status, max(1, math.ceil(retry_after)), message)
+
+    def _release(self, route):
+        with self._lock:
+            self._in_flight -= 1
+            self._route_in_flight[route] -= 1
+            self._slot_freed.notify_all()
+
+    def snapshot(self):
+        """Counters and current load for /metrics"""
+        with self._lock:
+            return {
+                'in_flight': self._in_flight,
+                'queued': self._queued,
+                'tracked_clients': sum(len(buckets) for buckets in self._client_buckets.values()),
+                'counters': dict(self.stats),
+            }
@@ -0,0 +1,146 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+# Rows rewritten per UPDATE while copying a profile change onto a user's
+# posts and comments. Small batches keep each write transaction short so
+# feed writes are never stuck behind a prolific author's rename.
+SYNC_BATCH_SIZE = 500
+
+
+class AuthorSnapshotPropagator:
+    """Copies changed author display fields onto posts and comments in the background
+
+    ``sync`` is a manager's ``sync_author_snapshot(user_id, batch_size)``,
+    which rewrites at most ``batch_size`` stale rows and returns how many
+    it changed. Users are queued by ``enqueue`` and drained by a daemon
+    thread, one batch at a time.
+    """
+
+    def __init__(self, sync, batch_size=SYNC_BATCH_SIZE, pause=0.01):
+        self.sync = sync
+        self.batch_size = batch_size
+        self.pause = pause
+        self._pending = []
+        self._queued = set()
+        self._wakeup = threading.Condition()
+        self._thread = None
+        self._running = False
+
+    def enqueue(self, user_id):
+        """Schedule a user's snapshot refresh; repeated calls collapse"""
+        with self._wakeup:
+            if user_id not in self._queued:
+                self._queued.add(user_id)
+                self._pending.append(user_id)
+            self._wakeup.notify()
+        if self._thread is None:
+            # Not started: refresh inline so callers still see consistency
+            self.flush()
+
+    def start(self):
+        """Start the background propagation thread"""
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='author-snapshots', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Finish queued work and stop the background thread"""
+        thread = self._thread
+        if thread is None:
+            return
+        with self._wakeup:
+            self._running = False
+            self._wakeup.notify()
+        thread.join()
+        self._thread = None
+        self.flush()
+
+    def flush(self):
+        """Propagate every queued user on the calling thread"""
+        while True:
+            user_id = self._next_user(block=False)
+            if user_id is None:
+                return
+            self._propagate(user_id)
+
+    def _next_user(self, block):
+        with self._wakeup:
+            while block and not self._pending and self._running:
+                self._wakeup.wait()
+            if not self._pending:
+                return None
+            user_id = self._pending.pop(0)
+            self._queued.discard(user_id)
+            return user_id
+
+    def _run(self):
+        while self._running:
+            user_id = self._next_user(block=True)
+            if user_id is not None:
+                self._propagate(user_id)
+
+    def _propagate(self, user_id):
+        try:
+            while self.sync(user_id, self.batch_size) >= self.batch_size:
+                time.sleep(self.pause)
+        except Exception as e:
+            print(f"Warning: could not propagate author snapshot for user {user_id}: {e}")
+
+
+def benchmark(num_posts, num_users=10000, page_size=20, repeat=200):
+    """Compare feed reads joining users against denormalized author fields"""
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        PRAGMA journal_mode = OFF;
+        PRAGMA synchronous = OFF;
+        CREATE TABLE users (id INTEGER PRIMARY KEY, full_name TEXT, farming_experience TEXT);
+        CREATE TABLE posts (id INTEGER PRIMARY KEY, user_id INTEGER, title TEXT, category TEXT,
+                            created_at INTEGER, author_name TEXT, author_experience TEXT);
+    ''')
+    conn.executemany('INSERT INTO users VALUES (?, ?, ?)',
+                     ((i, f'Farmer {i}', 'experienced') for i in range(num_users)))
+    categories = ('crops', 'organic', 'weather', 'livestock', 'equipment')
+    conn.executemany('INSERT INTO posts VALUES (?, ?, ?, ?, ?, ?, ?)', (
+        (i, i % num_users, f'Post {i}', categories[i % len(categories)], i,
+         f'Farmer {i % num_users}', 'experienced')
+        for i in range(num_posts)
+    ))
+    conn.executescript('''
+        CREATE INDEX idx_posts_created_at ON posts (created_at);
+        CREATE INDEX idx_posts_category_created_at ON posts (category, created_at);
+    ''')
+    conn.commit()
+
+    queries = {
+        'join': '''
+            SELECT p.id, p.title, u.full_name, u.farming_experience
+            FROM posts p JOIN users u ON p.user_id = u.id
+            WHERE p.category = ? ORDER BY p.created_at DESC LIMIT ? OFFSET ?
+        ''',
+        'denormalized': '''
+            SELECT id, title, author_name, author_experience
+            FROM posts
+            WHERE category = ? ORDER BY created_at DESC LIMIT ? OFFSET ?
+        ''',
+    }
+    for name, query in queries.items():
+        started = time.perf_counter()
+        for i in range(repeat):
+            conn.execute(query, (categories[i % len(categories)], page_size,
+                                 (i % 50) * page_size)).fetchall()
+        elapsed = (time.perf_counter() - started) / repeat
+        print(f"{name:>13}: {elapsed * 1e6:8.1f} µs per feed page ({num_posts:,} posts)")
+    conn.close()
+    os.remove(path)
+
+
+# Example usage: python author_snapshots.py [num_posts]
+if __name__ == "__main__":
+    benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000)
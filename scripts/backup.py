@@ -0,0 +1,308 @@
+import argparse
+import gzip
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+BACKUP_DIR = 'backups'
+# Pages copied per backup step, and the pause between steps that leaves
+# the disk to the server. 1024 pages of 4 KB is 4 MB per step.
+PAGES_PER_STEP = 1024
+STEP_PAUSE = 0.005
+SNAPSHOT_INTERVAL = 3600
+KEEP_SNAPSHOTS = 24
+# Outside WAL mode every write from another connection restarts the copy;
+# after this many restarts the rest is copied in one step instead.
+MAX_RESTARTS = 10
+SNAPSHOT_SUFFIX = '.db.gz'
+
+
+def snapshot(db_path='farmconnect.db', backup_dir=BACKUP_DIR, pages=PAGES_PER_STEP,
+             pause=STEP_PAUSE, compress=True):
+    """Copy a live database to a timestamped file in backup_dir; returns its path
+
+    Uses the SQLite online backup API, a few pages at a time. In WAL mode
+    the copy is read from a snapshot held open for the whole backup, so it
+    is consistent and writers are never blocked; they only wait for the
+    step in progress in rollback-journal mode.
+    """
+    os.makedirs(backup_dir, exist_ok=True)
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    now = time.time()
+    stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(now)) + f'.{int(now % 1 * 1e6):06d}Z'
+    handle, copy_path = tempfile.mkstemp(suffix='.db', dir=backup_dir)
+    os.close(handle)
+
+    source = sqlite3.connect(db_path, isolation_level=None)
+    target = sqlite3.connect(copy_path)
+    try:
+        wal = source.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        if wal:
+            # Pin the snapshot: later commits do not restart the copy
+            source.execute('BEGIN')
+            source.execute('SELECT 1 FROM sqlite_master LIMIT 1').fetchall()
+
+        progress = _BackupProgress(pause)
+        try:
+            source.backup(target, pages=pages, progress=progress)
+        except _TooManyRestarts:
+            source.backup(target)
+        if wal:
+            source.execute('COMMIT')
+    except BaseException:
+        target.close()
+        os.remove(copy_path)
+        raise
+    finally:
+        source.close()
+    target.close()
+
+    if not compress:
+        path = os.path.join(backup_dir, f'{name}-{stamp}.db')
+        os.replace(copy_path, path)
+        return path
+
+    path = os.path.join(backup_dir, f'{name}-{stamp}{SNAPSHOT_SUFFIX}')
+    try:
+        with open(copy_path, 'rb') as src, gzip.open(path + '.tmp', 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(path + '.tmp', path)
+    finally:
+        os.remove(copy_path)
+    return path
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+class _BackupProgress:
+    """Backup progress callback: pauses between steps and counts restarts"""
+
+    def __init__(self, pause):
+        self.pause = pause
+        self.remaining = None
+        self.restarts = 0
+
+    def __call__(self, status, remaining, total):
+        if self.remaining is not None and remaining > self.remaining:
+            self.restarts += 1
+            if self.restarts > MAX_RESTARTS:
+                raise _TooManyRestarts()
+        self.remaining = remaining
+        if remaining and self.pause:
+            time.sleep(self.pause)
+
+
+def list_snapshots(backup_dir=BACKUP_DIR):
+    """Snapshot paths, oldest first"""
+    if not os.path.isdir(backup_dir):
+        return []
+    names = sorted(name for name in os.listdir(backup_dir)
+                   if name.endswith((SNAPSHOT_SUFFIX, '.db')) and not name.startswith('tmp'))
+    return [os.path.join(backup_dir, name) for name in names]
+
+
+def prune_snapshots(backup_dir=BACKUP_DIR, keep=KEEP_SNAPSHOTS):
+    """Delete all but the newest ``keep`` snapshots; returns the removed paths"""
+    snapshots = list_snapshots(backup_dir)
+    removed = snapshots[:max(0, len(snapshots) - keep)]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def verify(path):
+    """Run PRAGMA integrity_check on a database file; returns a list of problems"""
+    conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+    try:
+        problems = [row[0] for row in conn.execute('PRAGMA integrity_check')]
+    except sqlite3.DatabaseError as e:
+        return [str(e)]
+    finally:
+        conn.close()
+    return [] if problems == ['ok'] else problems
+
+
+def restore(snapshot_path, db_path='farmconnect.db', backup_dir=BACKUP_DIR):
+    """Replace a database's contents with a verified snapshot
+
+    The snapshot is decompressed next to the database and checked with
+    PRAGMA integrity_check first; nothing is touched if that fails. The
+    current database is snapshotted before it is overwritten, and the
+    contents are copied in through the backup API so that connections
+    still open on db_path see the restore like any other write.
+    """
+    handle, staged = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(handle)
+    try:
+        opener = gzip.open if snapshot_path.endswith('.gz') else open
+        with opener(snapshot_path, 'rb') as src, open(staged, 'wb') as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+
+        problems = verify(staged)
+        if problems:
+            return {"success": False,
+                    "message": f"Snapshot failed integrity check: {'; '.join(problems[:5])}"}
+
+        previous = snapshot(db_path, backup_dir) if os.path.exists(db_path) else None
+        source = sqlite3.connect(staged)
+        target = sqlite3.connect(db_path)
+        try:
+            source.backup(target)
+        finally:
+            source.close()
+            target.close()
+    except (OSError, sqlite3.Error) as e:
+        return {"success": False, "message": f"Error restoring snapshot: {str(e)}"}
+    finally:
+        os.remove(staged)
+
+    return {"success": True, "previous": previous,
+            "message": f"Restored {db_path} from {snapshot_path}"}
+
+
+class SnapshotScheduler:
+    """Takes a snapshot every ``interval`` seconds and prunes old ones"""
+
+    def __init__(self, db_path='farmconnect.db', backup_dir=BACKUP_DIR,
+                 interval=SNAPSHOT_INTERVAL, keep=KEEP_SNAPSHOTS):
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.interval = interval
+        self.keep = keep
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self):
+        path = snapshot(self.db_path, self.backup_dir)
+        prune_snapshots(self.backup_dir, self.keep)
+        return path
+
+    def start(self):
+        """Snapshot periodically in a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='snapshots', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                print(f"Snapshot written to {self.run_once()}")
+            except (OSError, sqlite3.Error) as e:
+                print(f"Warning: scheduled snapshot failed: {e}")
+
+
+def measure_write_latency(workdir, size_mb=2048, seconds=5.0, pages=PAGES_PER_STEP,
+                          pause=STEP_PAUSE):
+    """Time small commits to a size_mb database in workdir, idle for
+    seconds and then for the length of a snapshot; returns the idle and
+    during-backup latencies in seconds and how long the backup took"""
+    path = os.path.join(workdir, 'bench.db')
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('CREATE TABLE blobs (id INTEGER PRIMARY KEY, data BLOB)')
+    row = os.urandom(4000)
+    for _ in range(size_mb):
+        conn.executemany('INSERT INTO blobs (data) VALUES (?)', ((row,) for _ in range(256)))
+        conn.commit()
+    conn.close()
+
+    def write_latencies(stop):
+        writer = sqlite3.connect(path, timeout=30)
+        latencies = []
+        while not stop():
+            started = time.perf_counter()
+            writer.execute('INSERT INTO blobs (data) VALUES (?)', (b'x' * 200,))
+            writer.commit()
+            latencies.append(time.perf_counter() - started)
+            time.sleep(0.001)
+        writer.close()
+        return latencies
+
+    deadline = time.monotonic() + seconds
+    idle = write_latencies(lambda: time.monotonic() > deadline)
+
+    done = threading.Event()
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(latencies=write_latencies(done.is_set)))
+    thread.start()
+    started = time.perf_counter()
+    try:
+        snapshot(path, os.path.join(workdir, 'backups'), pages, pause, compress=False)
+    finally:
+        done.set()
+        thread.join()
+    return idle, result['latencies'], time.perf_counter() - started
+
+
+def percentile(latencies, q):
+    """The q quantile of latencies, e.g. q=0.5 for the median"""
+    latencies = sorted(latencies)
+    return latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+
+
+def benchmark(size_mb=2048, seconds=5.0, pages=PAGES_PER_STEP, pause=STEP_PAUSE):
+    """Compare commit latency with and without a backup running"""
+    workdir = tempfile.mkdtemp()
+    try:
+        idle, during, took = measure_write_latency(workdir, size_mb, seconds, pages, pause)
+    finally:
+        shutil.rmtree(workdir)
+    print(f"Backup of a {size_mb:,} MB database took {took:.1f} s")
+    for label, latencies in (('idle', idle), ('during backup', during)):
+        print(f"{label:>15}: {len(latencies):6,} writes, "
+              f"p50 {percentile(latencies, 0.5) * 1000:6.2f} ms, "
+              f"p99 {percentile(latencies, 0.99) * 1000:6.2f} ms, "
+              f"max {max(latencies) * 1000:7.2f} ms")
+
+
+# Example usage: python backup.py snapshot | list | restore PATH | schedule | bench
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FarmConnect database backups")
+    parser.add_argument('--db', default='farmconnect.db')
+    parser.add_argument('--dir', default=BACKUP_DIR)
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('snapshot', help="take one compressed snapshot")
+    commands.add_parser('list', help="list snapshots")
+    restore_parser = commands.add_parser('restore', help="verify and restore a snapshot")
+    restore_parser.add_argument('path')
+    schedule_parser = commands.add_parser('schedule', help="snapshot periodically")
+    schedule_parser.add_argument('--interval', type=float, default=SNAPSHOT_INTERVAL)
+    schedule_parser.add_argument('--keep', type=int, default=KEEP_SNAPSHOTS)
+    bench_parser = commands.add_parser('bench', help="write latency during a backup")
+    bench_parser.add_argument('--size-mb', type=int, default=2048)
+    bench_parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    if args.command == 'snapshot':
+        print(f"Snapshot written to {snapshot(args.db, args.dir)}")
+    elif args.command == 'list':
+        for path in list_snapshots(args.dir):
+            print(f"{path}  {os.path.getsize(path) / 2**20:,.1f} MB")
+    elif args.command == 'restore':
+        result = restore(args.path, args.db, args.dir)
+        print(result['message'])
+        sys.exit(0 if result['success'] else 1)
+    elif args.command == 'schedule':
+        scheduler = SnapshotScheduler(args.db, args.dir, args.interval, args.keep)
+        print(f"Snapshot written to {scheduler.run_once()}")
+        scheduler.start()
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            scheduler.stop()
+    elif args.command == 'bench':
+        benchmark(args.size_mb, args.seconds)
@@ -1,96 +1,28 @@
 import sqlite3
 import hashlib
 from datetime import datetime
+from migrations import migrate, sync_author_snapshots, sync_user_locations
 
-def create_database():
+def create_database(db_path='farmconnect.db'):
     """Create the database and tables for the farming community website"""
-    conn = sqlite3.connect('farmconnect.db')
-    cursor = conn.cursor()
-    
-    # Users table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            full_name TEXT NOT NULL,
-            email TEXT UNIQUE NOT NULL,
-            password_hash TEXT NOT NULL,
-            farming_experience TEXT NOT NULL,
-            farm_type TEXT NOT NULL,
-            location TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            is_mentor BOOLEAN DEFAULT FALSE,
-            profile_image TEXT DEFAULT NULL
-        )
-    ''')
-    
-    # Posts table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS posts (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            title TEXT NOT NULL,
-            content TEXT NOT NULL,
-            category TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            likes_count INTEGER DEFAULT 0,
-            comments_count INTEGER DEFAULT 0,
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Comments table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS comments (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            post_id INTEGER NOT NULL,
-            user_id INTEGER NOT NULL,
-            content TEXT NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (post_id) REFERENCES posts (id),
-            FOREIGN KEY (user_id) REFERENCES users (id)
-        )
-    ''')
-    
-    # Likes table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS likes (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            user_id INTEGER NOT NULL,
-            post_id INTEGER NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            UNIQUE(user_id, post_id),
-            FOREIGN KEY (user_id) REFERENCES users (id),
-            FOREIGN KEY (post_id) REFERENCES posts (id)
-        )
-    ''')
-    
-    # Mentorship table
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS mentorships (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            mentor_id INTEGER NOT NULL,
-            mentee_id INTEGER NOT NULL,
-            status TEXT DEFAULT 'pending',
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (mentor_id) REFERENCES users (id),
-            FOREIGN KEY (mentee_id) REFERENCES users (id)
-        )
-    ''')
-    
-    conn.commit()
-    conn.close()
+    migrate(db_path)
     print("Database and tables created successfully!")
 
 def hash_password(password):
     """Hash a password using SHA-256"""
     return hashlib.sha256(password.encode()).hexdigest()
 
-def seed_sample_data():
-    """Add sample data to the database"""
-    conn = sqlite3.connect('farmconnect.db')
+def seed_sample_data(db_path='farmconnect.db'):
+    """Add sample data to the database unless it already has users"""
+    conn = sqlite3.connect(db_path)
     cursor = conn.cursor()
     
+    cursor.execute('SELECT 1 FROM users LIMIT 1')
+    if cursor.fetchone():
+        conn.close()
+        print("Sample data already present, skipping")
+        return
+    
     # Sample users
     sample_users = [
         ('John Davis', 'john.davis@email.com', hash_password('password123'), 'experienced', 'organic', 'Iowa, USA', True),
@@ -117,6 +49,9 @@ def seed_sample_data():
         VALUES (?, ?, ?, ?)
     ''', sample_posts)
     
+    sync_user_locations(cursor)
+    sync_author_snapshots(cursor)
+    
     conn.commit()
     conn.close()
     print("Sample data added successfully!")
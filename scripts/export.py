@@ -0,0 +1,69 @@
+import argparse
+import csv
+import sys
+import rows
+from query_registry import ITER_BATCH_SIZE, SQLITE_QUERIES, iter_query
+
+TABLES = ('posts', 'comments', 'activity')
+
+
+def export_rows(records, out, fmt='jsonl'):
+    """Write named-tuple rows to a text stream as JSON lines or CSV; returns the row count
+
+    Rows are written as they arrive, so memory use does not grow with the
+    size of the export.
+    """
+    count = 0
+    if fmt == 'csv':
+        writer = csv.writer(out)
+        for record in records:
+            if count == 0:
+                writer.writerow(record._fields)
+            writer.writerow(record)
+            count += 1
+    else:
+        for record in records:
+            out.write(rows.dumps(record))
+            out.write('\n')
+            count += 1
+    return count
+
+
+def stream_table(table, db_path='farmconnect.db', postgres=None, batch_size=ITER_BATCH_SIZE):
+    """Rows of an export table from SQLite, or from Postgres given a manager"""
+    name = 'export.' + table
+    if postgres is not None:
+        return postgres.iter_named(name, batch_size=batch_size)
+    if name not in SQLITE_QUERIES:
+        raise ValueError(f"The SQLite database has no {table} table")
+    return iter_query(db_path, SQLITE_QUERIES.sql(name), batch_size=batch_size)
+
+
+# Example usage: python export.py posts --format csv --output posts.csv
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stream a FarmConnect table to JSON lines or CSV")
+    parser.add_argument('table', choices=TABLES)
+    parser.add_argument('--format', choices=('jsonl', 'csv'), default='jsonl')
+    parser.add_argument('--output', default='-', help="file to write, - for stdout")
+    parser.add_argument('--db', default='farmconnect.db')
+    parser.add_argument('--postgres', action='store_true',
+                        help="export from PostgreSQL instead of the SQLite database")
+    parser.add_argument('--batch-size', type=int, default=ITER_BATCH_SIZE)
+    args = parser.parse_args()
+
+    manager = None
+    if args.postgres:
+        from postgresql_manager import PostgreSQLFarmConnectManager
+        manager = PostgreSQLFarmConnectManager()
+    out = sys.stdout if args.output == '-' else open(args.output, 'w', newline='', encoding='utf-8')
+    try:
+        records = stream_table(args.table, args.db, manager, args.batch_size)
+        count = export_rows(records, out, args.format)
+    except ValueError as e:
+        sys.exit(str(e))
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if manager:
+            manager.disconnect()
+    print(f"Exported {count:,} {args.table} rows", file=sys.stderr)
@@ -0,0 +1,170 @@
+import math
+import threading
+from bisect import bisect_left, insort
+
+# Newest post ids kept per segment; a timeline is trimmed back to this
+# once it holds twice as many.
+MAX_TIMELINE = 1000
+# Authors and readers in the same REGION_DEGREES x REGION_DEGREES cell of
+# latitude and longitude share a region timeline (about 110 km at 1.0).
+REGION_DEGREES = 1.0
+SEED_POSTS = 20000
+CATCH_UP_INTERVAL = 1.0
+CATCH_UP_BATCH = 1000
+# Segment every post is fanned out to, read by visitors with no profile
+LATEST = ('latest', None)
+
+
+def region(latitude, longitude):
+    """Region key for coordinates, or None when they are unknown"""
+    if latitude is None or longitude is None:
+        return None
+    return f'{math.floor(latitude / REGION_DEGREES)}:{math.floor(longitude / REGION_DEGREES)}'
+
+
+def post_segments(category, farm_type, latitude, longitude):
+    """Timelines a post appears in, from its category and its author"""
+    segments = [('category', category), ('farm_type', farm_type),
+                ('region', region(latitude, longitude))]
+    return [LATEST] + [segment for segment in segments if segment[1] is not None]
+
+
+def reader_segments(farm_type, latitude, longitude, categories):
+    """Timelines merged into a reader's feed: farmers of the same type and
+    region, and the categories the reader subscribed to"""
+    segments = [('farm_type', farm_type), ('region', region(latitude, longitude))]
+    segments += [('category', category) for category in categories]
+    return [segment for segment in segments if segment[1] is not None] or [LATEST]
+
+
+class FeedStore:
+    """Precomputed per-segment timelines of post ids, fanned out on write
+
+    A new post is appended to its category's, its author's farm type's
+    and region's timelines. A feed page merges the newest ids of a few
+    timelines, so reading costs O(segments x page size) whatever the
+    size of the forum. Each timeline is an ascending list of post ids.
+
+    Posts are fanned out by tailing the posts table every
+    ``catch_up_interval`` seconds, a batch of posts per query, whichever
+    process wrote them; ``notify`` after a write catches up at once. A
+    post goes to at most four timelines however many readers its author
+    has, so fan-out costs the same for every account.
+    """
+
+    def __init__(self, fetch_since=None, max_timeline=MAX_TIMELINE,
+                 catch_up_interval=CATCH_UP_INTERVAL):
+        """fetch_since(after_id, limit) returns (id, category, farm_type,
+        latitude, longitude) rows of posts with larger ids, in id order"""
+        self.fetch_since = fetch_since
+        self.max_timeline = max_timeline
+        self.catch_up_interval = catch_up_interval
+        self._timelines = {}
+        self._last_seen = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, post_id, category, farm_type=None, latitude=None, longitude=None):
+        """Fan a post out to its timelines"""
+        with self._lock:
+            for segment in post_segments(category, farm_type, latitude, longitude):
+                timeline = self._timelines.setdefault(segment, [])
+                if not timeline or post_id > timeline[-1]:
+                    timeline.append(post_id)
+                else:
+                    position = bisect_left(timeline, post_id)
+                    if position < len(timeline) and timeline[position] == post_id:
+                        continue
+                    insort(timeline, post_id)
+                if len(timeline) > 2 * self.max_timeline:
+                    del timeline[:-self.max_timeline]
+
+    def seed(self, posts):
+        """Fan out (id, category, farm_type, latitude, longitude) rows, e.g.
+        the most recent posts at startup
+
+        Ids are grouped per segment and each timeline is merged once, which
+        is much cheaper than ``add`` per post for a startup's worth of rows.
+        """
+        # Posts with the same category and author go to the same segments
+        groups = {}
+        for row in posts:
+            groups.setdefault(tuple(row[1:]), []).append(row[0])
+        batches = {}
+        last_seen = self._last_seen
+        for fields, post_ids in groups.items():
+            for segment in post_segments(*fields):
+                batches.setdefault(segment, []).extend(post_ids)
+            last_seen = max(last_seen, max(post_ids))
+        with self._lock:
+            for segment, post_ids in batches.items():
+                timeline = sorted(set(post_ids).union(self._timelines.get(segment, ())))
+                if len(timeline) > 2 * self.max_timeline:
+                    del timeline[:-self.max_timeline]
+                self._timelines[segment] = timeline
+        self._last_seen = last_seen
+
+    def page(self, segments, limit=20, before=None):
+        """Newest post ids across segments, older than post id ``before``"""
+        candidates = set()
+        with self._lock:
+            for segment in segments:
+                timeline = self._timelines.get(segment)
+                if not timeline:
+                    continue
+                end = len(timeline) if before is None else bisect_left(timeline, before)
+                candidates.update(timeline[max(0, end - limit):end])
+        return sorted(candidates, reverse=True)[:limit]
+
+    def catch_up(self):
+        """Fan out posts committed since the last catch-up; returns how many"""
+        added = 0
+        while True:
+            posts = self.fetch_since(self._last_seen, CATCH_UP_BATCH)
+            self.seed(posts)
+            added += len(posts)
+            if len(posts) < CATCH_UP_BATCH:
+                return added
+
+    def notify(self):
+        """Catch up now instead of at the next interval, e.g. after a post
+        was written; returns at once"""
+        self._wakeup.set()
+
+    def start(self, warm=None):
+        """Catch up periodically in a background thread
+
+        warm() runs first in that thread, e.g. to ``seed`` the timelines,
+        so a server can accept requests while they fill.
+        """
+        if self._thread is None and self.fetch_since:
+            self._stop.clear()
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, args=(warm,), name='feed-catch-up',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self, warm):
+        if warm:
+            try:
+                warm()
+            except Exception as e:
+                print(f"Warning: could not seed feed timelines: {e}")
+        while not self._stop.is_set():
+            self._wakeup.wait(self.catch_up_interval)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                return
+            try:
+                self.catch_up()
+            except Exception as e:
+                print(f"Warning: could not catch up feed timelines: {e}")
@@ -1,5 +1,10 @@
-import sqlite3
+import json
+import time
+from collections import Counter
 from datetime import datetime
+from query_registry import SQLITE_QUERIES, connect
+from rows import PostRow, NearbyPostRow, CommentRow, row_factory
+from geo import bounding_box, spatial_index_name
 
 class ForumManager:
     def __init__(self, db_path='farmconnect.db'):
@@ -7,14 +12,14 @@ class ForumManager:
     
     def create_post(self, user_id, title, content, category):
         """Create a new forum post"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO posts (user_id, title, content, category)
-                VALUES (?, ?, ?, ?)
-            ''', (user_id, title, content, category))
+            cursor.execute(SQLITE_QUERIES.sql('forum.insert_post'), (title, content, category, user_id))
+            if cursor.rowcount == 0:
+                conn.close()
+                return {"success": False, "message": "User not found!"}
             
             conn.commit()
             post_id = cursor.lastrowid
@@ -27,111 +32,247 @@ class ForumManager:
             conn.close()
             return {"success": False, "message": f"Error creating post: {str(e)}"}
     
+    def set_post_image(self, user_id, post_id, image_url):
+        """Attach an uploaded image to one of the user's own posts"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(SQLITE_QUERIES.sql('forum.set_post_image'), (image_url, post_id, user_id))
+            updated = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if not updated:
+            return {"success": False, "message": "Post not found!"}
+        return {"success": True, "message": "Post image updated successfully!"}
+    
     def get_posts(self, category=None, limit=20, offset=0):
         """Get forum posts with optional category filter"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(PostRow)
         
         if category:
-            cursor.execute('''
-                SELECT p.id, p.title, p.content, p.category, p.created_at, p.likes_count, p.comments_count,
-                       u.full_name, u.farming_experience
-                FROM posts p
-                JOIN users u ON p.user_id = u.id
-                WHERE p.category = ?
-                ORDER BY p.created_at DESC
-                LIMIT ? OFFSET ?
-            ''', (category, limit, offset))
+            cursor.execute(SQLITE_QUERIES.sql('forum.posts_by_category'), (category, limit, offset))
         else:
-            cursor.execute('''
-                SELECT p.id, p.title, p.content, p.category, p.created_at, p.likes_count, p.comments_count,
-                       u.full_name, u.farming_experience
-                FROM posts p
-                JOIN users u ON p.user_id = u.id
-                ORDER BY p.created_at DESC
-                LIMIT ? OFFSET ?
-            ''', (limit, offset))
+            cursor.execute(SQLITE_QUERIES.sql('forum.posts'), (limit, offset))
         
         posts = cursor.fetchall()
         conn.close()
         
-        post_list = []
-        for post in posts:
-            post_list.append({
-                "id": post[0],
-                "title": post[1],
-                "content": post[2],
-                "category": post[3],
-                "created_at": post[4],
-                "likes_count": post[5],
-                "comments_count": post[6],
-                "author_name": post[7],
-                "author_experience": post[8]
-            })
-        
-        return {"success": True, "posts": post_list}
+        return {"success": True, "posts": posts}
     
-    def like_post(self, user_id, post_id):
-        """Like or unlike a post"""
-        conn = sqlite3.connect(self.db_path)
+    def get_posts_near(self, lat, lon, radius_km, category=None, limit=20, offset=0):
+        """Get forum posts whose authors are within radius_km of a point"""
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(NearbyPostRow)
         
-        # Check if user already liked this post
-        cursor.execute('''
-            SELECT id FROM likes WHERE user_id = ? AND post_id = ?
-        ''', (user_id, post_id))
+        params = bounding_box(lat, lon, radius_km)
+        params.update(lat=lat, lon=lon, radius_km=radius_km, category=category,
+                      limit=limit, offset=offset)
+        query = 'geo.posts_near_' + spatial_index_name(conn)
+        cursor.execute(SQLITE_QUERIES.sql(query), params)
         
-        existing_like = cursor.fetchone()
+        posts = cursor.fetchall()
+        conn.close()
         
-        if existing_like:
-            # Unlike the post
-            cursor.execute('''
-                DELETE FROM likes WHERE user_id = ? AND post_id = ?
-            ''', (user_id, post_id))
-            
-            cursor.execute('''
-                UPDATE posts SET likes_count = likes_count - 1 WHERE id = ?
-            ''', (post_id,))
-            
-            action = "unliked"
+        return {"success": True, "posts": posts}
+    
+    def get_posts_by_ids(self, post_ids):
+        """Get posts by id in one query, in the order of post_ids"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(PostRow)
+        
+        cursor.execute(SQLITE_QUERIES.sql('forum.posts_by_ids'), (json.dumps(list(post_ids)),))
+        found = {post.id: post for post in cursor.fetchall()}
+        conn.close()
+        
+        posts = [found[post_id] for post_id in post_ids if post_id in found]
+        return {"success": True, "posts": posts}
+    
+    def get_post(self, post_id):
+        """Get a single post with its comments"""
+        posts = self.get_posts_by_ids([post_id])['posts']
+        if not posts:
+            return {"success": False, "message": "Post not found!"}
+        return {"success": True, "post": posts[0], "comments": self.get_comments(post_id)['comments']}
+    
+    def add_unique_views(self, views, window):
+        """Count (post_id, viewer, seen_at) views whose viewer was not seen
+        on the post in the last window seconds, by any server process, in
+        one transaction; returns (post_id, category, views) of the posts
+        that gained views
+
+        Each step is one statement over the whole batch, passed as JSON.
+        """
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                counted = Counter(post_id for post_id, in conn.execute(
+                    SQLITE_QUERIES.sql('views.mark_seen'), (json.dumps(views), window)).fetchall())
+                conn.execute(SQLITE_QUERIES.sql('views.prune'), (time.time() - window,))
+                if not counted:
+                    return []
+                gained = conn.execute(SQLITE_QUERIES.sql('views.add'),
+                                      (json.dumps(list(counted.items())),)).fetchall()
+                return [(post_id, category, counted[post_id]) for post_id, category in gained]
+        finally:
+            conn.close()
+    
+    def add_trending_events(self, events):
+        """Append (post_id, event, category, at, count) rows to the shared
+        trending event log"""
+        recorded_at = time.time()
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                conn.executemany(SQLITE_QUERIES.sql('trending.append'),
+                                 [event + (recorded_at,) for event in events])
+        finally:
+            conn.close()
+    
+    def get_trending_events(self, after_id, limit=1000):
+        """Get (id, post_id, event, category, at, count) of logged trending
+        events after after_id, in id order"""
+        conn = connect(self.db_path)
+        try:
+            return conn.execute(SQLITE_QUERIES.sql('trending.since'), (after_id, limit)).fetchall()
+        finally:
+            conn.close()
+    
+    def get_last_trending_event(self):
+        """Id of the newest logged trending event, 0 when there is none"""
+        conn = connect(self.db_path)
+        try:
+            return conn.execute(SQLITE_QUERIES.sql('trending.last_event')).fetchone()[0]
+        finally:
+            conn.close()
+    
+    def prune_trending_events(self, before):
+        """Drop trending events logged before a time, in seconds"""
+        conn = connect(self.db_path)
+        try:
+            with conn:
+                conn.execute(SQLITE_QUERIES.sql('trending.prune'), (before,))
+        finally:
+            conn.close()
+    
+    def get_posts_for_ranking(self, limit=5000):
+        """Get (id, category, created_at, likes_count, comments_count) of
+        the most recent posts, used to warm the trending index"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(SQLITE_QUERIES.sql('forum.posts_for_ranking'), (limit,))
+        posts = cursor.fetchall()
+        conn.close()
+        return posts
+    
+    def get_feed_posts(self, after_id=None, limit=20000):
+        """Get (id, category, farm_type, latitude, longitude) of posts in id
+        order: the most recent limit, or those after after_id"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        if after_id is None:
+            cursor.execute(SQLITE_QUERIES.sql('feed.recent_posts'), (limit,))
         else:
-            # Like the post
-            cursor.execute('''
-                INSERT INTO likes (user_id, post_id) VALUES (?, ?)
-            ''', (user_id, post_id))
+            cursor.execute(SQLITE_QUERIES.sql('feed.posts_since'), (after_id, limit))
+        posts = cursor.fetchall()
+        conn.close()
+        return posts
+    
+    def get_feed_member(self, user_id):
+        """Get (farm_type, latitude, longitude, categories) deciding a user's
+        feed segments, or None for an unknown user"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.execute(SQLITE_QUERIES.sql('feed.member'), (user_id,))
+        member = cursor.fetchone()
+        if member is None:
+            conn.close()
+            return None
+        cursor.execute(SQLITE_QUERIES.sql('feed.subscriptions'), (user_id,))
+        categories = [row[0] for row in cursor.fetchall()]
+        conn.close()
+        return (*member, categories)
+    
+    def set_subscription(self, user_id, category, subscribed=True):
+        """Follow or unfollow a category in the user's home feed"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        
+        query = 'feed.subscribe' if subscribed else 'feed.unsubscribe'
+        try:
+            cursor.execute(SQLITE_QUERIES.sql(query), (user_id, category))
+            conn.commit()
+        finally:
+            conn.close()
+        
+        action = "subscribed" if subscribed else "unsubscribed"
+        return {"success": True, "action": action, "message": f"Successfully {action}!"}
+    
+    def like_post(self, user_id, post_id):
+        """Like or unlike a post"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            # Check if user already liked this post
+            cursor.execute(SQLITE_QUERIES.sql('forum.like_exists'), (user_id, post_id))
             
-            cursor.execute('''
-                UPDATE posts SET likes_count = likes_count + 1 WHERE id = ?
-            ''', (post_id,))
+            existing_like = cursor.fetchone()
             
-            action = "liked"
-        
-        conn.commit()
-        conn.close()
+            if existing_like:
+                # Unlike the post
+                cursor.execute(SQLITE_QUERIES.sql('forum.like_delete'), (user_id, post_id))
+                
+                cursor.execute(SQLITE_QUERIES.sql('forum.likes_decrement'), (post_id,))
+                post = cursor.fetchone()
+                
+                action = "unliked"
+                liked_at = existing_like[1]
+            else:
+                # Like the post
+                cursor.execute(SQLITE_QUERIES.sql('forum.like_insert'), (user_id, post_id))
+                
+                cursor.execute(SQLITE_QUERIES.sql('forum.likes_increment'), (post_id,))
+                post = cursor.fetchone()
+                
+                action = "liked"
+                liked_at = None
+            
+            conn.commit()
+        finally:
+            # Rolls back whatever a failed statement left open
+            conn.close()
         
-        return {"success": True, "action": action}
+        return {"success": True, "action": action, "category": post[0] if post else None,
+                "liked_at": liked_at}
     
     def add_comment(self, user_id, post_id, content):
         """Add a comment to a post"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                INSERT INTO comments (post_id, user_id, content)
-                VALUES (?, ?, ?)
-            ''', (post_id, user_id, content))
+            cursor.execute(SQLITE_QUERIES.sql('forum.comment_insert'), (post_id, content, user_id))
+            if cursor.rowcount == 0:
+                conn.close()
+                return {"success": False, "message": "User not found!"}
             
             # Update comment count
-            cursor.execute('''
-                UPDATE posts SET comments_count = comments_count + 1 WHERE id = ?
-            ''', (post_id,))
+            comment_id = cursor.lastrowid
+            cursor.execute(SQLITE_QUERIES.sql('forum.comments_increment'), (post_id,))
+            post = cursor.fetchone()
             
             conn.commit()
-            comment_id = cursor.lastrowid
             conn.close()
             
-            return {"success": True, "comment_id": comment_id, "message": "Comment added successfully!"}
+            return {"success": True, "comment_id": comment_id, "category": post[0] if post else None,
+                    "message": "Comment added successfully!"}
             
         except Exception as e:
             conn.close()
@@ -139,31 +280,16 @@ class ForumManager:
     
     def get_comments(self, post_id):
         """Get comments for a specific post"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(CommentRow)
         
-        cursor.execute('''
-            SELECT c.id, c.content, c.created_at, u.full_name, u.farming_experience
-            FROM comments c
-            JOIN users u ON c.user_id = u.id
-            WHERE c.post_id = ?
-            ORDER BY c.created_at ASC
-        ''', (post_id,))
+        cursor.execute(SQLITE_QUERIES.sql('forum.comments'), (post_id,))
         
         comments = cursor.fetchall()
         conn.close()
         
-        comment_list = []
-        for comment in comments:
-            comment_list.append({
-                "id": comment[0],
-                "content": comment[1],
-                "created_at": comment[2],
-                "author_name": comment[3],
-                "author_experience": comment[4]
-            })
-        
-        return {"success": True, "comments": comment_list}
+        return {"success": True, "comments": comments}
 
 # Example usage
 if __name__ == "__main__":
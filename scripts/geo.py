@@ -0,0 +1,158 @@
+import math
+import re
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+# Half the earth's circumference: no two points are further apart than this.
+MAX_DISTANCE_KM = math.pi * EARTH_RADIUS_KM
+
+# Offline gazetteer of approximate region centroids (lat, lon). Free-text
+# locations such as "Iowa, USA" are resolved against it at signup time so
+# nothing ever needs a network geocoder.
+GAZETTEER = {
+    # United States
+    'alabama': (32.8, -86.8), 'alaska': (61.4, -152.3), 'arizona': (34.2, -111.7),
+    'arkansas': (34.9, -92.4), 'california': (37.2, -119.5), 'colorado': (39.0, -105.5),
+    'connecticut': (41.6, -72.7), 'delaware': (39.0, -75.5), 'florida': (28.6, -82.4),
+    'georgia': (32.7, -83.4), 'hawaii': (20.8, -156.3), 'idaho': (44.4, -114.6),
+    'illinois': (40.0, -89.2), 'indiana': (39.9, -86.3), 'iowa': (42.1, -93.5),
+    'kansas': (38.5, -98.4), 'kentucky': (37.5, -85.3), 'louisiana': (31.1, -92.0),
+    'maine': (45.4, -69.2), 'maryland': (39.0, -76.8), 'massachusetts': (42.3, -71.8),
+    'michigan': (44.3, -85.4), 'minnesota': (46.3, -94.3), 'mississippi': (32.7, -89.7),
+    'missouri': (38.4, -92.5), 'montana': (47.0, -109.6), 'nebraska': (41.5, -99.8),
+    'nevada': (39.3, -116.6), 'new hampshire': (43.7, -71.6), 'new jersey': (40.2, -74.7),
+    'new mexico': (34.4, -106.1), 'new york': (42.9, -75.5), 'north carolina': (35.6, -79.4),
+    'north dakota': (47.5, -100.5), 'ohio': (40.3, -82.8), 'oklahoma': (35.6, -97.5),
+    'oregon': (43.9, -120.6), 'pennsylvania': (40.9, -77.8), 'rhode island': (41.7, -71.5),
+    'south carolina': (33.9, -80.9), 'south dakota': (44.4, -100.2), 'tennessee': (35.9, -86.4),
+    'texas': (31.5, -99.3), 'utah': (39.3, -111.7), 'vermont': (44.1, -72.7),
+    'virginia': (37.5, -78.9), 'washington': (47.4, -120.5), 'west virginia': (38.6, -80.6),
+    'wisconsin': (44.6, -89.9), 'wyoming': (43.0, -107.6), 'district of columbia': (38.9, -77.0),
+
+    # Canadian provinces
+    'alberta': (53.9, -116.6), 'british columbia': (53.7, -127.6), 'manitoba': (53.8, -98.8),
+    'nova scotia': (44.7, -63.7), 'ontario': (50.0, -85.0), 'quebec': (52.9, -73.5),
+    'saskatchewan': (52.9, -106.5),
+
+    # Countries
+    'united states': (39.8, -98.6), 'canada': (56.1, -106.3), 'mexico': (23.6, -102.6),
+    'brazil': (-14.2, -51.9), 'argentina': (-38.4, -63.6), 'united kingdom': (54.0, -2.0),
+    'ireland': (53.4, -8.2), 'france': (46.2, 2.2), 'germany': (51.2, 10.5),
+    'spain': (40.5, -3.7), 'italy': (41.9, 12.6), 'netherlands': (52.1, 5.3),
+    'india': (20.6, 79.0), 'china': (35.9, 104.2), 'japan': (36.2, 138.3),
+    'pakistan': (30.4, 69.3), 'bangladesh': (23.7, 90.4), 'philippines': (12.9, 121.8),
+    'indonesia': (-0.8, 113.9), 'vietnam': (14.1, 108.3), 'australia': (-25.3, 133.8),
+    'new zealand': (-40.9, 174.9), 'kenya': (0.0, 37.9), 'uganda': (1.4, 32.3),
+    'tanzania': (-6.4, 34.9), 'ethiopia': (9.1, 40.5), 'nigeria': (9.1, 8.7),
+    'ghana': (7.9, -1.0), 'south africa': (-30.6, 22.9), 'egypt': (26.8, 30.8),
+}
+
+ALIASES = {
+    'usa': 'united states', 'us': 'united states', 'u.s.': 'united states',
+    'u.s.a.': 'united states', 'united states of america': 'united states',
+    'america': 'united states', 'uk': 'united kingdom', 'u.k.': 'united kingdom',
+    'great britain': 'united kingdom', 'england': 'united kingdom',
+    'washington dc': 'district of columbia', 'washington d.c.': 'district of columbia',
+}
+
+# Two-letter state codes double as country codes ("DE" is Germany, "CO"
+# Colombia), so they are only trusted in a US context (see normalize_location)
+STATE_CODES = {
+    'al': 'alabama', 'ak': 'alaska', 'az': 'arizona', 'ar': 'arkansas', 'ca': 'california',
+    'co': 'colorado', 'ct': 'connecticut', 'de': 'delaware', 'fl': 'florida', 'ga': 'georgia',
+    'hi': 'hawaii', 'id': 'idaho', 'il': 'illinois', 'in': 'indiana', 'ia': 'iowa',
+    'ks': 'kansas', 'ky': 'kentucky', 'la': 'louisiana', 'me': 'maine', 'md': 'maryland',
+    'ma': 'massachusetts', 'mi': 'michigan', 'mn': 'minnesota', 'ms': 'mississippi',
+    'mo': 'missouri', 'mt': 'montana', 'ne': 'nebraska', 'nv': 'nevada', 'nh': 'new hampshire',
+    'nj': 'new jersey', 'nm': 'new mexico', 'ny': 'new york', 'nc': 'north carolina',
+    'nd': 'north dakota', 'oh': 'ohio', 'ok': 'oklahoma', 'or': 'oregon', 'pa': 'pennsylvania',
+    'ri': 'rhode island', 'sc': 'south carolina', 'sd': 'south dakota', 'tn': 'tennessee',
+    'tx': 'texas', 'ut': 'utah', 'vt': 'vermont', 'va': 'virginia', 'wa': 'washington',
+    'wv': 'west virginia', 'wi': 'wisconsin', 'wy': 'wyoming', 'dc': 'district of columbia',
+}
+
+
+def _name(part):
+    name = re.sub(r'\s+', ' ', part.strip().lower())
+    return ALIASES.get(name, name)
+
+
+def normalize_location(location):
+    """Resolve free-text like "Iowa, USA" to a (lat, lon) pair, or None.
+
+    Comma-separated parts are read most specific first and the first one
+    the gazetteer knows wins. A state code only counts when the other
+    parts are empty or include the United States: "Denver, CO, USA" is
+    Colorado, but "Bogota, CO" gives None rather than the wrong place.
+    """
+    if not location:
+        return None
+    names = [name for name in map(_name, location.split(',')) if name]
+    for position, name in enumerate(names):
+        if name in STATE_CODES:
+            rest = names[:position] + names[position + 1:]
+            if rest and 'united states' not in rest:
+                continue
+            name = STATE_CODES[name]
+        coordinates = GAZETTEER.get(name)
+        if coordinates:
+            return coordinates
+    return None
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance between two points in kilometres"""
+    if lat1 is None or lon1 is None or lat2 is None or lon2 is None:
+        return None
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(lat, lon, radius_km):
+    """Lat/lon box enclosing the circle of ``radius_km`` around a point.
+
+    Returns a dict of named SQL parameters (min_lat, max_lat, min_lon,
+    max_lon). Boxes touching a pole or the antimeridian widen to every
+    longitude so the index prefilter never drops a match.
+    """
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    min_lat, max_lat = lat - dlat, lat + dlat
+    cos_lat = math.cos(math.radians(lat))
+    if min_lat <= -90 or max_lat >= 90 or cos_lat <= 1e-9:
+        min_lon, max_lon = -180.0, 180.0
+    else:
+        dlon = radius_km / (KM_PER_DEGREE_LAT * cos_lat)
+        min_lon, max_lon = lon - dlon, lon + dlon
+        if min_lon < -180 or max_lon > 180:
+            min_lon, max_lon = -180.0, 180.0
+    return {
+        'min_lat': max(min_lat, -90.0),
+        'max_lat': min(max_lat, 90.0),
+        'min_lon': min_lon,
+        'max_lon': max_lon,
+    }
+
+
+def spatial_index_name(conn):
+    """Query-name suffix for the spatial index available on ``conn``.
+
+    ``rtree`` when the SQLite build has the R*Tree module and the
+    ``user_geo`` table exists, otherwise ``btree`` (the lat/lon index on
+    ``users``).
+    """
+    if getattr(conn, 'has_rtree', False):
+        return 'rtree'
+    found = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_geo'"
+    ).fetchone()
+    if not found:
+        # Not cached: the table may be created later by create_database.
+        return 'btree'
+    try:
+        conn.has_rtree = True
+    except AttributeError:
+        pass
+    return 'rtree'
@@ -0,0 +1,243 @@
+import argparse
+import select
+import threading
+import time
+from collections import OrderedDict
+from lazy_import import LazyModule
+
+psycopg2 = LazyModule('psycopg2')
+
+# Triggers publish "<entity>:<key>" payloads on CHANNEL after commit;
+# key ALL means every cached entry of the entity.
+CHANNEL = 'farmconnect_invalidate'
+ALL = '*'
+ENTITIES = ('feed', 'mentors', 'categories')
+# Counters such as likes_count change without a notification, so cached
+# feeds still expire; the rest only change through notified writes.
+FEED_TTL = 30.0
+MENTORS_TTL = 300.0
+MAX_CACHE_ENTRIES = 1024
+POLL_SECONDS = 1.0
+RECONNECT_SECONDS = 5.0
+# Detect a dead connection to the primary within about 30 seconds
+KEEPALIVES = {'keepalives': 1, 'keepalives_idle': 15, 'keepalives_interval': 5,
+              'keepalives_count': 3}
+
+TRIGGER_FUNCTION = f"""
+    CREATE OR REPLACE FUNCTION farmconnect_notify_invalidate() RETURNS trigger AS $$
+    DECLARE
+        mentor_changed BOOLEAN;
+    BEGIN
+        IF TG_TABLE_NAME = 'posts' THEN
+            IF TG_OP = 'DELETE' THEN
+                PERFORM pg_notify('{CHANNEL}', 'feed:' || COALESCE(
+                    (SELECT name FROM forum_categories WHERE id = OLD.category_id), '{ALL}'));
+            ELSE
+                PERFORM pg_notify('{CHANNEL}', 'feed:' || COALESCE(
+                    (SELECT name FROM forum_categories WHERE id = NEW.category_id), '{ALL}'));
+                IF TG_OP = 'UPDATE' THEN
+                    IF OLD.category_id IS DISTINCT FROM NEW.category_id THEN
+                        PERFORM pg_notify('{CHANNEL}', 'feed:' || COALESCE(
+                            (SELECT name FROM forum_categories WHERE id = OLD.category_id), '{ALL}'));
+                    END IF;
+                END IF;
+            END IF;
+        ELSIF TG_TABLE_NAME = 'forum_categories' THEN
+            PERFORM pg_notify('{CHANNEL}', 'categories:{ALL}');
+            PERFORM pg_notify('{CHANNEL}', 'feed:{ALL}');
+        ELSIF TG_TABLE_NAME = 'users' THEN
+            IF TG_OP = 'INSERT' THEN
+                mentor_changed := NEW.is_mentor;
+            ELSIF TG_OP = 'DELETE' THEN
+                mentor_changed := OLD.is_mentor;
+            ELSE
+                mentor_changed := OLD.is_mentor OR NEW.is_mentor;
+            END IF;
+            IF mentor_changed THEN
+                PERFORM pg_notify('{CHANNEL}', 'mentors:{ALL}');
+            END IF;
+        ELSE
+            PERFORM pg_notify('{CHANNEL}', 'mentors:{ALL}');
+        END IF;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# (table, events, level). Posts fire on the columns feeds show, not on
+# counter updates; users only on fields of the mentor list.
+TRIGGERS = [
+    ('posts', 'INSERT OR DELETE OR UPDATE OF title, content, tags, category_id, is_pinned, '
+              'is_archived, author_name, author_experience', 'ROW'),
+    ('forum_categories', 'INSERT OR UPDATE OR DELETE', 'STATEMENT'),
+    ('users', 'INSERT OR DELETE OR UPDATE OF full_name, farming_experience, farm_type, location, '
+              'is_mentor, bio', 'ROW'),
+    ('mentorships', 'INSERT OR UPDATE OR DELETE', 'STATEMENT'),
+]
+
+
+def install_triggers(manager):
+    """Create the triggers that publish changes on CHANNEL; safe to re-run"""
+    manager.execute_query(TRIGGER_FUNCTION)
+    for table, events, level in TRIGGERS:
+        manager.execute_query(f"DROP TRIGGER IF EXISTS farmconnect_invalidate ON {table}")
+        manager.execute_query(f"""
+            CREATE TRIGGER farmconnect_invalidate
+            AFTER {events} ON {table}
+            FOR EACH {level} EXECUTE FUNCTION farmconnect_notify_invalidate()
+        """)
+    print("✅ Cache invalidation triggers installed")
+
+
+def parse_payload(payload):
+    """(entity, key) from a notification payload, or None if malformed"""
+    entity, sep, key = payload.partition(':')
+    if not sep or entity not in ENTITIES:
+        return None
+    return entity, key
+
+
+class LocalCache:
+    """Bounded in-process cache of query results, dropped by entity and tag
+
+    Entries are only served while ``enabled``, i.e. while something keeps
+    them fresh. A result computed from a read that started before an
+    invalidation is not stored: pass the ``version`` read beforehand to
+    ``put``.
+    """
+
+    def __init__(self, max_entries=MAX_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.enabled = False
+        self.version = 0
+        self._entries = OrderedDict()  # (entity, key) -> (expires, tag, value)
+        self._lock = threading.Lock()
+
+    def get(self, entity, key):
+        """The cached value, or None on a miss"""
+        if not self.enabled:
+            return None
+        entry = self._entries.get((entity, key))
+        if entry is None or entry[0] < time.monotonic():
+            return None
+        return entry[2]
+
+    def put(self, entity, key, value, ttl, tag=None, version=None):
+        with self._lock:
+            if not self.enabled or (version is not None and version != self.version):
+                return
+            self._entries[(entity, key)] = (time.monotonic() + ttl, tag, value)
+            self._entries.move_to_end((entity, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, entity, tag=ALL):
+        """Drop the entity's entries with this tag, or all of them for ALL"""
+        with self._lock:
+            self.version += 1
+            stale = [cache_key for cache_key, (expires, entry_tag, value) in self._entries.items()
+                     if cache_key[0] == entity and (tag == ALL or entry_tag == tag)]
+            for cache_key in stale:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self.version += 1
+            self._entries.clear()
+
+
+class InvalidationListener:
+    """LISTENs on CHANNEL in a daemon thread on its own connection
+
+    Calls ``on_invalidate(entity, key)`` for each notification. Whenever
+    the listener is not connected, notifications may be missed, so
+    ``on_reset(listening)`` is called with False when the connection is
+    lost and with True once LISTEN is active again; callers flush their
+    caches and only cache while listening.
+    """
+
+    def __init__(self, connection_params, on_invalidate, on_reset, reconnect=RECONNECT_SECONDS):
+        self.connection_params = {**connection_params, **KEEPALIVES}
+        self.on_invalidate = on_invalidate
+        self.on_reset = on_reset
+        self.reconnect = reconnect
+        self.listening = False
+        self.received = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='invalidation-listener',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(**self.connection_params)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {CHANNEL}")
+                self._set_listening(True)
+                self._listen(conn)
+            except psycopg2.Error as e:
+                print(f"⚠️ Invalidation listener disconnected ({str(e).strip()}), "
+                      f"caching paused until it reconnects")
+            finally:
+                self._set_listening(False)
+                if conn is not None:
+                    conn.close()
+            self._stop.wait(self.reconnect)
+
+    def _listen(self, conn):
+        while not self._stop.is_set():
+            if select.select([conn], [], [], POLL_SECONDS) == ([], [], []):
+                continue
+            conn.poll()
+            while conn.notifies:
+                parsed = parse_payload(conn.notifies.pop(0).payload)
+                if parsed:
+                    self.received += 1
+                    self.on_invalidate(*parsed)
+
+    def _set_listening(self, listening):
+        if listening != self.listening:
+            self.listening = listening
+            self.on_reset(listening)
+
+
+# Example usage: python invalidation.py watch (needs the PostgreSQL sample database)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="FarmConnect cache invalidation over LISTEN/NOTIFY")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('install', help="create the notifying triggers")
+    commands.add_parser('watch', help="print invalidations as they arrive")
+    args = parser.parse_args()
+
+    from postgresql_manager import PostgreSQLFarmConnectManager
+    manager = PostgreSQLFarmConnectManager()
+    try:
+        if args.command == 'install':
+            install_triggers(manager)
+        else:
+            listener = InvalidationListener(
+                manager.connection_params,
+                lambda entity, key: print(f"invalidate {entity} {key}"),
+                lambda listening: print("listening" if listening else "not listening, flush all"))
+            listener.start()
+            try:
+                while True:
+                    time.sleep(3600)
+            except KeyboardInterrupt:
+                listener.stop()
+    finally:
+        manager.disconnect()
@@ -0,0 +1,33 @@
+import importlib
+
+
+class LazyModule:
+    """Module proxy that imports the real module on first attribute access
+
+    Keeps optional backends (psycopg2, bcrypt, Pillow) off the startup path
+    of processes that never use them.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def _load(self):
+        if self._module is None:
+            self._module = importlib.import_module(self._name)
+        return self._module
+
+    def available(self):
+        """Whether the module can be imported"""
+        try:
+            self._load()
+            return True
+        except ImportError:
+            return False
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self._module is not None else 'not loaded'
+        return f"<lazy module {self._name!r} ({state})>"
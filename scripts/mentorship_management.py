@@ -1,5 +1,7 @@
-import sqlite3
 from datetime import datetime
+from query_registry import SQLITE_QUERIES, connect
+from rows import MentorRow, NearbyMentorRow, MentorshipRequestRow, row_factory
+from geo import MAX_DISTANCE_KM, bounding_box, spatial_index_name
 
 class MentorshipManager:
     def __init__(self, db_path='farmconnect.db'):
@@ -7,15 +9,12 @@ class MentorshipManager:
     
     def request_mentorship(self, mentee_id, mentor_id):
         """Request mentorship from a mentor"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         try:
             # Check if request already exists
-            cursor.execute('''
-                SELECT id FROM mentorships 
-                WHERE mentor_id = ? AND mentee_id = ?
-            ''', (mentor_id, mentee_id))
+            cursor.execute(SQLITE_QUERIES.sql('mentorship.exists'), (mentor_id, mentee_id))
             
             existing_request = cursor.fetchone()
             
@@ -23,10 +22,7 @@ class MentorshipManager:
                 conn.close()
                 return {"success": False, "message": "Mentorship request already exists!"}
             
-            cursor.execute('''
-                INSERT INTO mentorships (mentor_id, mentee_id, status)
-                VALUES (?, ?, 'pending')
-            ''', (mentor_id, mentee_id))
+            cursor.execute(SQLITE_QUERIES.sql('mentorship.insert'), (mentor_id, mentee_id))
             
             conn.commit()
             request_id = cursor.lastrowid
@@ -40,50 +36,49 @@ class MentorshipManager:
     
     def get_available_mentors(self, specialty=None):
         """Get list of available mentors"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(MentorRow)
         
         if specialty:
-            cursor.execute('''
-                SELECT id, full_name, farming_experience, farm_type, location
-                FROM users 
-                WHERE is_mentor = 1 AND farm_type = ?
-                ORDER BY full_name
-            ''', (specialty,))
+            cursor.execute(SQLITE_QUERIES.sql('mentorship.mentors_by_specialty'), (specialty,))
         else:
-            cursor.execute('''
-                SELECT id, full_name, farming_experience, farm_type, location
-                FROM users 
-                WHERE is_mentor = 1
-                ORDER BY full_name
-            ''')
+            cursor.execute(SQLITE_QUERIES.sql('mentorship.mentors'))
         
         mentors = cursor.fetchall()
         conn.close()
         
-        mentor_list = []
-        for mentor in mentors:
-            mentor_list.append({
-                "id": mentor[0],
-                "full_name": mentor[1],
-                "farming_experience": mentor[2],
-                "specialty": mentor[3],
-                "location": mentor[4]
-            })
+        return {"success": True, "mentors": mentors}
+    
+    def get_mentors_near(self, lat, lon, radius_km=None, k=None, specialty=None):
+        """Get mentors within radius_km of a point, or the k nearest ones"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        cursor.row_factory = row_factory(NearbyMentorRow)
+        query = SQLITE_QUERIES.sql('geo.mentors_near_' + spatial_index_name(conn))
         
-        return {"success": True, "mentors": mentor_list}
+        # Without a radius, widen the search until k mentors are found
+        search_km = radius_km or 100
+        while True:
+            params = bounding_box(lat, lon, search_km)
+            params.update(lat=lat, lon=lon, radius_km=search_km, specialty=specialty,
+                          limit=k if k else -1)
+            cursor.execute(query, params)
+            mentors = cursor.fetchall()
+            if radius_km or (k and len(mentors) >= k) or search_km >= MAX_DISTANCE_KM:
+                break
+            search_km = min(search_km * 4, MAX_DISTANCE_KM)
+        conn.close()
+        
+        return {"success": True, "mentors": mentors}
     
     def accept_mentorship(self, mentor_id, mentee_id):
         """Accept a mentorship request"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         try:
-            cursor.execute('''
-                UPDATE mentorships 
-                SET status = 'accepted'
-                WHERE mentor_id = ? AND mentee_id = ? AND status = 'pending'
-            ''', (mentor_id, mentee_id))
+            cursor.execute(SQLITE_QUERIES.sql('mentorship.accept'), (mentor_id, mentee_id))
             
             if cursor.rowcount == 0:
                 conn.close()
@@ -100,32 +95,16 @@ class MentorshipManager:
     
     def get_mentorship_requests(self, mentor_id):
         """Get pending mentorship requests for a mentor"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
+        cursor.row_factory = row_factory(MentorshipRequestRow)
         
-        cursor.execute('''
-            SELECT m.id, m.created_at, u.full_name, u.farming_experience, u.farm_type, u.location
-            FROM mentorships m
-            JOIN users u ON m.mentee_id = u.id
-            WHERE m.mentor_id = ? AND m.status = 'pending'
-            ORDER BY m.created_at DESC
-        ''', (mentor_id,))
+        cursor.execute(SQLITE_QUERIES.sql('mentorship.requests'), (mentor_id,))
         
         requests = cursor.fetchall()
         conn.close()
         
-        request_list = []
-        for request in requests:
-            request_list.append({
-                "id": request[0],
-                "created_at": request[1],
-                "mentee_name": request[2],
-                "mentee_experience": request[3],
-                "mentee_farm_type": request[4],
-                "mentee_location": request[5]
-            })
-        
-        return {"success": True, "requests": request_list}
+        return {"success": True, "requests": requests}
 
 # Example usage
 if __name__ == "__main__":
@@ -0,0 +1,274 @@
+import sqlite3
+from geo import normalize_location
+
+
+def add_column_if_missing(cursor, table, column, definition):
+    """Add a column to an existing table unless it is already there"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in [row[1] for row in cursor.fetchall()]:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+
+def sync_user_locations(cursor):
+    """Geocode users without coordinates and refresh the spatial index"""
+    cursor.execute('SELECT id, location FROM users WHERE latitude IS NULL')
+    updates = []
+    for user_id, location in cursor.fetchall():
+        coordinates = normalize_location(location)
+        if coordinates:
+            updates.append((coordinates[0], coordinates[1], user_id))
+    cursor.executemany('UPDATE users SET latitude = ?, longitude = ? WHERE id = ?', updates)
+
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'user_geo'")
+    if cursor.fetchone():
+        cursor.execute('''
+            INSERT OR REPLACE INTO user_geo (id, min_lat, max_lat, min_lon, max_lon)
+            SELECT id, latitude, latitude, longitude, longitude
+            FROM users
+            WHERE latitude IS NOT NULL
+        ''')
+
+
+def sync_author_snapshots(cursor):
+    """Fill in author fields on posts and comments written without them"""
+    for table in ('posts', 'comments'):
+        cursor.execute(f'''
+            UPDATE {table}
+            SET author_name = (SELECT full_name FROM users WHERE users.id = {table}.user_id),
+                author_experience = (SELECT farming_experience FROM users WHERE users.id = {table}.user_id)
+            WHERE author_name IS NULL
+        ''')
+
+
+def initial_schema(cursor):
+    """Users, posts, comments, likes and mentorships"""
+    # Users table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            full_name TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            farming_experience TEXT NOT NULL,
+            farm_type TEXT NOT NULL,
+            location TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            is_mentor BOOLEAN DEFAULT FALSE,
+            profile_image TEXT DEFAULT NULL
+        )
+    ''')
+
+    # Posts table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS posts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            content TEXT NOT NULL,
+            category TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            likes_count INTEGER DEFAULT 0,
+            comments_count INTEGER DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Comments table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS comments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL,
+            user_id INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (post_id) REFERENCES posts (id),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+    # Likes table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS likes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            post_id INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE(user_id, post_id),
+            FOREIGN KEY (user_id) REFERENCES users (id),
+            FOREIGN KEY (post_id) REFERENCES posts (id)
+        )
+    ''')
+
+    # Mentorship table
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mentorships (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mentor_id INTEGER NOT NULL,
+            mentee_id INTEGER NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (mentor_id) REFERENCES users (id),
+            FOREIGN KEY (mentee_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def user_locations(cursor):
+    """User coordinates and the spatial index for location search"""
+    add_column_if_missing(cursor, 'users', 'latitude', 'REAL DEFAULT NULL')
+    add_column_if_missing(cursor, 'users', 'longitude', 'REAL DEFAULT NULL')
+
+    # R*Tree where the SQLite build has it, plus a plain lat/lon index used
+    # as the fallback
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_users_lat_lon ON users (latitude, longitude)
+    ''')
+    try:
+        cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS user_geo USING rtree (
+                id, min_lat, max_lat, min_lon, max_lon
+            )
+        ''')
+    except sqlite3.OperationalError:
+        print("SQLite R*Tree module unavailable, using lat/lon index for location search")
+
+    sync_user_locations(cursor)
+
+
+def author_snapshots(cursor):
+    """Author display fields on posts and comments, and feed indexes"""
+    for table in ('posts', 'comments'):
+        add_column_if_missing(cursor, table, 'author_name', 'TEXT')
+        add_column_if_missing(cursor, table, 'author_experience', 'TEXT')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts (created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_category_created_at ON posts (category, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_posts_user_id ON posts (user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments (post_id, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_comments_user_id ON comments (user_id)')
+
+    sync_author_snapshots(cursor)
+
+
+def post_images(cursor):
+    """Image URL on posts; uploaded files live in the media store"""
+    add_column_if_missing(cursor, 'posts', 'image_url', 'TEXT DEFAULT NULL')
+
+
+def post_views(cursor):
+    """View counts on posts, written in batches by views.ViewCounter"""
+    add_column_if_missing(cursor, 'posts', 'views_count', 'INTEGER DEFAULT 0')
+
+
+def category_subscriptions(cursor):
+    """Forum categories a user follows in their home feed"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS category_subscriptions (
+            user_id INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, category),
+            FOREIGN KEY (user_id) REFERENCES users (id)
+        )
+    ''')
+
+
+def shared_rankings(cursor):
+    """Trending interactions and recent post viewers, shared by every
+    server process (trending.py, views.py)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS trending_events (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            post_id INTEGER NOT NULL,
+            event TEXT NOT NULL,
+            category TEXT,
+            at REAL NOT NULL,
+            count INTEGER NOT NULL DEFAULT 1,
+            recorded_at REAL NOT NULL
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS trending_events_recorded_idx ON trending_events (recorded_at)')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS post_viewers (
+            post_id INTEGER NOT NULL,
+            viewer TEXT NOT NULL,
+            seen_at REAL NOT NULL,
+            PRIMARY KEY (post_id, viewer)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS post_viewers_seen_idx ON post_viewers (seen_at)')
+
+
+# Append only: a migration's version is recorded in schema_version once it
+# has run and it is never run again. Every step tolerates databases that
+# were created before versioning by the old create_database().
+MIGRATIONS = [
+    (1, 'initial schema', initial_schema),
+    (2, 'user locations', user_locations),
+    (3, 'author snapshots', author_snapshots),
+    (4, 'post images', post_images),
+    (5, 'post views', post_views),
+    (6, 'category subscriptions', category_subscriptions),
+    (7, 'shared rankings', shared_rankings),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def schema_version(conn):
+    """Version of the newest applied migration, 0 for a fresh database"""
+    try:
+        return conn.execute('SELECT MAX(version) FROM schema_version').fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def migrate(db_path='farmconnect.db'):
+    """Bring the database schema up to date; returns the versions applied
+
+    When the schema is already current this is a single version query
+    after the journal mode check.
+    """
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        # WAL lets readers, and online backups, run alongside writers. The
+        # mode is stored in the database file, so this is a no-op once set.
+        conn.execute('PRAGMA journal_mode = WAL')
+        if schema_version(conn) >= LATEST_VERSION:
+            return []
+
+        # Take the write lock before re-reading the version so concurrent
+        # server processes never apply the same migration twice.
+        cursor = conn.cursor()
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS schema_version (
+                    version INTEGER PRIMARY KEY,
+                    name TEXT NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            ''')
+            current = schema_version(conn)
+            applied = []
+            for version, name, step in MIGRATIONS:
+                if version <= current:
+                    continue
+                step(cursor)
+                cursor.execute('INSERT INTO schema_version (version, name) VALUES (?, ?)',
+                               (version, name))
+                applied.append(version)
+                print(f"Applied migration {version}: {name}")
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        return applied
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    applied = migrate()
+    print(f"Database schema is at version {LATEST_VERSION}"
+          + (f" (applied {len(applied)} migrations)" if applied else ""))
@@ -1,10 +1,52 @@
-import psycopg2
-from psycopg2.extras import RealDictCursor
-import bcrypt
 import uuid
+import itertools
+import threading
+import time
 from datetime import datetime, timedelta
 import json
-from typing import Dict, List, Optional, Any
+from typing import Dict, Iterator, List, Optional, Any
+from query_registry import ITER_BATCH_SIZE, POSTGRES_QUERIES
+from rows import SignedInUserRow
+from invalidation import ALL, FEED_TTL, MENTORS_TTL, InvalidationListener, LocalCache
+from lazy_import import LazyModule
+
+# Imported on first use so processes that never talk to Postgres start fast
+psycopg2 = LazyModule('psycopg2')
+psycopg2_extras = LazyModule('psycopg2.extras')
+bcrypt = LazyModule('bcrypt')
+
+# How often a replica's replication lag is re-checked, and how long a
+# failed or lagging replica is skipped before it is tried again.
+REPLICA_LAG_CHECK_SECONDS = 5.0
+REPLICA_RETRY_SECONDS = 30.0
+# Upper bound on users remembered for read-your-writes stickiness.
+MAX_STICKY_USERS = 10000
+
+class ReplicaEndpoint:
+    """A read replica connection and its health"""
+    
+    def __init__(self, connection_params: Dict):
+        self.connection_params = connection_params
+        self.conn = None
+        self.retry_at = 0.0
+        self.lag_checked_at = 0.0
+        self.lag_seconds = 0.0
+    
+    @property
+    def name(self) -> str:
+        return f"{self.connection_params['host']}:{self.connection_params['port']}"
+    
+    def mark_down(self, reason: str):
+        """Stop routing reads here until the retry interval has passed"""
+        print(f"⚠️ Replica {self.name} unavailable ({reason}), reading from primary")
+        self.retry_at = time.monotonic() + REPLICA_RETRY_SECONDS
+        if self.conn:
+            POSTGRES_QUERIES.forget(self.conn)
+            try:
+                self.conn.close()
+            except psycopg2.Error:
+                pass
+            self.conn = None
 
 class PostgreSQLFarmConnectManager:
     def __init__(self, 
@@ -12,8 +54,18 @@ class PostgreSQLFarmConnectManager:
                  database: str = "farmconnect", 
                  user: str = "postgres", 
                  password: str = "kish10",
-                 port: int = 5432):
-        """Initialize PostgreSQL connection"""
+                 port: int = 5432,
+                 replicas: List[Dict] = None,
+                 max_replica_lag: float = 5.0,
+                 sticky_seconds: float = 10.0):
+        """Initialize PostgreSQL connection
+        
+        replicas is a list of connection parameter overrides for read
+        replicas, e.g. [{'host': 'replica1'}]; missing keys are taken from
+        the primary. Reads go to a replica unless it lags by more than
+        max_replica_lag seconds, fails, or the reading user wrote within
+        the last sticky_seconds.
+        """
         self.connection_params = {
             'host': host,
             'database': database,
@@ -21,37 +73,212 @@ class PostgreSQLFarmConnectManager:
             'password': password,
             'port': port
         }
+        self.replicas = [ReplicaEndpoint({**self.connection_params, **replica})
+                         for replica in replicas or []]
+        self.max_replica_lag = max_replica_lag
+        self.sticky_seconds = sticky_seconds
+        self._next_replica = itertools.count()
+        self._recent_writes = {}
+        self._routing_lock = threading.Lock()
+        self._category_ids = {}
+        # Feeds and mentor lists; only used once listen_for_invalidations()
+        # keeps it in step with writes from every process
+        self.cache = LocalCache()
+        self.listener = None
         self.conn = None
         self.connect()
     
     def connect(self):
         """Establish database connection"""
         try:
+            if self.conn:
+                POSTGRES_QUERIES.forget(self.conn)
             self.conn = psycopg2.connect(**self.connection_params)
             self.conn.autocommit = True
             print("✅ Connected to PostgreSQL database successfully!")
         except psycopg2.Error as e:
             print(f"❌ Error connecting to PostgreSQL: {e}")
             raise
+        
+        for replica in self.replicas:
+            self.connect_replica(replica)
+    
+    def connect_replica(self, replica: ReplicaEndpoint) -> bool:
+        """Open a replica connection; a failure only disables the replica"""
+        try:
+            replica.conn = psycopg2.connect(**replica.connection_params)
+            replica.conn.autocommit = True
+            replica.lag_checked_at = 0.0
+            print(f"✅ Connected to PostgreSQL replica {replica.name}")
+            return True
+        except psycopg2.Error as e:
+            replica.mark_down(str(e).strip())
+            return False
     
     def disconnect(self):
         """Close database connection"""
+        if self.listener:
+            self.listener.stop()
+            self.listener = None
+        for replica in self.replicas:
+            if replica.conn:
+                POSTGRES_QUERIES.forget(replica.conn)
+                replica.conn.close()
+                replica.conn = None
         if self.conn:
+            POSTGRES_QUERIES.forget(self.conn)
             self.conn.close()
             print("🔒 Database connection closed")
     
-    def execute_query(self, query: str, params: tuple = None) -> List[Dict]:
-        """Execute a query and return results"""
+    def execute_query(self, query: str, params: tuple = None, conn=None) -> List[tuple]:
+        """Execute a query and return results as named-tuple rows"""
         try:
-            with self.conn.cursor(cursor_factory=RealDictCursor) as cursor:
+            with (conn or self.conn).cursor(cursor_factory=psycopg2_extras.NamedTupleCursor) as cursor:
                 cursor.execute(query, params)
                 if cursor.description:
-                    return [dict(row) for row in cursor.fetchall()]
+                    return cursor.fetchall()
                 return []
         except psycopg2.Error as e:
             print(f"❌ Database error: {e}")
             raise
     
+    def execute_named(self, name: str, params: tuple = (), conn=None) -> List[tuple]:
+        """Execute a registry query as a server-side prepared statement"""
+        conn = conn or self.conn
+        statement = POSTGRES_QUERIES.prepare(conn, name)
+        return self.execute_query(statement, params or None, conn)
+    
+    def execute_read(self, name: str, params: tuple = (), user_id: str = None) -> List[tuple]:
+        """Execute a read-only registry query on a replica when possible
+        
+        Falls back to the primary when no replica is usable, when the
+        replica fails mid-query, or when user_id wrote recently.
+        """
+        replica = self.read_replica(user_id)
+        if replica:
+            try:
+                return self.execute_named(name, params, replica.conn)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+                replica.mark_down(str(e).strip())
+        return self.execute_named(name, params)
+    
+    def iter_query(self, query: str, params: tuple = None, batch_size: int = ITER_BATCH_SIZE,
+                   use_replica: bool = True) -> Iterator[tuple]:
+        """Yield the rows of a large read-only query, batch_size per round trip
+        
+        Rows come from a server-side (named) cursor, so memory stays
+        constant whatever the table size. The cursor lives on its own
+        read-only connection, on a replica when one is usable: a named
+        cursor needs an open transaction, which must not swallow writes
+        made on the shared autocommit connection while the caller iterates.
+        """
+        replica = self.read_replica() if use_replica else None
+        params_for = replica.connection_params if replica else self.connection_params
+        try:
+            conn = psycopg2.connect(**params_for)
+        except psycopg2.OperationalError as e:
+            if not replica:
+                raise
+            replica.mark_down(str(e).strip())
+            conn = psycopg2.connect(**self.connection_params)
+        
+        try:
+            conn.set_session(readonly=True)
+            with conn.cursor(name=f'fc_iter_{uuid.uuid4().hex}',
+                             cursor_factory=psycopg2_extras.NamedTupleCursor) as cursor:
+                cursor.itersize = batch_size
+                cursor.execute(query, params)
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        return
+                    yield from batch
+        finally:
+            # Closing discards the read-only transaction
+            conn.close()
+    
+    def iter_named(self, name: str, params: tuple = None,
+                   batch_size: int = ITER_BATCH_SIZE) -> Iterator[tuple]:
+        """Stream a registry query with iter_query"""
+        return self.iter_query(POSTGRES_QUERIES.sql(name), params, batch_size)
+    
+    def read_replica(self, user_id: str = None) -> Optional[ReplicaEndpoint]:
+        """Pick a healthy replica round-robin, or None to use the primary"""
+        if not self.replicas or self.is_sticky(user_id):
+            return None
+        for _ in range(len(self.replicas)):
+            replica = self.replicas[next(self._next_replica) % len(self.replicas)]
+            if self.replica_usable(replica):
+                return replica
+        return None
+    
+    def replica_usable(self, replica: ReplicaEndpoint) -> bool:
+        """Reconnect a replica that is due a retry and check its lag"""
+        now = time.monotonic()
+        if replica.conn is None or replica.conn.closed:
+            if now < replica.retry_at or not self.connect_replica(replica):
+                return False
+        if now - replica.lag_checked_at >= REPLICA_LAG_CHECK_SECONDS:
+            try:
+                rows = self.execute_named('replication.lag', conn=replica.conn)
+            except psycopg2.Error as e:
+                replica.mark_down(str(e).strip())
+                return False
+            replica.lag_checked_at = now
+            replica.lag_seconds = float(rows[0].lag_seconds or 0)
+        if replica.lag_seconds > self.max_replica_lag:
+            replica.mark_down(f"lagging {replica.lag_seconds:.1f}s")
+            return False
+        return True
+    
+    def record_write(self, user_id: str):
+        """Pin user_id's reads to the primary for sticky_seconds"""
+        if not self.replicas or not user_id:
+            return
+        now = time.monotonic()
+        with self._routing_lock:
+            if len(self._recent_writes) >= MAX_STICKY_USERS:
+                cutoff = now - self.sticky_seconds
+                self._recent_writes = {user: at for user, at in self._recent_writes.items()
+                                       if at > cutoff}
+                if len(self._recent_writes) >= MAX_STICKY_USERS:
+                    # Every remembered write is recent: forget the oldest half
+                    ordered = sorted(self._recent_writes.items(), key=lambda item: item[1])
+                    self._recent_writes = dict(ordered[len(ordered) // 2:])
+            self._recent_writes[str(user_id)] = now
+    
+    def is_sticky(self, user_id: str) -> bool:
+        """Whether user_id wrote recently enough to need the primary"""
+        if not user_id:
+            return False
+        written_at = self._recent_writes.get(str(user_id))
+        return written_at is not None and time.monotonic() - written_at < self.sticky_seconds
+    
+    def listen_for_invalidations(self):
+        """Cache feeds and mentor lists in this process, dropping entries as
+        other processes' writes are announced (see invalidation.py)"""
+        if self.listener is None:
+            self.listener = InvalidationListener(self.connection_params, self.invalidate,
+                                                 self._on_listener_reset)
+            self.listener.start()
+    
+    def _on_listener_reset(self, listening: bool):
+        # Notifications may have been missed while not listening
+        self._category_ids = {}
+        self.cache.clear()
+        self.cache.enabled = listening
+    
+    def invalidate(self, entity: str, key: str = ALL):
+        """Drop cached results affected by a change to an entity key"""
+        if entity == 'categories':
+            self._category_ids = {}
+        elif entity == 'feed' and key != ALL:
+            self.cache.invalidate('feed', key)
+            # The unfiltered feed shows every category
+            self.cache.invalidate('feed', None)
+        else:
+            self.cache.invalidate(entity, key)
+    
     def hash_password(self, password: str) -> str:
         """Hash password using bcrypt"""
         salt = bcrypt.gensalt()
@@ -69,14 +296,7 @@ class PostgreSQLFarmConnectManager:
             user_id = str(uuid.uuid4())
             password_hash = self.hash_password(password)
             
-            query = """
-                INSERT INTO users (id, full_name, email, password_hash, farming_experience, 
-                                 farm_type, location, is_mentor, bio)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                RETURNING id, full_name, email, created_at
-            """
-            
-            result = self.execute_query(query, (
+            result = self.execute_named('users.insert', (
                 user_id, full_name, email, password_hash, farming_experience,
                 farm_type, location, is_mentor, bio
             ))
@@ -93,110 +313,162 @@ class PostgreSQLFarmConnectManager:
     def authenticate_user(self, email: str, password: str) -> Dict:
         """Authenticate user login"""
         try:
-            query = """
-                SELECT id, full_name, email, password_hash, farming_experience, 
-                       farm_type, location, is_mentor, bio, created_at
-                FROM users 
-                WHERE email = %s AND is_active = TRUE
-            """
-            
-            result = self.execute_query(query, (email,))
+            result = self.execute_named('users.authenticate', (email,))
             
-            if result and self.verify_password(password, result[0]['password_hash']):
-                user_data = result[0]
-                del user_data['password_hash']  # Remove password hash from response
+            if result and self.verify_password(password, result[0].password_hash):
+                # Leave the password hash out of the response
+                user = SignedInUserRow._make(getattr(result[0], field)
+                                             for field in SignedInUserRow._fields)
                 
-                # Update last login
-                self.execute_query(
-                    "UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s",
-                    (user_data['id'],)
-                )
-                
-                # Log login activity
-                self.log_user_activity(user_data['id'], 'login')
+                # Update last login and log the activity in one statement
+                self.execute_named('users.record_login', (user.id, str(uuid.uuid4()), None))
+                self.record_write(user.id)
                 
                 print(f"✅ User {email} authenticated successfully!")
-                return {"success": True, "user": user_data}
+                return {"success": True, "user": user}
             else:
                 return {"success": False, "message": "Invalid email or password"}
                 
         except Exception as e:
             return {"success": False, "message": f"Authentication error: {str(e)}"}
     
+    def update_profile(self, user_id: str, full_name: str = None,
+                       farming_experience: str = None, author_snapshots=None) -> Dict:
+        """Update a user's display fields and propagate them to their posts
+        
+        With an AuthorSnapshotPropagator the copy onto posts and comments
+        happens in the background; otherwise before returning.
+        """
+        try:
+            self.execute_named('users.update_profile', (full_name, farming_experience, user_id))
+            self.record_write(user_id)
+            if author_snapshots:
+                author_snapshots.enqueue(user_id)
+            else:
+                while self.sync_author_snapshot(user_id) > 0:
+                    pass
+            return {"success": True, "message": "Profile updated successfully!"}
+        except Exception as e:
+            return {"success": False, "message": f"Error updating profile: {str(e)}"}
+    
+    def sync_author_snapshot(self, user_id: str, batch_size: int = 500) -> int:
+        """Rewrite at most batch_size stale author snapshots of posts and
+        comments each; returns how many rows changed"""
+        updated = 0
+        for name in ('authors.sync_posts', 'authors.sync_comments'):
+            statement = POSTGRES_QUERIES.prepare(self.conn, name)
+            with self.conn.cursor() as cursor:
+                cursor.execute(statement, (user_id, batch_size))
+                updated += cursor.rowcount
+        return updated
+    
+    def install_author_snapshots(self):
+        """Add author snapshot columns to posts and comments and backfill them"""
+        for table in ('posts', 'comments'):
+            self.execute_query(f"""
+                ALTER TABLE {table}
+                    ADD COLUMN IF NOT EXISTS author_name VARCHAR(255),
+                    ADD COLUMN IF NOT EXISTS author_experience VARCHAR(50)
+            """)
+            self.execute_query(f"""
+                UPDATE {table} t
+                SET author_name = u.full_name, author_experience = u.farming_experience
+                FROM users u
+                WHERE u.id = t.user_id AND t.author_name IS NULL
+            """)
+        print("✅ Author snapshot columns installed")
+    
+    def install_view_dedup(self):
+        """Create the table add_unique_views remembers recent viewers in"""
+        self.execute_query("""
+            CREATE TABLE IF NOT EXISTS post_viewers (
+                post_id UUID NOT NULL REFERENCES posts(id) ON DELETE CASCADE,
+                viewer TEXT NOT NULL,
+                seen_at DOUBLE PRECISION NOT NULL,
+                PRIMARY KEY (post_id, viewer)
+            )
+        """)
+        self.execute_query("CREATE INDEX IF NOT EXISTS post_viewers_seen_idx ON post_viewers (seen_at)")
+        print("✅ Post viewer table installed")
+    
     def create_post(self, user_id: str, title: str, content: str, 
                    category_name: str, tags: List[str] = None) -> Dict:
         """Create a new forum post"""
         try:
-            # Get category ID
-            category_query = "SELECT id FROM forum_categories WHERE name = %s"
-            category_result = self.execute_query(category_query, (category_name,))
-            
-            if not category_result:
+            category_id = self.category_id(category_name)
+            if category_id is None:
                 return {"success": False, "message": "Invalid category"}
             
-            category_id = category_result[0]['id']
             post_id = str(uuid.uuid4())
             
-            query = """
-                INSERT INTO posts (id, user_id, category_id, title, content, tags)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id, title, created_at
-            """
-            
-            result = self.execute_query(query, (
-                post_id, user_id, category_id, title, content, tags or []
+            # Inserts the post and logs the activity in one statement
+            result = self.execute_named('forum.insert_post', (
+                post_id, category_id, title, content, tags or [], user_id,
+                str(uuid.uuid4()), json.dumps({'post_id': post_id})
             ))
             
             if result:
-                # Log activity
-                self.log_user_activity(user_id, 'post_created', {'post_id': post_id})
+                self.record_write(user_id)
+                # The trigger's notification reaches this process too, but later
+                self.invalidate('feed', category_name)
                 print(f"✅ Post '{title}' created successfully!")
                 return {"success": True, "post": result[0]}
+            return {"success": False, "message": "User not found!"}
                 
         except Exception as e:
             return {"success": False, "message": f"Error creating post: {str(e)}"}
     
-    def get_posts(self, category_name: str = None, limit: int = 20, offset: int = 0) -> Dict:
-        """Get forum posts with optional category filter"""
+    def category_id(self, category_name: str) -> Optional[Any]:
+        """Id of a forum category by name, from a cache of the whole table
+        
+        Categories are few and rarely change; an unknown name reloads the
+        cache once in case the category was added since.
+        """
+        category_id = self._category_ids.get(category_name)
+        if category_id is None:
+            self._category_ids = {row.name: row.id for row in self.execute_named('forum.categories')}
+            category_id = self._category_ids.get(category_name)
+        return category_id
+    
+    def get_posts(self, category_name: str = None, limit: int = 20, offset: int = 0,
+                  user_id: str = None) -> Dict:
+        """Get forum posts with optional category filter
+        
+        user_id is the reader; it keeps their own fresh writes visible.
+        """
         try:
-            if category_name:
-                query = """
-                    SELECT p.id, p.title, p.content, p.tags, p.created_at, p.likes_count, 
-                           p.comments_count, p.views_count, u.full_name as author_name,
-                           u.farming_experience as author_experience, fc.name as category_name
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    JOIN forum_categories fc ON p.category_id = fc.id
-                    WHERE fc.name = %s AND p.is_archived = FALSE
-                    ORDER BY p.is_pinned DESC, p.created_at DESC
-                    LIMIT %s OFFSET %s
-                """
-                params = (category_name, limit, offset)
-            else:
-                query = """
-                    SELECT p.id, p.title, p.content, p.tags, p.created_at, p.likes_count, 
-                           p.comments_count, p.views_count, u.full_name as author_name,
-                           u.farming_experience as author_experience, fc.name as category_name
-                    FROM posts p
-                    JOIN users u ON p.user_id = u.id
-                    LEFT JOIN forum_categories fc ON p.category_id = fc.id
-                    WHERE p.is_archived = FALSE
-                    ORDER BY p.is_pinned DESC, p.created_at DESC
-                    LIMIT %s OFFSET %s
-                """
-                params = (limit, offset)
-            
-            posts = self.execute_query(query, params)
+            key = (category_name, limit, offset)
+            posts = None if self.is_sticky(user_id) else self.cache.get('feed', key)
+            if posts is None:
+                version = self.cache.version
+                if category_name:
+                    posts = self.execute_read('forum.posts_by_category',
+                                              (category_name, limit, offset), user_id)
+                else:
+                    posts = self.execute_read('forum.posts', (limit, offset), user_id)
+                self.cache.put('feed', key, posts, FEED_TTL, tag=category_name, version=version)
             return {"success": True, "posts": posts}
             
         except Exception as e:
             return {"success": False, "message": f"Error fetching posts: {str(e)}"}
     
-    def search_posts(self, search_query: str, limit: int = 20) -> Dict:
+    def add_unique_views(self, views: List[tuple], window: float) -> List[tuple]:
+        """Count (post_id, viewer, seen_at) views whose viewer was not seen
+        on the post in the last window seconds, by any server process;
+        returns (post_id, category, views) of the posts that gained views
+        
+        Marking viewers and adding the counts is one statement.
+        """
+        post_ids, viewers, seen_at = zip(*views)
+        gained = self.execute_named('views.add_unique',
+                                    (list(post_ids), list(viewers), list(seen_at), window))
+        self.execute_named('views.prune', (time.time() - window,))
+        return [(row.id, row.category_name, row.views) for row in gained]
+    
+    def search_posts(self, search_query: str, limit: int = 20, user_id: str = None) -> Dict:
         """Search posts using full-text search"""
         try:
-            query = "SELECT * FROM search_posts(%s, NULL, %s, 0)"
-            results = self.execute_query(query, (search_query, limit))
+            results = self.execute_read('forum.search', (search_query, limit), user_id)
             return {"success": True, "posts": results}
         except Exception as e:
             return {"success": False, "message": f"Search error: {str(e)}"}
@@ -204,26 +476,15 @@ class PostgreSQLFarmConnectManager:
     def like_post(self, user_id: str, post_id: str) -> Dict:
         """Like or unlike a post"""
         try:
-            # Check if already liked
-            check_query = "SELECT id FROM likes WHERE user_id = %s AND post_id = %s"
-            existing = self.execute_query(check_query, (user_id, post_id))
-            
-            if existing:
-                # Unlike
-                self.execute_query("DELETE FROM likes WHERE user_id = %s AND post_id = %s", 
-                                 (user_id, post_id))
-                action = "unliked"
-            else:
-                # Like
-                like_id = str(uuid.uuid4())
-                self.execute_query("INSERT INTO likes (id, user_id, post_id) VALUES (%s, %s, %s)",
-                                 (like_id, user_id, post_id))
-                action = "liked"
-                
-                # Log activity
-                self.log_user_activity(user_id, 'like_given', {'post_id': post_id})
+            # Unlike or like, logging a like, in one statement
+            result = self.execute_named('forum.toggle_like', (
+                user_id, post_id,
+                str(uuid.uuid4()), user_id, post_id,
+                str(uuid.uuid4()), json.dumps({'post_id': post_id})
+            ))
             
-            return {"success": True, "action": action}
+            self.record_write(user_id)
+            return {"success": True, "action": result[0].action}
             
         except Exception as e:
             return {"success": False, "message": f"Error processing like: {str(e)}"}
@@ -234,45 +495,32 @@ class PostgreSQLFarmConnectManager:
         try:
             comment_id = str(uuid.uuid4())
             
-            query = """
-                INSERT INTO comments (id, post_id, user_id, content, parent_comment_id)
-                VALUES (%s, %s, %s, %s, %s)
-                RETURNING id, content, created_at
-            """
-            
-            result = self.execute_query(query, (
-                comment_id, post_id, user_id, content, parent_comment_id
+            # Inserts the comment and logs the activity in one statement
+            result = self.execute_named('forum.comment_insert', (
+                comment_id, post_id, content, parent_comment_id, user_id,
+                str(uuid.uuid4()), json.dumps({'post_id': post_id, 'comment_id': comment_id})
             ))
             
             if result:
-                # Log activity
-                self.log_user_activity(user_id, 'comment_added', {
-                    'post_id': post_id, 
-                    'comment_id': comment_id
-                })
+                self.record_write(user_id)
                 return {"success": True, "comment": result[0]}
+            return {"success": False, "message": "User not found!"}
                 
         except Exception as e:
             return {"success": False, "message": f"Error adding comment: {str(e)}"}
     
-    def get_available_mentors(self, specialty: str = None) -> Dict:
+    def get_available_mentors(self, specialty: str = None, user_id: str = None) -> Dict:
         """Get list of available mentors"""
         try:
-            if specialty:
-                query = """
-                    SELECT * FROM mentorship_stats 
-                    WHERE farm_type = %s
-                    ORDER BY average_rating DESC NULLS LAST, completed_mentorships DESC
-                """
-                params = (specialty,)
-            else:
-                query = """
-                    SELECT * FROM mentorship_stats 
-                    ORDER BY average_rating DESC NULLS LAST, completed_mentorships DESC
-                """
-                params = ()
-            
-            mentors = self.execute_query(query, params)
+            mentors = None if self.is_sticky(user_id) else self.cache.get('mentors', specialty)
+            if mentors is None:
+                version = self.cache.version
+                if specialty:
+                    mentors = self.execute_read('mentorship.mentors_by_specialty', (specialty,),
+                                                user_id)
+                else:
+                    mentors = self.execute_read('mentorship.mentors', (), user_id)
+                self.cache.put('mentors', specialty, mentors, MENTORS_TTL, version=version)
             return {"success": True, "mentors": mentors}
             
         except Exception as e:
@@ -283,24 +531,14 @@ class PostgreSQLFarmConnectManager:
         try:
             mentorship_id = str(uuid.uuid4())
             
-            query = """
-                INSERT INTO mentorships (id, mentor_id, mentee_id, message)
-                VALUES (%s, %s, %s, %s)
-                RETURNING id, created_at
-            """
-            
-            result = self.execute_query(query, (mentorship_id, mentor_id, mentee_id, message))
+            # Inserts the request and notifies the mentor in one statement
+            result = self.execute_named('mentorship.insert', (
+                mentorship_id, mentor_id, mentee_id, message, str(uuid.uuid4())
+            ))
             
             if result:
-                # Create notification for mentor
-                self.create_notification(
-                    mentor_id, 
-                    'mentorship_request',
-                    'New Mentorship Request',
-                    f'You have received a new mentorship request.',
-                    mentorship_id
-                )
-                
+                self.record_write(mentee_id)
+                self.invalidate('mentors')
                 return {"success": True, "mentorship": result[0]}
                 
         except psycopg2.IntegrityError:
@@ -314,13 +552,7 @@ class PostgreSQLFarmConnectManager:
         try:
             notification_id = str(uuid.uuid4())
             
-            query = """
-                INSERT INTO notifications (id, user_id, type, title, message, related_id)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                RETURNING id, created_at
-            """
-            
-            result = self.execute_query(query, (
+            result = self.execute_named('notifications.insert', (
                 notification_id, user_id, notification_type, title, message, related_id
             ))
             
@@ -335,12 +567,7 @@ class PostgreSQLFarmConnectManager:
         try:
             activity_id = str(uuid.uuid4())
             
-            query = """
-                INSERT INTO user_activity (id, user_id, activity_type, activity_details, ip_address)
-                VALUES (%s, %s, %s, %s, %s)
-            """
-            
-            self.execute_query(query, (
+            self.execute_named('activity.insert', (
                 activity_id, user_id, activity_type, 
                 json.dumps(details) if details else None, ip_address
             ))
@@ -351,8 +578,7 @@ class PostgreSQLFarmConnectManager:
     def get_user_dashboard_stats(self, user_id: str) -> Dict:
         """Get dashboard statistics for a user"""
         try:
-            query = "SELECT * FROM user_dashboard_stats WHERE id = %s"
-            result = self.execute_query(query, (user_id,))
+            result = self.execute_read('dashboard.stats', (user_id,), user_id)
             
             if result:
                 return {"success": True, "stats": result[0]}
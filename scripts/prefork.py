@@ -0,0 +1,254 @@
+import json
+import os
+import shutil
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import traceback
+from collections import namedtuple
+
+# SO_REUSEPORT lets every worker bind its own listening socket and have the
+# kernel spread connections across them; elsewhere workers share one
+# socket inherited from the supervisor.
+REUSE_PORT_AVAILABLE = hasattr(socket, 'SO_REUSEPORT')
+LISTEN_BACKLOG = 128
+# A worker that dies sooner than MIN_UPTIME after starting is restarted
+# after a doubling delay, so a worker that cannot start does not spin.
+MIN_UPTIME = 5.0
+MAX_RESTART_DELAY = 30.0
+# Time retiring workers get to finish in-flight requests before SIGKILL
+SHUTDOWN_TIMEOUT = 30.0
+STATS_INTERVAL = 1.0
+
+# What a worker knows about itself. Worker 0 owns process-wide duties such
+# as checkpoints and scheduled backups.
+Worker = namedtuple('Worker', ['index', 'count', 'generation', 'stats_dir', 'socket', 'reuse_port'])
+
+
+def bind_socket(port, host='', reuse_port=False, listen=True):
+    """Create the server's TCP socket"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind((host, port))
+    if listen:
+        sock.listen(LISTEN_BACKLOG)
+    return sock
+
+
+class WorkerStats:
+    """Periodically publishes one worker's metrics as a JSON file in stats_dir"""
+
+    def __init__(self, stats_dir, collect, interval=STATS_INTERVAL):
+        self.stats_dir = stats_dir
+        self.collect = collect
+        self.interval = interval
+        self.path = os.path.join(stats_dir, f'worker-{os.getpid()}.json')
+        self._stop = threading.Event()
+        self._thread = None
+
+    def write(self):
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(self.collect(), f)
+        os.replace(temporary, self.path)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='worker-stats', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.write()
+            except OSError as e:
+                print(f"Warning: could not write worker stats: {e}")
+
+
+def _add_counts(total, counts):
+    for key, value in counts.items():
+        if isinstance(value, dict):
+            _add_counts(total.setdefault(key, {}), value)
+        elif isinstance(value, (int, float)):
+            total[key] = total.get(key, 0) + value
+
+
+def aggregate_stats(stats_dir):
+    """Every live worker's last published metrics, and their numeric sums"""
+    workers = []
+    for name in sorted(os.listdir(stats_dir)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(stats_dir, name)) as f:
+                workers.append(json.load(f))
+        except (OSError, ValueError):
+            continue  # the worker exited or is mid-write
+    totals = {}
+    for worker in workers:
+        _add_counts(totals, {key: value for key, value in worker.items() if key != 'pid'})
+    return {"totals": totals, "workers": workers}
+
+
+class Supervisor:
+    """Pre-forks worker processes and keeps them running
+
+    ``run_worker(worker)`` is called in each forked child and serves until
+    the child receives SIGTERM. The supervisor restarts workers that exit
+    on their own, replaces every worker on SIGHUP (new generation first,
+    then the old one drains), and stops them all on SIGTERM or SIGINT.
+
+    Workers are forked from the supervisor, so a reload picks up the
+    database and configuration but not changed code; that needs a restart.
+    """
+
+    def __init__(self, run_worker, port, workers, reuse_port=REUSE_PORT_AVAILABLE,
+                 shutdown_timeout=SHUTDOWN_TIMEOUT):
+        self.run_worker = run_worker
+        self.port = port
+        self.workers = workers
+        self.reuse_port = reuse_port
+        self.shutdown_timeout = shutdown_timeout
+        self.generation = 0
+        self._children = {}  # pid -> (index, generation, started)
+        self._retiring = {}  # pid -> deadline
+        self._restarts = []  # (due, index)
+        self._delays = {}
+        self._reload = False
+        self._stopping = False
+
+    def run(self):
+        # With SO_REUSEPORT the supervisor binds without listening: it holds
+        # the port so a clash fails here, but never receives connections.
+        self.socket = bind_socket(self.port, reuse_port=self.reuse_port, listen=not self.reuse_port)
+        self.stats_dir = tempfile.mkdtemp(prefix='farmconnect-stats-')
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        mode = 'SO_REUSEPORT' if self.reuse_port else 'a shared socket'
+        print(f"FarmConnect supervisor {os.getpid()} starting {self.workers} workers "
+              f"on port {self.port} using {mode}")
+        try:
+            for index in range(self.workers):
+                self._spawn(index)
+            while not self._stopping:
+                self._reap()
+                if self._reload:
+                    self._reload = False
+                    self._replace_workers()
+                self._restart_due()
+                self._kill_overdue()
+                time.sleep(0.2)
+        finally:
+            self._shutdown()
+            self.socket.close()
+            shutil.rmtree(self.stats_dir, ignore_errors=True)
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def _spawn(self, index):
+        worker = Worker(index, self.workers, self.generation, self.stats_dir,
+                        None if self.reuse_port else self.socket, self.reuse_port)
+        pid = os.fork()
+        if pid:
+            self._children[pid] = (index, self.generation, time.monotonic())
+            return pid
+
+        # Child: the supervisor decides when workers stop
+        code = 1
+        try:
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            if self.reuse_port:
+                self.socket.close()
+            self.run_worker(worker)
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+    def _reap(self):
+        while self._children:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            index, generation, started = self._children.pop(pid)
+            try:
+                os.remove(os.path.join(self.stats_dir, f'worker-{pid}.json'))
+            except FileNotFoundError:
+                pass
+            if self._retiring.pop(pid, None) is not None or self._stopping:
+                continue
+
+            uptime = time.monotonic() - started
+            delay = 0.0
+            if uptime < MIN_UPTIME:
+                delay = min(MAX_RESTART_DELAY, max(0.5, self._delays.get(index, 0.25) * 2))
+            self._delays[index] = delay
+            print(f"⚠️ Worker {index} (pid {pid}) exited with status {os.waitstatus_to_exitcode(status)}"
+                  f", restarting in {delay:.1f}s")
+            self._restarts.append((time.monotonic() + delay, index))
+
+    def _restart_due(self):
+        now = time.monotonic()
+        due = [index for when, index in self._restarts if when <= now]
+        self._restarts = [(when, index) for when, index in self._restarts if when > now]
+        for index in due:
+            self._spawn(index)
+
+    def _replace_workers(self):
+        old = [pid for pid in self._children if pid not in self._retiring]
+        self.generation += 1
+        self._restarts = []
+        print(f"Reloading: starting generation {self.generation}")
+        for index in range(self.workers):
+            self._spawn(index)
+        self._retire(old)
+
+    def _retire(self, pids):
+        deadline = time.monotonic() + self.shutdown_timeout
+        for pid in pids:
+            self._retiring[pid] = deadline
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    def _kill_overdue(self):
+        now = time.monotonic()
+        for pid, deadline in list(self._retiring.items()):
+            if now > deadline:
+                try:
+                    os.kill(pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+    def _shutdown(self):
+        self._retire([pid for pid in self._children if pid not in self._retiring])
+        while self._children:
+            self._reap()
+            self._kill_overdue()
+            time.sleep(0.05)
+        print("FarmConnect supervisor stopped")
@@ -0,0 +1,230 @@
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from lazy_import import LazyModule
+
+# Only loaded once a request is profiled, so servers that never enable
+# profiling do not pay for importing them at startup
+cProfile = LazyModule('cProfile')
+pstats = LazyModule('pstats')
+
+PROFILE_DIR = 'profiles'
+# Requests carrying this header with the admin token are always profiled
+# while profiling is enabled
+PROFILE_HEADER = 'X-FarmConnect-Profile'
+ADMIN_HEADER = 'X-Admin-Token'
+MODES = ('cprofile', 'sample')
+SAMPLE_INTERVAL = 0.005
+# How often each process re-reads the shared settings file, so a toggle
+# through one prefork worker reaches all of them
+SETTINGS_CHECK_INTERVAL = 1.0
+# Path prefixes whose remainder is a parameter, and the template they
+# are profiled under
+ROUTE_TEMPLATES = (
+    ('/api/posts/', '/api/posts/:id'),
+    ('/media/', '/media/:name'),
+)
+# Distinct route keys a process profiles under; paths past the cap, e.g.
+# from probing for URLs, share one key per method
+MAX_ROUTE_KEYS = 64
+
+_route_keys = set()
+_route_keys_lock = threading.Lock()
+
+
+def route_template(path):
+    """The route a request path is served by, without its query string,
+    e.g. /api/posts/:id for /api/posts/42?view=1"""
+    path = path.split('?', 1)[0]
+    for prefix, template in ROUTE_TEMPLATES:
+        if path.startswith(prefix):
+            return template
+    return path
+
+
+def route_key(method, path):
+    """File-name-safe key for a route, e.g. GET_api_posts_id"""
+    key = method + '_' + (re.sub(r'\W+', '_', route_template(path)).strip('_') or 'root')
+    if key not in _route_keys:
+        with _route_keys_lock:
+            if len(_route_keys) >= MAX_ROUTE_KEYS:
+                return method + '_other'
+            _route_keys.add(key)
+    return key
+
+
+class RequestProfiler:
+    """Opt-in per-route profiling of sampled requests
+
+    While disabled the request path only checks ``active``. When enabled,
+    a ``sample_rate`` fraction of requests, plus those sending
+    PROFILE_HEADER with the admin token, run under either cProfile
+    (``mode='cprofile'``, aggregated per route into
+    ``<route>.<pid>.pstats``) or a stack sampler (``mode='sample'``,
+    written as ``<route>.<pid>.collapsed`` for flamegraph tools).
+    """
+
+    def __init__(self, output_dir=PROFILE_DIR, token=None, sample_interval=SAMPLE_INTERVAL):
+        self.output_dir = output_dir
+        self.token = token
+        self.sample_interval = sample_interval
+        self.settings_path = os.path.join(output_dir, 'settings.json')
+        self.active = False
+        self.sample_rate = 0.0
+        self.mode = 'cprofile'
+        self._settings_mtime = None
+        self._next_check = 0.0
+        self._lock = threading.Lock()
+        # cProfile can only profile one request at a time on recent Pythons
+        self._cprofile_busy = threading.Lock()
+        self._stats = {}
+        self._stacks = {}
+        self._sampled_threads = {}
+        self._sampler = None
+        self.refresh(force=True)
+
+    def settings(self):
+        return {"enabled": self.active, "sample_rate": self.sample_rate, "mode": self.mode}
+
+    def configure(self, enabled=None, sample_rate=None, mode=None):
+        """Change the settings for every process sharing output_dir"""
+        if mode is not None and mode not in MODES:
+            raise ValueError(f"mode must be one of {', '.join(MODES)}")
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+        if sample_rate is not None and not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        settings = self.settings()
+        for name, value in (('enabled', enabled), ('sample_rate', sample_rate), ('mode', mode)):
+            if value is not None:
+                settings[name] = value
+        os.makedirs(self.output_dir, exist_ok=True)
+        temporary = f'{self.settings_path}.{os.getpid()}.tmp'
+        with open(temporary, 'w') as f:
+            json.dump(settings, f)
+        os.replace(temporary, self.settings_path)
+        self._apply(settings)
+        return settings
+
+    def refresh(self, force=False):
+        """Pick up settings changed by another process; cheap to call per request"""
+        now = time.monotonic()
+        if not force and now < self._next_check:
+            return
+        self._next_check = now + SETTINGS_CHECK_INTERVAL
+        try:
+            mtime = os.stat(self.settings_path).st_mtime_ns
+            if mtime == self._settings_mtime:
+                return
+            with open(self.settings_path) as f:
+                settings = json.load(f)
+        except (OSError, ValueError):
+            return
+        self._settings_mtime = mtime
+        was_active = self.active
+        self._apply(settings)
+        if was_active and not self.active:
+            self.flush()
+
+    def _apply(self, settings):
+        self.sample_rate = float(settings.get('sample_rate', 0.0))
+        self.mode = settings.get('mode', 'cprofile')
+        self.active = bool(settings.get('enabled'))
+
+    def is_authorized(self, value):
+        """Whether a header value matches the admin token"""
+        return bool(self.token and value and hmac.compare_digest(value, self.token))
+
+    def should_profile(self, headers):
+        if self.sample_rate and random.random() < self.sample_rate:
+            return True
+        return self.is_authorized(headers.get(PROFILE_HEADER))
+
+    def run(self, route, handler, *args):
+        """Call handler(*args) under the configured profiler"""
+        if self.mode == 'sample':
+            return self._run_sampled(route, handler, args)
+        if not self._cprofile_busy.acquire(blocking=False):
+            return handler(*args)
+        try:
+            profile = cProfile.Profile()
+            try:
+                return profile.runcall(handler, *args)
+            finally:
+                with self._lock:
+                    stats = self._stats.get(route)
+                    if stats is None:
+                        self._stats[route] = pstats.Stats(profile)
+                    else:
+                        stats.add(profile)
+        finally:
+            self._cprofile_busy.release()
+
+    def _run_sampled(self, route, handler, args):
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._sampled_threads[thread_id] = route
+            if self._sampler is None:
+                self._sampler = threading.Thread(target=self._sample, name='profiler-sampler',
+                                                 daemon=True)
+                self._sampler.start()
+        try:
+            return handler(*args)
+        finally:
+            with self._lock:
+                self._sampled_threads.pop(thread_id, None)
+
+    def _sample(self):
+        while True:
+            with self._lock:
+                if not self._sampled_threads:
+                    self._sampler = None
+                    return
+                threads = dict(self._sampled_threads)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, route in threads.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        self._stacks.setdefault(route, Counter())[_collapse(frame)] += 1
+            time.sleep(self.sample_interval)
+
+    def flush(self):
+        """Write the aggregated profiles collected so far; returns the file paths"""
+        with self._lock:
+            stats, self._stats = self._stats, {}
+            stacks, self._stacks = self._stacks, {}
+        if not stats and not stacks:
+            return []
+        os.makedirs(self.output_dir, exist_ok=True)
+        written = []
+        pid = os.getpid()
+        for route, route_stats in stats.items():
+            path = os.path.join(self.output_dir, f'{route}.{pid}.pstats')
+            if os.path.exists(path):
+                route_stats.add(path)
+            route_stats.dump_stats(path)
+            written.append(path)
+        for route, counts in stacks.items():
+            path = os.path.join(self.output_dir, f'{route}.{pid}.collapsed')
+            with open(path, 'a') as f:
+                for stack, count in counts.items():
+                    f.write(f'{stack} {count}\n')
+            written.append(path)
+        return written
+
+
+def _collapse(frame):
+    """One stack in collapsed format: outermost frame first, ';' separated"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+        frame = frame.f_back
+    return ';'.join(reversed(names))
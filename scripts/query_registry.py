@@ -0,0 +1,730 @@
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter, namedtuple
+from geo import haversine_km
+
+# sqlite3's default per-connection statement cache holds 128 entries; the
+# managers share one connection per thread (see ``connect``) so every named
+# query below stays compiled for the lifetime of the thread.
+SQLITE_STATEMENT_CACHE_SIZE = 512
+# Rows fetched per round trip by ``iter_query`` and its Postgres counterpart
+ITER_BATCH_SIZE = 2000
+
+
+class QueryRegistry:
+    """Named SQL queries shared by the managers, with per-query counters"""
+
+    def __init__(self, backend, queries, prepared_prefix='fc_'):
+        self.backend = backend
+        self.queries = dict(queries)
+        self.prepared_prefix = prepared_prefix
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self._prepared = {}
+        self._connection_locks = {}
+        self._execute_sql = {}
+
+    def __contains__(self, name):
+        return name in self.queries
+
+    def sql(self, name):
+        """Return the SQL text for a named query and count the call"""
+        query = self.queries[name]
+        with self._lock:
+            self.counts[name] += 1
+        return query
+
+    def stats(self):
+        """Snapshot of how many times each named query has been issued"""
+        with self._lock:
+            return dict(self.counts)
+
+    def prepared_name(self, name):
+        """Server-side statement name for a registry query"""
+        return self.prepared_prefix + re.sub(r'\W', '_', name)
+
+    def prepare(self, conn, name):
+        """PREPARE a named query on a Postgres connection once and return
+        the ``EXECUTE`` statement to run it with psycopg2 parameters"""
+        query = self.queries[name]
+        key = id(conn)
+        with self._lock:
+            self.counts[name] += 1
+            prepared = self._prepared.setdefault(key, set())
+            if name in prepared:
+                return self._execute_sql[name]
+            connection_lock = self._connection_locks.setdefault(key, threading.Lock())
+        # The PREPARE round trip holds only this connection's lock, so two
+        # threads sharing a connection never prepare the same statement
+        # twice while other connections carry on.
+        with connection_lock:
+            if name not in prepared:
+                self._prepare(conn, name, query)
+                with self._lock:
+                    prepared.add(name)
+        return self._execute_sql[name]
+
+    def _prepare(self, conn, name, query):
+        params = query.count('%s')
+        positional = iter(range(1, params + 1))
+        server_sql = re.sub(r'%s', lambda _: f'${next(positional)}', query)
+        statement = self.prepared_name(name)
+        with conn.cursor() as cursor:
+            cursor.execute(f"PREPARE {statement} AS {server_sql}")
+
+        execute_sql = f"EXECUTE {statement}"
+        if params:
+            execute_sql += " (" + ", ".join(["%s"] * params) + ")"
+        with self._lock:
+            self._execute_sql[name] = execute_sql
+
+    def forget(self, conn):
+        """Drop prepared-statement bookkeeping for a closed connection"""
+        with self._lock:
+            self._prepared.pop(id(conn), None)
+            self._connection_locks.pop(id(conn), None)
+
+
+SQLITE_QUERIES = QueryRegistry('sqlite', {
+    # Users
+    'users.insert': '''
+        INSERT INTO users (full_name, email, password_hash, farming_experience, farm_type, location,
+                           latitude, longitude)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ''',
+    'users.authenticate': '''
+        SELECT id, full_name, email, farming_experience, farm_type, location, is_mentor
+        FROM users
+        WHERE email = ? AND password_hash = ?
+    ''',
+    'users.profile': '''
+        SELECT id, full_name, email, farming_experience, farm_type, location, is_mentor, created_at
+        FROM users
+        WHERE id = ?
+    ''',
+    'users.update_profile': '''
+        UPDATE users
+        SET full_name = COALESCE(?, full_name),
+            farming_experience = COALESCE(?, farming_experience)
+        WHERE id = ?
+    ''',
+    'users.set_profile_image': '''
+        UPDATE users SET profile_image = ? WHERE id = ?
+    ''',
+    'users.author_fields': '''
+        SELECT full_name, farming_experience FROM users WHERE id = ?
+    ''',
+
+    # Author snapshots: posts and comments carry a copy of their author's
+    # display fields so feeds never join users. A profile change is copied
+    # over in batches of rows that are still out of date.
+    'authors.sync_posts': '''
+        UPDATE posts
+        SET author_name = :full_name, author_experience = :farming_experience
+        WHERE id IN (
+            SELECT id FROM posts
+            WHERE user_id = :user_id
+              AND (author_name IS NOT :full_name OR author_experience IS NOT :farming_experience)
+            LIMIT :batch_size
+        )
+    ''',
+    'authors.sync_comments': '''
+        UPDATE comments
+        SET author_name = :full_name, author_experience = :farming_experience
+        WHERE id IN (
+            SELECT id FROM comments
+            WHERE user_id = :user_id
+              AND (author_name IS NOT :full_name OR author_experience IS NOT :farming_experience)
+            LIMIT :batch_size
+        )
+    ''',
+
+    # Location search. Each query comes in an ``_rtree`` flavour using the
+    # user_geo R*Tree and a ``_btree`` flavour using idx_users_lat_lon; both
+    # prefilter on a bounding box and then apply the exact distance.
+    'geo.index_user': '''
+        INSERT OR REPLACE INTO user_geo (id, min_lat, max_lat, min_lon, max_lon)
+        VALUES (?, ?, ?, ?, ?)
+    ''',
+    'geo.posts_near_rtree': '''
+        SELECT p.id, p.title, p.content, p.category, p.created_at, p.likes_count, p.comments_count,
+               p.views_count, p.author_name, p.author_experience, p.image_url,
+               distance_km(u.latitude, u.longitude, :lat, :lon) AS distance
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        WHERE u.id IN (
+                SELECT id FROM user_geo
+                WHERE max_lat >= :min_lat AND min_lat <= :max_lat
+                  AND max_lon >= :min_lon AND min_lon <= :max_lon
+              )
+          AND (:category IS NULL OR p.category = :category)
+          AND distance_km(u.latitude, u.longitude, :lat, :lon) <= :radius_km
+        ORDER BY p.created_at DESC
+        LIMIT :limit OFFSET :offset
+    ''',
+    'geo.posts_near_btree': '''
+        SELECT p.id, p.title, p.content, p.category, p.created_at, p.likes_count, p.comments_count,
+               p.views_count, p.author_name, p.author_experience, p.image_url,
+               distance_km(u.latitude, u.longitude, :lat, :lon) AS distance
+        FROM posts p
+        JOIN users u ON p.user_id = u.id
+        WHERE u.latitude BETWEEN :min_lat AND :max_lat
+          AND u.longitude BETWEEN :min_lon AND :max_lon
+          AND (:category IS NULL OR p.category = :category)
+          AND distance_km(u.latitude, u.longitude, :lat, :lon) <= :radius_km
+        ORDER BY p.created_at DESC
+        LIMIT :limit OFFSET :offset
+    ''',
+    'geo.mentors_near_rtree': '''
+        SELECT u.id, u.full_name, u.farming_experience, u.farm_type, u.location,
+               distance_km(u.latitude, u.longitude, :lat, :lon) AS distance
+        FROM user_geo g
+        JOIN users u ON u.id = g.id
+        WHERE g.max_lat >= :min_lat AND g.min_lat <= :max_lat
+          AND g.max_lon >= :min_lon AND g.min_lon <= :max_lon
+          AND u.is_mentor = 1
+          AND (:specialty IS NULL OR u.farm_type = :specialty)
+          AND distance <= :radius_km
+        ORDER BY distance, u.full_name
+        LIMIT :limit
+    ''',
+    'geo.mentors_near_btree': '''
+        SELECT id, full_name, farming_experience, farm_type, location,
+               distance_km(latitude, longitude, :lat, :lon) AS distance
+        FROM users
+        WHERE latitude BETWEEN :min_lat AND :max_lat
+          AND longitude BETWEEN :min_lon AND :max_lon
+          AND is_mentor = 1
+          AND (:specialty IS NULL OR farm_type = :specialty)
+          AND distance <= :radius_km
+        ORDER BY distance, full_name
+        LIMIT :limit
+    ''',
+
+    # Forum
+    'forum.insert_post': '''
+        INSERT INTO posts (user_id, title, content, category, author_name, author_experience)
+        SELECT id, ?, ?, ?, full_name, farming_experience
+        FROM users
+        WHERE id = ?
+    ''',
+    'forum.posts': '''
+        SELECT id, title, content, category, created_at, likes_count, comments_count, views_count,
+               author_name, author_experience, image_url
+        FROM posts
+        ORDER BY created_at DESC
+        LIMIT ? OFFSET ?
+    ''',
+    'forum.posts_by_category': '''
+        SELECT id, title, content, category, created_at, likes_count, comments_count, views_count,
+               author_name, author_experience, image_url
+        FROM posts
+        WHERE category = ?
+        ORDER BY created_at DESC
+        LIMIT ? OFFSET ?
+    ''',
+    'forum.set_post_image': '''
+        UPDATE posts SET image_url = ? WHERE id = ? AND user_id = ?
+    ''',
+    'forum.like_exists': '''
+        SELECT id, created_at FROM likes WHERE user_id = ? AND post_id = ?
+    ''',
+    'forum.like_delete': '''
+        DELETE FROM likes WHERE user_id = ? AND post_id = ?
+    ''',
+    'forum.like_insert': '''
+        INSERT INTO likes (user_id, post_id) VALUES (?, ?)
+    ''',
+    'forum.likes_increment': '''
+        UPDATE posts SET likes_count = likes_count + 1 WHERE id = ?
+        RETURNING category
+    ''',
+    'forum.likes_decrement': '''
+        UPDATE posts SET likes_count = likes_count - 1 WHERE id = ?
+        RETURNING category
+    ''',
+    'forum.comment_insert': '''
+        INSERT INTO comments (post_id, user_id, content, author_name, author_experience)
+        SELECT ?, id, ?, full_name, farming_experience
+        FROM users
+        WHERE id = ?
+    ''',
+    'forum.comments_increment': '''
+        UPDATE posts SET comments_count = comments_count + 1 WHERE id = ?
+        RETURNING category
+    ''',
+    'forum.posts_by_ids': '''
+        SELECT id, title, content, category, created_at, likes_count, comments_count, views_count,
+               author_name, author_experience, image_url
+        FROM posts
+        WHERE id IN (SELECT value FROM json_each(?))
+    ''',
+    'forum.posts_for_ranking': '''
+        SELECT id, category, created_at, likes_count, comments_count
+        FROM posts
+        ORDER BY created_at DESC
+        LIMIT ?
+    ''',
+    'forum.comments': '''
+        SELECT id, content, created_at, author_name, author_experience
+        FROM comments
+        WHERE post_id = ?
+        ORDER BY created_at ASC
+    ''',
+
+    # Home feeds (feeds.py): posts with their author's segments, tailed by
+    # id, and what a reader's feed is made of
+    'feed.recent_posts': '''
+        SELECT * FROM (
+            SELECT p.id, p.category, u.farm_type, u.latitude, u.longitude
+            FROM posts p
+            JOIN users u ON u.id = p.user_id
+            ORDER BY p.id DESC
+            LIMIT ?
+        ) ORDER BY id
+    ''',
+    'feed.posts_since': '''
+        SELECT p.id, p.category, u.farm_type, u.latitude, u.longitude
+        FROM posts p
+        JOIN users u ON u.id = p.user_id
+        WHERE p.id > ?
+        ORDER BY p.id
+        LIMIT ?
+    ''',
+    'feed.member': '''
+        SELECT farm_type, latitude, longitude FROM users WHERE id = ?
+    ''',
+    'feed.subscriptions': '''
+        SELECT category FROM category_subscriptions WHERE user_id = ? ORDER BY category
+    ''',
+    'feed.subscribe': '''
+        INSERT OR IGNORE INTO category_subscriptions (user_id, category) VALUES (?, ?)
+    ''',
+    'feed.unsubscribe': '''
+        DELETE FROM category_subscriptions WHERE user_id = ? AND category = ?
+    ''',
+
+    # Rankings shared by the server processes: the trending event log each
+    # applies in id order, and who viewed which post lately
+    'trending.append': '''
+        INSERT INTO trending_events (post_id, event, category, at, count, recorded_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''',
+    'trending.since': '''
+        SELECT id, post_id, event, category, at, count
+        FROM trending_events
+        WHERE id > ?
+        ORDER BY id
+        LIMIT ?
+    ''',
+    'trending.last_event': '''
+        SELECT COALESCE(MAX(id), 0) FROM trending_events
+    ''',
+    'trending.prune': '''
+        DELETE FROM trending_events WHERE recorded_at < ?
+    ''',
+    'views.mark_seen': '''
+        INSERT INTO post_viewers (post_id, viewer, seen_at)
+        SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]'), json_extract(value, '$[2]')
+        FROM json_each(?)
+        WHERE true
+        ON CONFLICT (post_id, viewer) DO UPDATE SET seen_at = excluded.seen_at
+        WHERE excluded.seen_at - post_viewers.seen_at >= ?
+        RETURNING post_id
+    ''',
+    'views.add': '''
+        UPDATE posts SET views_count = views_count + json_extract(counted.value, '$[1]')
+        FROM json_each(?) AS counted
+        WHERE posts.id = json_extract(counted.value, '$[0]')
+        RETURNING id, category
+    ''',
+    'views.prune': '''
+        DELETE FROM post_viewers WHERE seen_at < ?
+    ''',
+
+    # Mentorship
+    'mentorship.exists': '''
+        SELECT id FROM mentorships
+        WHERE mentor_id = ? AND mentee_id = ?
+    ''',
+    'mentorship.insert': '''
+        INSERT INTO mentorships (mentor_id, mentee_id, status)
+        VALUES (?, ?, 'pending')
+    ''',
+    'mentorship.mentors': '''
+        SELECT id, full_name, farming_experience, farm_type, location
+        FROM users
+        WHERE is_mentor = 1
+        ORDER BY full_name
+    ''',
+    'mentorship.mentors_by_specialty': '''
+        SELECT id, full_name, farming_experience, farm_type, location
+        FROM users
+        WHERE is_mentor = 1 AND farm_type = ?
+        ORDER BY full_name
+    ''',
+    'mentorship.accept': '''
+        UPDATE mentorships
+        SET status = 'accepted'
+        WHERE mentor_id = ? AND mentee_id = ? AND status = 'pending'
+    ''',
+    'mentorship.requests': '''
+        SELECT m.id, m.created_at, u.full_name, u.farming_experience, u.farm_type, u.location
+        FROM mentorships m
+        JOIN users u ON m.mentee_id = u.id
+        WHERE m.mentor_id = ? AND m.status = 'pending'
+        ORDER BY m.created_at DESC
+    ''',
+
+    # Exports, streamed with iter_query
+    'export.posts': '''
+        SELECT id, user_id, title, content, category, created_at, updated_at, likes_count,
+               comments_count, views_count, author_name, author_experience, image_url
+        FROM posts
+        ORDER BY id
+    ''',
+    'export.comments': '''
+        SELECT id, post_id, user_id, content, created_at, author_name, author_experience
+        FROM comments
+        ORDER BY id
+    ''',
+})
+
+
+POSTGRES_QUERIES = QueryRegistry('postgres', {
+    # Users
+    'users.insert': """
+        INSERT INTO users (id, full_name, email, password_hash, farming_experience,
+                         farm_type, location, is_mentor, bio)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+        RETURNING id, full_name, email, created_at
+    """,
+    'users.authenticate': """
+        SELECT id, full_name, email, password_hash, farming_experience,
+               farm_type, location, is_mentor, bio, created_at
+        FROM users
+        WHERE email = %s AND is_active = TRUE
+    """,
+    # Multi-step writes below are single statements: data-modifying CTEs
+    # run in one round trip and commit or fail together.
+    'users.record_login': """
+        WITH touched AS (
+            UPDATE users SET last_login = CURRENT_TIMESTAMP WHERE id = %s
+            RETURNING id
+        )
+        INSERT INTO user_activity (id, user_id, activity_type, activity_details, ip_address)
+        SELECT %s, id, 'login', NULL, %s FROM touched
+    """,
+    'users.update_profile': """
+        UPDATE users
+        SET full_name = COALESCE(%s, full_name),
+            farming_experience = COALESCE(%s, farming_experience)
+        WHERE id = %s
+    """,
+
+    # Author snapshots, see the SQLite queries above
+    'authors.sync_posts': """
+        UPDATE posts p
+        SET author_name = u.full_name, author_experience = u.farming_experience
+        FROM users u
+        WHERE u.id = %s AND p.id IN (
+            SELECT id FROM posts
+            WHERE user_id = u.id
+              AND (author_name IS DISTINCT FROM u.full_name
+                   OR author_experience IS DISTINCT FROM u.farming_experience)
+            LIMIT %s
+        )
+    """,
+    'authors.sync_comments': """
+        UPDATE comments c
+        SET author_name = u.full_name, author_experience = u.farming_experience
+        FROM users u
+        WHERE u.id = %s AND c.id IN (
+            SELECT id FROM comments
+            WHERE user_id = u.id
+              AND (author_name IS DISTINCT FROM u.full_name
+                   OR author_experience IS DISTINCT FROM u.farming_experience)
+            LIMIT %s
+        )
+    """,
+
+    # Forum
+    'forum.categories': """
+        SELECT id, name FROM forum_categories
+    """,
+    'forum.insert_post': """
+        WITH post AS (
+            INSERT INTO posts (id, user_id, category_id, title, content, tags,
+                               author_name, author_experience)
+            SELECT %s, id, %s, %s, %s, %s, full_name, farming_experience
+            FROM users
+            WHERE id = %s
+            RETURNING id, user_id, title, created_at
+        ), logged AS (
+            INSERT INTO user_activity (id, user_id, activity_type, activity_details)
+            SELECT %s, user_id, 'post_created', %s FROM post
+        )
+        SELECT id, title, created_at FROM post
+    """,
+    'forum.posts': """
+        SELECT p.id, p.title, p.content, p.tags, p.created_at, p.likes_count,
+               p.comments_count, p.views_count, p.author_name,
+               p.author_experience, fc.name as category_name
+        FROM posts p
+        LEFT JOIN forum_categories fc ON p.category_id = fc.id
+        WHERE p.is_archived = FALSE
+        ORDER BY p.is_pinned DESC, p.created_at DESC
+        LIMIT %s OFFSET %s
+    """,
+    'forum.posts_by_category': """
+        SELECT p.id, p.title, p.content, p.tags, p.created_at, p.likes_count,
+               p.comments_count, p.views_count, p.author_name,
+               p.author_experience, fc.name as category_name
+        FROM posts p
+        JOIN forum_categories fc ON p.category_id = fc.id
+        WHERE fc.name = %s AND p.is_archived = FALSE
+        ORDER BY p.is_pinned DESC, p.created_at DESC
+        LIMIT %s OFFSET %s
+    """,
+    'forum.search': """
+        SELECT * FROM search_posts(%s, NULL, %s, 0)
+    """,
+    # Toggle: remove the like if there is one, otherwise add it
+    'forum.toggle_like': """
+        WITH removed AS (
+            DELETE FROM likes WHERE user_id = %s AND post_id = %s
+            RETURNING id
+        ), added AS (
+            INSERT INTO likes (id, user_id, post_id)
+            SELECT %s, %s, %s
+            WHERE NOT EXISTS (SELECT 1 FROM removed)
+            ON CONFLICT DO NOTHING
+            RETURNING user_id
+        ), logged AS (
+            INSERT INTO user_activity (id, user_id, activity_type, activity_details)
+            SELECT %s, user_id, 'like_given', %s FROM added
+        )
+        SELECT CASE WHEN EXISTS (SELECT 1 FROM removed) THEN 'unliked' ELSE 'liked' END AS action
+    """,
+    # Buffered view counts for many posts in one statement. Run unprepared:
+    # the id array parameter must be cast from text explicitly.
+    'views.add_unique': """
+        WITH seen AS (
+            INSERT INTO post_viewers (post_id, viewer, seen_at)
+            SELECT DISTINCT ON (v.post_id, v.viewer) v.post_id, v.viewer, v.seen_at
+            FROM unnest(%s::uuid[], %s::text[], %s::double precision[]) AS v(post_id, viewer, seen_at)
+            ORDER BY v.post_id, v.viewer, v.seen_at
+            ON CONFLICT (post_id, viewer) DO UPDATE SET seen_at = excluded.seen_at
+            WHERE excluded.seen_at - post_viewers.seen_at >= %s
+            RETURNING post_id
+        ), counted AS (
+            SELECT post_id, count(*) AS views FROM seen GROUP BY post_id
+        )
+        UPDATE posts p
+        SET views_count = p.views_count + c.views
+        FROM counted c
+        WHERE p.id = c.post_id
+        RETURNING p.id,
+                  (SELECT name FROM forum_categories WHERE id = p.category_id) AS category_name,
+                  c.views
+    """,
+    'views.prune': """
+        DELETE FROM post_viewers WHERE seen_at < %s
+    """,
+    'forum.comment_insert': """
+        WITH comment AS (
+            INSERT INTO comments (id, post_id, user_id, content, parent_comment_id,
+                                  author_name, author_experience)
+            SELECT %s, %s, id, %s, %s, full_name, farming_experience
+            FROM users
+            WHERE id = %s
+            RETURNING id, user_id, content, created_at
+        ), logged AS (
+            INSERT INTO user_activity (id, user_id, activity_type, activity_details)
+            SELECT %s, user_id, 'comment_added', %s FROM comment
+        )
+        SELECT id, content, created_at FROM comment
+    """,
+
+    # Mentorship
+    'mentorship.mentors': """
+        SELECT * FROM mentorship_stats
+        ORDER BY average_rating DESC NULLS LAST, completed_mentorships DESC
+    """,
+    'mentorship.mentors_by_specialty': """
+        SELECT * FROM mentorship_stats
+        WHERE farm_type = %s
+        ORDER BY average_rating DESC NULLS LAST, completed_mentorships DESC
+    """,
+    'mentorship.insert': """
+        WITH mentorship AS (
+            INSERT INTO mentorships (id, mentor_id, mentee_id, message)
+            VALUES (%s, %s, %s, %s)
+            RETURNING id, mentor_id, created_at
+        ), notified AS (
+            INSERT INTO notifications (id, user_id, type, title, message, related_id)
+            SELECT %s, mentor_id, 'mentorship_request', 'New Mentorship Request',
+                   'You have received a new mentorship request.', id
+            FROM mentorship
+        )
+        SELECT id, created_at FROM mentorship
+    """,
+
+    # Notifications, activity and stats
+    'notifications.insert': """
+        INSERT INTO notifications (id, user_id, type, title, message, related_id)
+        VALUES (%s, %s, %s, %s, %s, %s)
+        RETURNING id, created_at
+    """,
+    'activity.insert': """
+        INSERT INTO user_activity (id, user_id, activity_type, activity_details, ip_address)
+        VALUES (%s, %s, %s, %s, %s)
+    """,
+    'dashboard.stats': """
+        SELECT * FROM user_dashboard_stats WHERE id = %s
+    """,
+
+    # Activity partitions and rollups (activity_partitions.py). Maintenance
+    # queries run unprepared: the tables they name change underneath them.
+    'activity.partitions': """
+        SELECT c.relname AS name,
+               substring(pg_get_expr(c.relpartbound, c.oid)
+                         from 'FROM [(]''([^'']+)''[)]')::timestamp::date AS starts,
+               substring(pg_get_expr(c.relpartbound, c.oid)
+                         from 'TO [(]''([^'']+)''[)]')::timestamp::date AS ends,
+               pg_get_expr(c.relpartbound, c.oid) = 'DEFAULT' AS is_default,
+               c.reltuples::bigint AS estimated_rows
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass('user_activity')
+        ORDER BY ends NULLS LAST
+    """,
+    'activity.rollup_watermark': """
+        SELECT max(day) AS day FROM user_activity_daily
+    """,
+    'activity.rollup': """
+        INSERT INTO user_activity_daily (user_id, day, activity_type, events)
+        SELECT user_id, created_at::date, activity_type, count(*)
+        FROM user_activity
+        WHERE created_at >= %s AND created_at < %s
+          AND user_id IS NOT NULL AND activity_type IS NOT NULL
+        GROUP BY 1, 2, 3
+        ON CONFLICT (user_id, day, activity_type) DO UPDATE SET events = EXCLUDED.events
+    """,
+
+    # Exports, streamed through a server-side cursor. Unordered, so
+    # Postgres can return rows as it scans instead of sorting first.
+    'export.posts': """
+        SELECT p.id, p.user_id, fc.name AS category_name, p.title, p.content, p.tags,
+               p.created_at, p.likes_count, p.comments_count, p.views_count,
+               p.author_name, p.author_experience
+        FROM posts p
+        LEFT JOIN forum_categories fc ON p.category_id = fc.id
+    """,
+    'export.comments': """
+        SELECT id, post_id, user_id, parent_comment_id, content, created_at,
+               author_name, author_experience
+        FROM comments
+    """,
+    'export.activity': """
+        SELECT id, user_id, activity_type, activity_details, ip_address, created_at
+        FROM user_activity
+    """,
+
+    # Replication. An idle primary produces no WAL, so a replica that has
+    # replayed everything it received is not lagging.
+    'replication.lag': """
+        SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+               END AS lag_seconds
+    """,
+})
+
+
+class _ThreadConnection(sqlite3.Connection):
+    """SQLite connection kept open for reuse by the thread that opened it.
+
+    The managers open and close a connection around every call; ``close()``
+    here only discards an unfinished transaction so the next call on the same
+    thread keeps the compiled statement cache.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def close_for_real(self):
+        super().close()
+
+
+_local = threading.local()
+
+
+def connect(db_path):
+    """Return this thread's cached SQLite connection for ``db_path``"""
+    connections = getattr(_local, 'connections', None)
+    if connections is None:
+        connections = _local.connections = {}
+
+    conn = connections.get(db_path)
+    if conn is None:
+        conn = sqlite3.connect(
+            db_path,
+            factory=_ThreadConnection,
+            cached_statements=SQLITE_STATEMENT_CACHE_SIZE,
+        )
+        conn.create_function('distance_km', 4, haversine_km, deterministic=True)
+        connections[db_path] = conn
+    elif conn.in_transaction:
+        # A call that failed without closing must not keep the write lock
+        conn.rollback()
+    return conn
+
+
+def iter_query(db_path, query, params=(), batch_size=ITER_BATCH_SIZE):
+    """Yield the rows of a large query as named tuples, batch_size at a time
+
+    Runs on its own connection so the read can be consumed at any pace,
+    from any thread, while the caller keeps using ``connect``.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False)
+    try:
+        cursor = conn.execute(query, params)
+        row_cls = namedtuple('Row', [column[0] for column in cursor.description])
+        new = tuple.__new__
+        cursor.row_factory = lambda cursor, values: new(row_cls, values)
+        while True:
+            batch = cursor.fetchmany(batch_size)
+            if not batch:
+                return
+            yield from batch
+    finally:
+        conn.close()
+
+
+def close_connections():
+    """Close every SQLite connection cached for the calling thread"""
+    connections = getattr(_local, 'connections', None) or {}
+    for conn in connections.values():
+        conn.close_for_real()
+    connections.clear()
+
+
+def query_stats():
+    """Per-query counters for both backends"""
+    return {
+        SQLITE_QUERIES.backend: SQLITE_QUERIES.stats(),
+        POSTGRES_QUERIES.backend: POSTGRES_QUERIES.stats(),
+    }
+
+
+def _reset_after_fork():
+    # Connections opened by the parent must never be shared with a child.
+    global _local
+    _local = threading.local()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,107 @@
+import uuid
+from collections import Counter
+
+
+class _CountingCursor:
+    """Cursor proxy counting every statement sent to the server"""
+
+    def __init__(self, cursor, counter):
+        self._cursor = cursor
+        self._counter = counter
+
+    def execute(self, query, params=None):
+        self._counter['round_trips'] += 1
+        return self._cursor.execute(query, params)
+
+    def executemany(self, query, params_seq):
+        # psycopg2 sends one statement per parameter set
+        params_seq = list(params_seq)
+        self._counter['round_trips'] += len(params_seq)
+        return self._cursor.executemany(query, params_seq)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._cursor.__exit__(*exc_info)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class CountingConnection:
+    """psycopg2 connection proxy for counting round trips per API call"""
+
+    def __init__(self, conn):
+        self._conn = conn
+        self.counter = Counter()
+
+    def cursor(self, *args, **kwargs):
+        return _CountingCursor(self._conn.cursor(*args, **kwargs), self.counter)
+
+    def take(self):
+        """Round trips since the last call"""
+        count = self.counter['round_trips']
+        self.counter.clear()
+        return count
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+def scenario(manager, suffix):
+    """API calls to measure, as (label, callable) pairs run in order"""
+    mentor = manager.create_user(f'Mentor {suffix}', f'mentor-{suffix}@example.com', 'password',
+                                 'expert', 'crops', 'Nairobi', is_mentor=True)['user']
+    category = manager.execute_named('forum.categories')[0].name
+    state = {}
+
+    def create_post():
+        state['post'] = manager.create_post(state['user'].id, 'Round trips', 'Measuring',
+                                            category)['post']
+
+    return [
+        ('create_user', lambda: state.update(user=manager.create_user(
+            f'Farmer {suffix}', f'farmer-{suffix}@example.com', 'password', 'beginner',
+            'crops', 'Nakuru')['user'])),
+        ('authenticate_user', lambda: manager.authenticate_user(
+            f'farmer-{suffix}@example.com', 'password')),
+        ('create_post', create_post),
+        ('like_post', lambda: manager.like_post(state['user'].id, state['post'].id)),
+        ('unlike_post', lambda: manager.like_post(state['user'].id, state['post'].id)),
+        ('add_comment', lambda: manager.add_comment(state['user'].id, state['post'].id, 'Nice')),
+        ('request_mentorship', lambda: manager.request_mentorship(state['user'].id, mentor.id)),
+        ('get_posts', lambda: manager.get_posts(limit=20)),
+    ]
+
+
+def measure(manager):
+    """Round trips per API call, once cold and once with statements prepared"""
+    manager.conn = CountingConnection(manager.conn)
+    passes = []
+    for _ in range(2):
+        calls = scenario(manager, uuid.uuid4().hex[:8])
+        manager.conn.take()
+        counts = {}
+        for label, call in calls:
+            call()
+            counts[label] = manager.conn.take()
+        passes.append(counts)
+    return passes
+
+
+# Example usage: python round_trips.py (needs the PostgreSQL sample database)
+if __name__ == "__main__":
+    from postgresql_manager import PostgreSQLFarmConnectManager
+    manager = PostgreSQLFarmConnectManager()
+    try:
+        cold, warm = measure(manager)
+    finally:
+        manager.disconnect()
+    print(f"{'API call':<20} {'cold':>5} {'warm':>5}")
+    for label in warm:
+        print(f"{label:<20} {cold[label]:>5} {warm[label]:>5}")
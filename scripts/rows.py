@@ -0,0 +1,97 @@
+import json
+from collections import namedtuple
+from datetime import date, datetime
+from json.encoder import encode_basestring_ascii
+
+# Row types returned by the SQLite read paths. Field names are the JSON keys
+# the API responds with.
+PostRow = namedtuple('PostRow', [
+    'id', 'title', 'content', 'category', 'created_at', 'likes_count',
+    'comments_count', 'views_count', 'author_name', 'author_experience', 'image_url',
+])
+
+CommentRow = namedtuple('CommentRow', [
+    'id', 'content', 'created_at', 'author_name', 'author_experience',
+])
+
+MentorRow = namedtuple('MentorRow', [
+    'id', 'full_name', 'farming_experience', 'specialty', 'location',
+])
+
+# Location search results carry the distance from the search point.
+NearbyPostRow = namedtuple('NearbyPostRow', PostRow._fields + ('distance_km',))
+
+NearbyMentorRow = namedtuple('NearbyMentorRow', MentorRow._fields + ('distance_km',))
+
+MentorshipRequestRow = namedtuple('MentorshipRequestRow', [
+    'id', 'created_at', 'mentee_name', 'mentee_experience',
+    'mentee_farm_type', 'mentee_location',
+])
+
+# A signed-in user as returned by the PostgreSQL manager, without the
+# password hash its sign-in query reads.
+SignedInUserRow = namedtuple('SignedInUserRow', [
+    'id', 'full_name', 'email', 'farming_experience', 'farm_type', 'location',
+    'is_mentor', 'bio', 'created_at',
+])
+
+
+def row_factory(row_cls):
+    """sqlite3 ``row_factory`` that builds ``row_cls`` straight from the
+    fetched tuple"""
+    new = tuple.__new__
+
+    def factory(cursor, values):
+        return new(row_cls, values)
+
+    return factory
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return str(value)
+
+
+_encode_value = json.JSONEncoder(default=_default).encode
+
+# Exact types encoded without a call into the json module
+_SCALAR_ENCODERS = {
+    str: encode_basestring_ascii,
+    int: int.__repr__,
+    bool: lambda value: 'true' if value else 'false',
+    type(None): lambda value: 'null',
+}
+
+_row_templates = {}
+
+
+def _encode_row(row):
+    """A named-tuple row as a JSON object, through a per-type template of
+    its field names, without building a dict"""
+    template = _row_templates.get(type(row))
+    if template is None:
+        template = _row_templates[type(row)] = '{' + ', '.join(
+            encode_basestring_ascii(field) + ': %s' for field in row._fields
+        ) + '}'
+    scalar = _SCALAR_ENCODERS.get
+    return template % tuple([(scalar(type(value)) or _encode)(value) for value in row])
+
+
+def _encode(value):
+    if isinstance(value, tuple) and hasattr(value, '_fields'):
+        return _encode_row(value)
+    if isinstance(value, dict):
+        return '{' + ', '.join(
+            encode_basestring_ascii(str(key)) + ': ' + _encode(item)
+            for key, item in value.items()
+        ) + '}'
+    if isinstance(value, (list, tuple)):
+        return '[' + ', '.join(map(_encode, value)) + ']'
+    return _encode_value(value)
+
+
+def dumps(data):
+    """Serialize an API response to JSON, writing named-tuple rows
+    (ours or psycopg2's ``NamedTupleCursor`` rows) as JSON objects"""
+    return _encode(data)
@@ -0,0 +1,114 @@
+from collections import namedtuple
+from datetime import date
+import pytest
+from activity_partitions import (DEFAULT_PARTITION, LEGACY_PARTITION, add_months, apply_retention,
+                                 ensure_partitions)
+from query_registry import POSTGRES_QUERIES
+
+Partition = namedtuple('Partition', ['name', 'starts', 'ends', 'is_default', 'estimated_rows'])
+Watermark = namedtuple('Watermark', ['day'])
+
+
+class RecordingManager:
+    """Answers the maintenance queries from a fixed partition list and
+    records every statement run on its connection"""
+
+    def __init__(self, partitions, default_rows=(), watermark=None):
+        self.partitions = partitions
+        self.default_rows = default_rows  # created_at days held by the default partition
+        self.watermark = watermark
+        self.statements = []
+        self.conn = self
+
+    def cursor(self):
+        return RecordingCursor(self.statements)
+
+    def execute_query(self, query, params=None):
+        if query == POSTGRES_QUERIES.sql('activity.partitions'):
+            return list(self.partitions)
+        if query == POSTGRES_QUERIES.sql('activity.rollup_watermark'):
+            return [Watermark(self.watermark)]
+        if query.startswith(f'SELECT 1 FROM {DEFAULT_PARTITION}'):
+            starts, ends = params
+            return [(1,)] if any(starts <= day < ends for day in self.default_rows) else []
+        raise AssertionError(f"unexpected query: {query}")
+
+
+class RecordingCursor:
+    rowcount = 0
+
+    def __init__(self, statements):
+        self.statements = statements
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.statements.append(' '.join(statement.split()))
+
+
+def monthly(year, month):
+    starts = date(year, month, 1)
+    return Partition(f'user_activity_p{starts:%Y_%m}', starts, add_months(starts, 1), False, 0)
+
+
+LEGACY = Partition(LEGACY_PARTITION, None, date(2024, 2, 1), False, 0)
+DEFAULT = Partition(DEFAULT_PARTITION, None, None, True, 0)
+
+
+@pytest.mark.parametrize('day, months, expected', [
+    (date(2024, 11, 15), 1, date(2024, 12, 1)),
+    (date(2024, 11, 15), 2, date(2025, 1, 1)),
+    (date(2024, 1, 31), -1, date(2023, 12, 1)),
+    (date(2024, 3, 1), -14, date(2023, 1, 1)),
+    (date(2024, 3, 1), 0, date(2024, 3, 1)),
+])
+def test_add_months(day, months, expected):
+    assert add_months(day, months) == expected
+
+
+def test_partitions_resume_after_the_last_one_and_empty_the_default():
+    # Maintenance last ran in February; April's rows went to the default
+    manager = RecordingManager([LEGACY, monthly(2024, 2), DEFAULT],
+                               default_rows=[date(2024, 4, 20)])
+
+    created = ensure_partitions(manager, months_ahead=1, today=date(2024, 6, 10))
+
+    assert created == [f'user_activity_p2024_{month:02}' for month in range(3, 8)]
+    moved = manager.statements.index('CREATE TABLE user_activity_p2024_04 '
+                                     '(LIKE user_activity INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    assert manager.statements[moved - 1] == 'BEGIN'
+    assert manager.statements[moved + 1].startswith(f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION}')
+    assert manager.statements[moved + 2] == ("ALTER TABLE user_activity ATTACH PARTITION "
+                                             "user_activity_p2024_04 FOR VALUES FROM ('2024-04-01') "
+                                             "TO ('2024-05-01')")
+    assert manager.statements[moved + 3] == 'COMMIT'
+    assert ("CREATE TABLE user_activity_p2024_03 PARTITION OF user_activity "
+            "FOR VALUES FROM ('2024-03-01') TO ('2024-04-01')") in manager.statements
+
+
+def test_partitions_made_far_enough_ahead_are_left_alone():
+    manager = RecordingManager([LEGACY] + [monthly(2024, month) for month in range(2, 10)] + [DEFAULT])
+
+    assert ensure_partitions(manager, months_ahead=3, today=date(2024, 6, 10)) == []
+    assert manager.statements == []
+
+
+def test_retention_rolls_up_then_drops_whole_months_past_the_cutoff():
+    manager = RecordingManager([LEGACY, monthly(2024, 2), monthly(2024, 3), monthly(2024, 4),
+                                DEFAULT], watermark=date(2025, 3, 1))
+
+    dropped = apply_retention(manager, retention_months=12, today=date(2025, 3, 10))
+
+    # The cutoff is 2024-03-01: February ends on it, March ends after it
+    assert dropped == [LEGACY_PARTITION, 'user_activity_p2024_02']
+    assert manager.statements[0].startswith('INSERT INTO user_activity_daily')
+    assert manager.statements[1:] == [
+        f'ALTER TABLE user_activity DETACH PARTITION {LEGACY_PARTITION}',
+        f'DROP TABLE {LEGACY_PARTITION}',
+        'ALTER TABLE user_activity DETACH PARTITION user_activity_p2024_02',
+        'DROP TABLE user_activity_p2024_02',
+    ]
@@ -0,0 +1,105 @@
+import socket
+import threading
+import time
+from admission import AdmissionController, ClientBuckets, RouteBudget, TokenBucket
+import web_server
+
+
+def test_token_bucket_refills_up_to_its_capacity():
+    bucket = TokenBucket(rate=2.0, capacity=3, now=0.0)
+
+    assert [bucket.take(0.0) for _ in range(3)] == [0, 0, 0]
+    assert bucket.take(0.0) == 0.5
+    # Half a second at two tokens a second buys one request
+    assert bucket.take(0.5) == 0
+    assert bucket.take(0.5) > 0
+    # An idle minute refills to capacity, not beyond
+    assert [bucket.take(60.0) for _ in range(4)][-1] > 0
+
+
+def test_least_recently_seen_client_is_forgotten_first():
+    buckets = ClientBuckets(rate=0.001, capacity=1, max_clients=2)
+    assert buckets.take('a', 0.0) == 0
+    assert buckets.take('b', 0.0) == 0
+    assert buckets.take('a', 0.0) > 0  # 'a' is now the most recent
+
+    assert buckets.take('c', 0.0) == 0
+
+    assert len(buckets) == 2
+    assert buckets.take('a', 0.0) > 0
+    # 'b' was evicted, so it starts over with a full bucket
+    assert buckets.take('b', 0.0) == 0
+
+
+def test_clients_over_their_rate_get_429_with_retry_after():
+    controller = AdmissionController({'read': RouteBudget(0.01, 2, 1000.0, 1000, None, 0.5)})
+    for _ in range(2):
+        controller.admit('10.0.0.1', 'read').release()
+
+    rejected = controller.admit('10.0.0.1', 'read')
+
+    assert (rejected.admitted, rejected.status) == (False, 429)
+    assert rejected.retry_after >= 1
+    assert controller.admit('10.0.0.2', 'read').admitted
+    assert controller.snapshot()['counters']['rejected_429.read'] == 1
+
+
+def test_queued_requests_are_shed_after_their_timeout():
+    controller = AdmissionController({'read': RouteBudget(100.0, 100, 100.0, 100, None, 0.1)},
+                                     max_in_flight=1, queue_size=1)
+    running = controller.admit('a', 'read')
+    assert running.admitted
+
+    started = time.monotonic()
+    waited = controller.admit('b', 'read')
+
+    assert waited.status == 503
+    assert time.monotonic() - started >= 0.1
+    assert controller.snapshot()['queued'] == 0
+    running.release()
+
+
+def test_a_released_slot_goes_to_the_queued_request():
+    controller = AdmissionController({'read': RouteBudget(100.0, 100, 100.0, 100, None, 5.0)},
+                                     max_in_flight=1, queue_size=1)
+    running = controller.admit('a', 'read')
+    threading.Timer(0.05, running.release).start()
+
+    queued = controller.admit('b', 'read')
+
+    assert queued.admitted
+    queued.release()
+    assert controller.snapshot()['in_flight'] == 0
+
+
+def test_full_queue_is_shed_at_once():
+    controller = AdmissionController({'read': RouteBudget(100.0, 100, 100.0, 100, None, 5.0)},
+                                     max_in_flight=1, queue_size=0)
+    running = controller.admit('a', 'read')
+
+    started = time.monotonic()
+    assert controller.admit('b', 'read').status == 503
+    assert time.monotonic() - started < 1
+    running.release()
+
+
+def test_accept_loop_answers_503_when_no_worker_can_take_the_connection(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    server = web_server.FarmConnectServer(('127.0.0.1', 0), web_server.FarmConnectHandler,
+                                          pending_connections=0)
+    slots = 0
+    while server.connection_slots.acquire(blocking=False):
+        slots += 1
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with socket.create_connection(server.server_address, timeout=5) as client:
+            response = client.makefile('rb').read()
+        assert response.startswith(b'HTTP/1.1 503 ')
+        assert b'Retry-After: 1' in response
+        assert server.metrics()['overloaded_connections'] == 1
+    finally:
+        server.shutdown()
+        for _ in range(slots):
+            server.connection_slots.release()
+        server.server_close()
@@ -0,0 +1,78 @@
+import shutil
+import sqlite3
+import tempfile
+import threading
+import pytest
+from backup import list_snapshots, measure_write_latency, percentile, restore, snapshot, verify
+from forum_management import ForumManager
+from migrations import migrate
+from user_management import UserManager
+
+
+def counts(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        posts = conn.execute('SELECT COUNT(*), MAX(id) FROM posts').fetchone()
+        mismatched = conn.execute('''
+            SELECT COUNT(*) FROM posts p
+            WHERE p.comments_count != (SELECT COUNT(*) FROM comments c WHERE c.post_id = p.id)
+        ''').fetchone()[0]
+        return posts, mismatched
+    finally:
+        conn.close()
+
+
+def test_snapshot_taken_during_writes_restores_consistently(tmp_path):
+    db_path = str(tmp_path / 'farmconnect.db')
+    backup_dir = str(tmp_path / 'backups')
+    migrate(db_path)
+    UserManager(db_path).create_user('Ann', 'ann@example.com', 'secret', 'beginner', 'crops', 'Iowa')
+    forum = ForumManager(db_path)
+    for i in range(200):
+        forum.create_post(1, f'Post {i}', 'x' * 2000, 'crops')
+
+    stop = threading.Event()
+    written = []
+
+    def write():
+        # Each post and each of its comments is one transaction
+        while not stop.is_set():
+            post_id = forum.create_post(1, 'During backup', 'y' * 2000, 'crops')['post_id']
+            for _ in range(3):
+                forum.add_comment(1, post_id, 'Nice')
+            written.append(post_id)
+
+    writer = threading.Thread(target=write)
+    writer.start()
+    try:
+        # A page per step, so the copy spans many of the writer's commits
+        path = snapshot(db_path, backup_dir, pages=1, pause=0.001)
+    finally:
+        stop.set()
+        writer.join()
+    assert written
+    final = counts(db_path)
+
+    result = restore(path, db_path, backup_dir)
+
+    assert result['success'], result['message']
+    assert verify(db_path) == []
+    (restored_posts, last_id), mismatched = counts(db_path)
+    # A committed prefix of the writes: whole posts, each with its comments
+    assert mismatched == 0
+    assert 200 <= restored_posts < final[0][0]
+    assert restored_posts == last_id
+    # The database as it was before the restore was kept, and restores too
+    assert result['previous'] in list_snapshots(backup_dir)
+    assert restore(result['previous'], db_path, backup_dir)['success']
+    assert counts(db_path) == final
+
+
+@pytest.mark.skipif(shutil.disk_usage(tempfile.gettempdir()).free < 2**30, reason="needs 1 GB of free disk")
+def test_backup_leaves_commit_latency_alone(tmp_path):
+    # Scaled down from `python backup.py bench`; long enough for the
+    # writer to commit throughout a backup of many steps
+    idle, during, took = measure_write_latency(str(tmp_path), size_mb=128, seconds=0.5, pages=256)
+
+    assert len(during) >= 20, f"only {len(during)} commits in a {took:.2f} s backup"
+    assert percentile(during, 0.5) < 2 * percentile(idle, 0.5)
@@ -0,0 +1,62 @@
+import threading
+from feeds import LATEST, FeedStore
+
+
+def test_notify_fans_out_new_posts_in_one_batch():
+    posts = [(1, 'crops', 'dairy', 0.5, 36.5)]
+    queries = []
+    fetched = threading.Event()
+
+    def fetch_since(after_id, limit):
+        queries.append(after_id)
+        fetched.set()
+        return [post for post in posts if post[0] > after_id][:limit]
+
+    feeds = FeedStore(fetch_since, catch_up_interval=60)
+    feeds.seed(posts)
+    feeds.start()
+    try:
+        posts += [(2, 'crops', 'dairy', 0.5, 36.5), (3, 'weather', 'poultry', None, None)]
+        feeds.notify()
+        assert fetched.wait(5)
+    finally:
+        feeds.stop()
+
+    assert queries == [1]
+    assert feeds.page([LATEST]) == [3, 2, 1]
+    assert feeds.page([('category', 'crops'), ('farm_type', 'dairy')]) == [2, 1]
+
+
+def test_start_warms_up_before_catching_up():
+    posts = [(1, 'crops', 'dairy', None, None), (2, 'weather', 'dairy', None, None)]
+    queries = []
+    fetched = threading.Event()
+
+    def fetch_since(after_id, limit):
+        queries.append(after_id)
+        fetched.set()
+        return []
+
+    feeds = FeedStore(fetch_since, catch_up_interval=60)
+    feeds.start(warm=lambda: feeds.seed(posts))
+    try:
+        feeds.notify()
+        assert fetched.wait(5)
+    finally:
+        feeds.stop()
+
+    assert queries == [2]
+    assert feeds.page([LATEST]) == [2, 1]
+
+
+def test_seed_merges_into_timelines_and_trims_them():
+    feeds = FeedStore(max_timeline=4)
+    feeds.seed([(post_id, 'crops', None, None, None) for post_id in (2, 4, 6)])
+    feeds.seed([(post_id, 'crops', None, None, None) for post_id in (1, 3, 4, 5, 7)])
+
+    assert feeds.page([('category', 'crops')], limit=10) == [7, 6, 5, 4, 3, 2, 1]
+
+    feeds.seed([(post_id, 'weather', None, None, None) for post_id in (8, 9)])
+
+    assert feeds.page([LATEST], limit=10) == [9, 8, 7, 6]
+    assert feeds.page([('category', 'weather')], limit=10) == [9, 8]
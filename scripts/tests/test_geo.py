@@ -0,0 +1,25 @@
+import pytest
+from geo import GAZETTEER, normalize_location
+
+
+@pytest.mark.parametrize('location, place', [
+    ('Iowa, USA', 'iowa'),
+    ('Ames, Iowa, USA', 'iowa'),
+    ('Denver, CO, USA', 'colorado'),
+    ('DE, United States', 'delaware'),
+    ('CO', 'colorado'),
+    ('Nairobi, Kenya', 'kenya'),
+    ('Toronto, Ontario, Canada', 'ontario'),
+    ('Washington D.C.', 'district of columbia'),
+])
+def test_locations_resolve_to_the_most_specific_known_part(location, place):
+    assert normalize_location(location) == GAZETTEER[place]
+
+
+@pytest.mark.parametrize('location', ['Berlin, DE', 'Bogota, CO', 'Mumbai, IN', 'Springfield', ''])
+def test_unknown_places_and_state_codes_outside_the_us_resolve_to_nothing(location):
+    assert normalize_location(location) is None
+
+
+def test_state_codes_give_way_to_the_country_named():
+    assert normalize_location('Calgary, CA, Canada') == GAZETTEER['canada']
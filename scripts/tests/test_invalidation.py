@@ -0,0 +1,161 @@
+import socket
+import threading
+import time
+import types
+import pytest
+import invalidation
+from invalidation import CHANNEL, InvalidationListener, LocalCache
+
+
+class Error(Exception):
+    pass
+
+
+class Broker:
+    """Stands in for the Postgres server: delivers NOTIFY payloads to every
+    connection LISTENing on CHANNEL and can drop them all"""
+
+    def __init__(self):
+        self.connections = []
+        self.connects = 0
+        self.lock = threading.Lock()
+
+    def connect(self, **params):
+        with self.lock:
+            self.connects += 1
+            conn = StubConnection(self)
+            self.connections.append(conn)
+            return conn
+
+    def notify(self, payload):
+        with self.lock:
+            for conn in self.connections:
+                if conn.listening:
+                    conn.deliver(payload)
+
+    def drop_all(self):
+        with self.lock:
+            for conn in self.connections:
+                conn.drop()
+            self.connections = []
+
+
+class StubConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.listening = False
+        self.dropped = False
+        self.notifies = []
+        self._queued = []
+        self._server, self._client = socket.socketpair()
+
+    def fileno(self):
+        return self._client.fileno()
+
+    def cursor(self):
+        return StubCursor(self)
+
+    def deliver(self, payload):
+        self._queued.append(types.SimpleNamespace(channel=CHANNEL, payload=payload))
+        self._server.send(b'!')
+
+    def drop(self):
+        self.dropped = True
+        self._server.send(b'!')
+
+    def poll(self):
+        self._client.recv(1024)
+        if self.dropped:
+            raise Error("server closed the connection unexpectedly")
+        self.notifies.extend(self._queued)
+        self._queued = []
+
+    def close(self):
+        self._server.close()
+        self._client.close()
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement):
+        assert statement == f"LISTEN {CHANNEL}"
+        self.conn.listening = True
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def broker(monkeypatch):
+    broker = Broker()
+    monkeypatch.setattr(invalidation, 'POLL_SECONDS', 0.05)
+    monkeypatch.setattr(invalidation, 'psycopg2',
+                        types.SimpleNamespace(connect=broker.connect, Error=Error))
+    return broker
+
+
+def start_process(processes):
+    """A cache kept fresh by its own listener, as in one server process"""
+    cache = LocalCache()
+
+    def on_reset(listening):
+        cache.clear()
+        cache.enabled = listening
+
+    listener = InvalidationListener({}, cache.invalidate, on_reset, reconnect=0.05)
+    listener.start()
+    processes.append(listener)
+    return cache, listener
+
+
+@pytest.fixture
+def processes():
+    processes = []
+    yield processes
+    for listener in processes:
+        listener.stop()
+
+
+def test_notify_evicts_every_process_cache(broker, processes):
+    writer, writer_listener = start_process(processes)
+    reader, reader_listener = start_process(processes)
+    wait_for(lambda: writer_listener.listening and reader_listener.listening)
+    for cache in (writer, reader):
+        cache.put('feed', ('crops', 20, 0), ['cached page'], ttl=30, tag='crops')
+        cache.put('feed', ('weather', 20, 0), ['other page'], ttl=30, tag='weather')
+
+    # The posts trigger's notification after the writer commits
+    broker.notify('feed:crops')
+
+    wait_for(lambda: reader.get('feed', ('crops', 20, 0)) is None)
+    wait_for(lambda: writer.get('feed', ('crops', 20, 0)) is None)
+    assert reader.get('feed', ('weather', 20, 0)) == ['other page']
+
+
+def test_listener_reconnects_after_a_drop(broker, processes):
+    cache, listener = start_process(processes)
+    wait_for(lambda: listener.listening)
+    cache.put('mentors', 'all', ['mentor'], ttl=300)
+
+    broker.drop_all()
+
+    # Caching pauses and the cache is flushed while disconnected...
+    wait_for(lambda: broker.connects == 2 and listener.listening)
+    assert cache.get('mentors', 'all') is None
+    # ...and notifications arrive on the new connection
+    cache.put('mentors', 'all', ['mentor'], ttl=300)
+    broker.notify('mentors:*')
+    wait_for(lambda: cache.get('mentors', 'all') is None)
+    assert listener.received == 1
@@ -0,0 +1,17 @@
+import profiling
+from profiling import MAX_ROUTE_KEYS, route_key
+
+
+def test_parameters_and_query_strings_share_a_route_key(monkeypatch):
+    monkeypatch.setattr(profiling, '_route_keys', set())
+    assert route_key('GET', '/api/posts/1') == route_key('GET', '/api/posts/2?x=1') == 'GET_api_posts_id'
+    assert route_key('GET', '/media/a.jpg') == 'GET_media_name'
+    assert route_key('POST', '/api/like?ref=feed') == 'POST_api_like'
+
+
+def test_route_keys_are_capped(monkeypatch):
+    monkeypatch.setattr(profiling, '_route_keys', set())
+    keys = {route_key('GET', f'/probe/{i}') for i in range(MAX_ROUTE_KEYS * 2)}
+    assert len(keys) == MAX_ROUTE_KEYS + 1
+    assert 'GET_other' in keys
+    assert route_key('GET', '/probe/0') == 'GET_probe_0'
@@ -0,0 +1,115 @@
+import types
+from collections import namedtuple
+import pytest
+import postgresql_manager
+from postgresql_manager import PostgreSQLFarmConnectManager
+from query_registry import POSTGRES_QUERIES
+
+Row = namedtuple('Row', ['host', 'lag_seconds'])
+
+
+class Error(Exception):
+    pass
+
+
+class OperationalError(Error):
+    pass
+
+
+class StubConnection:
+    """Records every statement it runs as (host, statement)"""
+
+    def __init__(self, host, log, failing):
+        self.host = host
+        self.log = log
+        self.failing = failing
+        self.closed = False
+        self.autocommit = False
+
+    def cursor(self, cursor_factory=None):
+        return StubCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+        self.rows = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        if self.conn.host in self.conn.failing:
+            raise OperationalError("server closed the connection unexpectedly")
+        if statement.startswith('EXECUTE'):
+            self.conn.log.append((self.conn.host, statement.split()[1]))
+            self.description = [('host',), ('lag_seconds',)]
+            self.rows = [Row(self.conn.host, 0)]
+
+    def fetchall(self):
+        return self.rows
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    log, failing = [], set()
+
+    def connect(**params):
+        if params['host'] in failing:
+            raise OperationalError(f"could not connect to {params['host']}")
+        return StubConnection(params['host'], log, failing)
+
+    stub = types.SimpleNamespace(connect=connect, Error=Error, OperationalError=OperationalError,
+                                 InterfaceError=OperationalError, IntegrityError=Error)
+    monkeypatch.setattr(postgresql_manager, 'psycopg2', stub)
+    monkeypatch.setattr(postgresql_manager, 'psycopg2_extras',
+                        types.SimpleNamespace(NamedTupleCursor=None))
+    manager = PostgreSQLFarmConnectManager(host='primary', replicas=[{'host': 'replica'}])
+    manager.log, manager.failing = log, failing
+    yield manager
+    manager.disconnect()
+
+
+def served_by(manager, user_id=None):
+    """The endpoint that ran a posts read"""
+    del manager.log[:]
+    manager.execute_read('forum.posts', (20, 0), user_id)
+    statement = POSTGRES_QUERIES.prepared_name('forum.posts')
+    return [host for host, name in manager.log if name == statement]
+
+
+def test_reads_go_to_the_replica(manager):
+    assert served_by(manager) == ['replica']
+    assert served_by(manager, 'u1') == ['replica']
+
+
+def test_writers_read_their_writes_from_the_primary(manager, monkeypatch):
+    manager.record_write('u1')
+
+    assert manager.is_sticky('u1')
+    assert not manager.is_sticky('u2')
+    assert served_by(manager, 'u1') == ['primary']
+    assert served_by(manager, 'u2') == ['replica']
+
+    # Once sticky_seconds have passed the writer is back on the replica
+    now = postgresql_manager.time.monotonic()
+    monkeypatch.setattr(postgresql_manager.time, 'monotonic', lambda: now + manager.sticky_seconds)
+    assert not manager.is_sticky('u1')
+    assert served_by(manager, 'u1') == ['replica']
+
+
+def test_failing_replica_falls_back_to_the_primary(manager):
+    assert served_by(manager) == ['replica']
+    manager.failing.add('replica')
+
+    # The failed query is retried on the primary and the replica skipped
+    assert served_by(manager) == ['primary']
+    assert manager.replicas[0].conn is None
+    assert served_by(manager) == ['primary']
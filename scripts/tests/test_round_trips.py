@@ -0,0 +1,87 @@
+import types
+from collections import namedtuple
+import pytest
+import postgresql_manager
+from postgresql_manager import PostgreSQLFarmConnectManager
+from round_trips import measure
+from rows import SignedInUserRow
+
+Row = namedtuple('Row', SignedInUserRow._fields + ('name', 'action', 'password_hash'))
+WRITES = ('create_user', 'create_post', 'like_post', 'unlike_post', 'add_comment',
+          'request_mentorship')
+
+
+class Error(Exception):
+    pass
+
+
+class StubConnection:
+    """Answers every statement with one generic row"""
+
+    def __init__(self):
+        self.statements = []
+        self.closed = False
+        self.autocommit = False
+
+    def cursor(self, cursor_factory=None):
+        return StubCursor(self)
+
+    def close(self):
+        self.closed = True
+
+
+class StubCursor:
+    def __init__(self, conn):
+        self.conn = conn
+        self.description = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        self.conn.statements.append(tuple(statement.split()[:2]))
+        if statement.startswith('EXECUTE'):
+            self.description = [(field,) for field in Row._fields]
+
+    def fetchall(self):
+        return [Row._make(['row-id'] + [None] * 8 + ['General', 'liked', 'password'])]
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(postgresql_manager, 'psycopg2', types.SimpleNamespace(
+        connect=lambda **params: StubConnection(), Error=Error, IntegrityError=Error))
+    monkeypatch.setattr(postgresql_manager, 'psycopg2_extras',
+                        types.SimpleNamespace(NamedTupleCursor=None))
+    monkeypatch.setattr(postgresql_manager, 'bcrypt', types.SimpleNamespace(
+        gensalt=lambda: b'', hashpw=lambda password, salt: password,
+        checkpw=lambda password, hashed: password == hashed))
+    manager = PostgreSQLFarmConnectManager()
+    yield manager
+    manager.disconnect()
+
+
+def test_collapsed_writes_take_one_round_trip(manager):
+    cold, warm = measure(manager)
+
+    for label in WRITES:
+        assert warm[label] == 1, label
+    # Sign-in reads the user, then records the login and activity together
+    assert warm['authenticate_user'] == 2
+    assert warm['get_posts'] == 1
+    # The first pass also prepares each statement, once
+    assert cold['like_post'] == 2
+    assert cold['unlike_post'] == 1
+
+
+def test_each_statement_is_prepared_once(manager):
+    measure(manager)
+
+    statements = manager.conn.statements
+    prepared = [name for verb, name in statements if verb == 'PREPARE']
+    assert {verb for verb, name in statements} == {'PREPARE', 'EXECUTE'}
+    assert len(prepared) == len(set(prepared))
+    assert set(prepared) == {name for verb, name in statements if verb == 'EXECUTE'}
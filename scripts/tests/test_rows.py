@@ -0,0 +1,27 @@
+import json
+from collections import namedtuple
+from datetime import datetime
+import rows
+from rows import MentorRow, PostRow
+
+
+def test_rows_are_written_as_objects():
+    post = PostRow(1, 'Rain "again"', 'é\n', 'weather', datetime(2026, 1, 2, 3, 4, 5), 2, 0, None,
+                   'Ann', 'beginner', None)
+    Tagged = namedtuple('Tagged', ['id', 'tags', 'score'])
+    data = {"success": True, "posts": [post], "nested": {"mentor": MentorRow(3, 'Bo', 'expert',
+                                                                            'dairy', 'Iowa')},
+            "tagged": [Tagged(4, ['a', 'b'], 1.5)], "pair": (1, 2)}
+
+    assert json.loads(rows.dumps(data)) == {
+        "success": True,
+        "posts": [{"id": 1, "title": 'Rain "again"', "content": 'é\n', "category": 'weather',
+                   "created_at": '2026-01-02T03:04:05', "likes_count": 2, "comments_count": 0,
+                   "views_count": None, "author_name": 'Ann', "author_experience": 'beginner',
+                   "image_url": None}],
+        "nested": {"mentor": {"id": 3, "full_name": 'Bo', "farming_experience": 'expert',
+                              "specialty": 'dairy', "location": 'Iowa'}},
+        "tagged": [{"id": 4, "tags": ['a', 'b'], "score": 1.5}],
+        "pair": [1, 2],
+    }
+
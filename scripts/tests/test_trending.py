@@ -0,0 +1,106 @@
+import math
+import time
+from trending import TrendingIndex
+
+DAY = 24 * 3600
+
+
+def test_unlike_subtracts_the_decayed_like():
+    now = time.time()
+    index = TrendingIndex()
+    index.record(1, 'post', 'crops', at=now - DAY)
+    index.record(1, 'like', 'crops', at=now - DAY)
+    index.record(1, 'like', 'crops', at=now - DAY)
+    index.record(2, 'post', 'crops', at=now - DAY)
+    index.record(2, 'like', 'crops', at=now - DAY)
+
+    index.record(1, 'unlike', 'crops', at=now - DAY)
+
+    # Post then one like, exactly like post 2
+    assert index.top('crops') in ([1, 2], [2, 1])
+    assert math.isclose(index._scores[1][0], index._scores[2][0])
+
+
+def test_unlike_at_current_time_keeps_the_post():
+    now = time.time()
+    index = TrendingIndex()
+    index.record(1, 'post', 'crops', at=now - DAY)
+    index.record(1, 'like', 'crops', at=now - DAY)
+    index.record(1, 'like', 'crops', at=now - DAY)
+
+    # A like worth more today than both old likes together
+    index.record(1, 'unlike', 'crops')
+
+    assert index.top('crops') == [1]
+    assert index.top() == [1]
+
+
+def test_like_then_unlike_restores_the_score():
+    now = time.time()
+    index = TrendingIndex()
+    index.record(1, 'post', 'crops', at=now - DAY)
+    before = index._scores[1][0]
+    index.record(1, 'like', 'crops', at=now - 3600)
+    index.record(1, 'unlike', 'crops', at=now - 3600)
+
+    assert math.isclose(index._scores[1][0], before)
+    assert index.top('crops') == [1]
+
+
+def test_checkpoint_keeps_the_floor(tmp_path):
+    path = str(tmp_path / 'trending.json')
+    index = TrendingIndex(checkpoint_path=path)
+    index.record(1, 'post', 'crops', at=time.time() - DAY)
+    index.record(1, 'like', 'crops', at=time.time() - DAY)
+    index.checkpoint()
+
+    restored = TrendingIndex()
+    restored.load(path)
+    restored.record(1, 'unlike', 'crops')
+    assert restored.top('crops') == [1]
+
+
+
+def test_load_restores_rankings_within_max_posts(tmp_path):
+    path = str(tmp_path / 'trending.json')
+    index = TrendingIndex(checkpoint_path=path)
+    for post_id in range(1, 7):
+        index.record(post_id, 'post', 'crops' if post_id % 2 else 'weather',
+                     at=time.time() - post_id * 3600)
+    index.checkpoint()
+
+    restored = TrendingIndex(max_posts=4)
+    restored.load(path)
+
+    assert restored.top() == [1, 2, 3, 4]
+    assert restored.top('crops') == [1, 3]
+    assert restored.top('weather') == [2, 4]
+
+
+def test_processes_sharing_a_log_rank_alike():
+    log = []
+
+    def publish(events):
+        log.extend(events)
+
+    def fetch_since(after_id, limit):
+        return [(event_id, *event) for event_id, event in enumerate(log, 1)][after_id:after_id + limit]
+
+    first = TrendingIndex(publish=publish, fetch_since=fetch_since)
+    second = TrendingIndex(publish=publish, fetch_since=fetch_since)
+    for index in (first, second):
+        index.last_event = 0
+    now = time.time()
+    first.record(1, 'post', 'crops', at=now)
+    second.record(2, 'post', 'crops', at=now)
+    second.record(2, 'comment', 'crops', at=now)
+    first.record(1, 'like', 'crops', at=now)
+
+    # Recorded events are applied once synced, by every process
+    assert first.top('crops') == []
+    first.sync()
+    second.sync()
+    first.sync()
+
+    assert first.top('crops') == second.top('crops') == [2, 1]
+    assert first.last_event == second.last_event == 4
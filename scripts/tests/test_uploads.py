@@ -0,0 +1,45 @@
+import pytest
+from uploads import MediaStore, UploadError
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 100
+WEBP = b'RIFF\x10\x00\x00\x00WEBPVP8 ' + b'\x01' * 100
+
+
+def pieces(data, size):
+    return iter([data[i:i + size] for i in range(0, len(data), size)])
+
+
+@pytest.mark.parametrize('data, extension', [(PNG, '.png'), (WEBP, '.webp')])
+@pytest.mark.parametrize('size', [1, 5, 4096])
+def test_type_is_sniffed_across_small_chunks(tmp_path, data, extension, size):
+    store = MediaStore(root=str(tmp_path))
+
+    stored = store.save(pieces(data, size))
+
+    assert stored.extension == extension
+    assert stored.size == len(data)
+    with open(store.path_for(stored.digest + stored.extension), 'rb') as f:
+        assert f.read() == data
+
+
+@pytest.mark.parametrize('data, status', [(b'', 400), (b'RIFF', 415), (b'not an image at all', 415)])
+def test_rejected_uploads(tmp_path, data, status):
+    with pytest.raises(UploadError) as error:
+        MediaStore(root=str(tmp_path)).save(pieces(data, 2))
+    assert error.value.status == status
+
+
+def test_discard_keeps_images_stored_by_earlier_uploads(tmp_path):
+    store = MediaStore(root=str(tmp_path))
+    kept = store.save(pieces(PNG, 4096))
+    orphan = store.save(pieces(WEBP, 4096))
+    duplicate = store.save(pieces(PNG, 4096))
+
+    store.discard(orphan)
+    store.discard(duplicate)
+
+    assert not duplicate.created
+    assert store.open(orphan.digest + orphan.extension) is None
+    opened = store.open(kept.digest + kept.extension)
+    assert opened is not None
+    opened[0].close()
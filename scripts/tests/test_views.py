@@ -0,0 +1,69 @@
+import time
+from forum_management import ForumManager
+from migrations import migrate
+from query_registry import connect
+from user_management import UserManager
+from views import ViewCounter
+
+
+def test_viewers_are_deduplicated_across_processes(tmp_path):
+    db_path = str(tmp_path / 'farmconnect.db')
+    migrate(db_path)
+    UserManager(db_path).create_user('Ann', 'ann@example.com', 'secret', 'beginner', 'crops', 'Iowa')
+    forum = ForumManager(db_path)
+    post_id = forum.create_post(1, 'Rain', 'Too much', 'weather')['post_id']
+
+    ranked = []
+    # One counter per server process, sharing the database
+    first = ViewCounter(forum.add_unique_views, counted=ranked.extend)
+    second = ViewCounter(forum.add_unique_views, counted=ranked.extend)
+    assert first.record(post_id, 'reader')
+    assert second.record(post_id, 'reader')
+    assert second.record(post_id, 'other reader')
+    first.flush()
+    second.flush()
+
+    assert forum.get_post(post_id)['post'].views_count == 2
+    assert ranked == [(post_id, 'weather', 1), (post_id, 'weather', 1)]
+    assert first.pending(post_id) == second.pending(post_id) == 0
+
+
+def test_views_are_kept_while_the_database_is_down():
+    def unavailable(views, window):
+        raise OSError("database is locked")
+
+    counter = ViewCounter(unavailable, max_tracked=2)
+    for viewer in ('a', 'b', 'c'):
+        counter.record(7, viewer)
+
+    assert counter.flush() is None
+    assert counter.pending(7) == 2
+    flushed = []
+    counter.flush_views = lambda views, window: flushed.extend(views) or []
+    assert counter.flush() == 0
+    assert [viewer for post_id, viewer, seen_at in flushed] == ['b', 'c']
+    assert counter.pending(7) == 0
+
+
+def test_a_flush_is_one_statement_per_step_whatever_its_size(tmp_path):
+    db_path = str(tmp_path / 'farmconnect.db')
+    migrate(db_path)
+    UserManager(db_path).create_user('Ann', 'ann@example.com', 'secret', 'beginner', 'crops', 'Iowa')
+    forum = ForumManager(db_path)
+    rain = forum.create_post(1, 'Rain', 'Too much', 'weather')['post_id']
+    corn = forum.create_post(1, 'Corn', 'Planted', 'crops')['post_id']
+    statements = []
+    connect(db_path).set_trace_callback(statements.append)
+
+    now = time.time() - 45
+    views = [(rain, 'a', now), (rain, 'a', now + 1), (rain, 'b', now), (corn, 'a', now)]
+    views += [(corn, f'reader {i}', now) for i in range(50)]
+    gained = forum.add_unique_views(views, 60)
+
+    assert sorted(gained) == sorted([(rain, 'weather', 2), (corn, 'crops', 51)])
+    written = [s for s in statements if s.split()[0] in ('INSERT', 'UPDATE', 'DELETE')]
+    assert len(written) == 3
+    # Seen again after the window has passed
+    assert forum.add_unique_views([(rain, 'a', now + 61), (rain, 'b', now + 45)], 60) == \
+        [(rain, 'weather', 1)]
+    assert forum.get_post(rain)['post'].views_count == 3
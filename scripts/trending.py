@@ -0,0 +1,297 @@
+import calendar
+import json
+import math
+import os
+import threading
+import time
+from bisect import bisect_left, insort
+
+# How much each interaction adds to a post's score before decay
+EVENT_WEIGHTS = {
+    'post': 1.0,
+    'view': 0.1,
+    'like': 1.0,
+    'unlike': -1.0,
+    'comment': 3.0,
+}
+
+# Scores halve every HALF_LIFE_HOURS. Scores are stored as the log of the
+# decayed sum relative to a fixed epoch, so decay never has to be applied
+# to stored scores and comparing two posts stays valid forever.
+HALF_LIFE_HOURS = 12.0
+MAX_TRACKED_POSTS = 20000
+CHECKPOINT_INTERVAL = 60.0
+ALL_CATEGORIES = None
+# Processes sharing an event log apply it this often, this many events
+# per query, and keep events this long for those catching up from an
+# older checkpoint
+SYNC_INTERVAL = 1.0
+SYNC_BATCH = 1000
+EVENT_RETENTION = 3600.0
+
+
+def _log_sub(a, b):
+    """log(exp(a) - exp(b)), or -inf when the result is not positive"""
+    if b >= a:
+        return -math.inf
+    return a + math.log1p(-math.exp(b - a))
+
+
+class TrendingIndex:
+    """Hot ranking of posts per category, updated incrementally in memory
+
+    Rankings are sorted lists of (-score, post_id); updating a post moves
+    one entry in its category list and in the all-categories list.
+
+    Server processes rank alike by sharing an event log: with ``publish``
+    set, ``record`` only queues the interaction, and every ``sync`` appends
+    the queue to the log and applies the log's new events in id order,
+    this process's included. ``last_event`` is the id of the last event
+    applied and is saved with checkpoints, so a process starting from a
+    checkpoint catches up from there.
+    """
+
+    def __init__(self, checkpoint_path=None, half_life_hours=HALF_LIFE_HOURS,
+                 max_posts=MAX_TRACKED_POSTS, checkpoint_interval=CHECKPOINT_INTERVAL,
+                 publish=None, fetch_since=None, prune=None, sync_interval=SYNC_INTERVAL):
+        """publish(events) appends (post_id, event, category, at, count)
+        rows to the shared log, fetch_since(after_id, limit) returns (id,
+        post_id, event, category, at, count) rows of it in id order, and
+        prune(before) drops events logged before a time"""
+        self.checkpoint_path = checkpoint_path
+        self.decay_rate = math.log(2) / (half_life_hours * 3600)
+        self.max_posts = max_posts
+        self.checkpoint_interval = checkpoint_interval
+        self.publish = publish
+        self.fetch_since = fetch_since
+        self.prune = prune
+        self.sync_interval = sync_interval
+        self.last_event = None
+        self._outbox = []
+        self._scores = {}
+        # Score of each post's own 'post' event: removing likes never takes
+        # a post below what it scored for being posted
+        self._floors = {}
+        self._rankings = {ALL_CATEGORIES: []}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._dirty = False
+
+    def record(self, post_id, event, category=None, at=None, count=1):
+        """Apply an interaction (see EVENT_WEIGHTS) to a post's score
+
+        ``at`` is when the interaction happened, in seconds or as a SQLite
+        timestamp. For an 'unlike' it should be when the removed like was
+        made, so the like's decayed weight is what gets subtracted.
+        """
+        when = time.time() if at is None else _timestamp(at)
+        if self.publish is None:
+            self._apply(post_id, event, category, when, count)
+        else:
+            with self._lock:
+                self._outbox.append((post_id, event, category, when, count))
+
+    def _apply(self, post_id, event, category, when, count, event_id=None):
+        weight = EVENT_WEIGHTS[event] * count
+        delta = math.log(abs(weight)) + when * self.decay_rate if weight else None
+
+        with self._lock:
+            if event_id is not None:
+                self.last_event = event_id
+            if delta is None:
+                return
+            if event == 'post':
+                self._floors.setdefault(post_id, delta)
+            current = self._scores.get(post_id)
+            if current is None:
+                if weight < 0:
+                    return
+                self._insert(post_id, category, delta)
+            else:
+                score, known_category = current
+                category = category or known_category
+                self._remove(post_id, score, known_category)
+                if weight > 0:
+                    score = max(score, delta) + math.log1p(math.exp(-abs(score - delta)))
+                else:
+                    score = max(_log_sub(score, delta), self._floors.get(post_id, -math.inf))
+                if score == -math.inf:
+                    del self._scores[post_id]
+                    self._floors.pop(post_id, None)
+                else:
+                    self._insert(post_id, category, score)
+            self._dirty = True
+
+    def top(self, category=ALL_CATEGORIES, limit=20, offset=0):
+        """Post ids ranked hottest first"""
+        with self._lock:
+            ranking = self._rankings.get(category, [])
+            return [post_id for _, post_id in ranking[offset:offset + limit]]
+
+    def __len__(self):
+        return len(self._scores)
+
+    def _insert(self, post_id, category, score):
+        self._scores[post_id] = (score, category)
+        insort(self._rankings[ALL_CATEGORIES], (-score, post_id))
+        if category is not ALL_CATEGORIES:
+            insort(self._rankings.setdefault(category, []), (-score, post_id))
+        if len(self._scores) > self.max_posts:
+            _, coldest = self._rankings[ALL_CATEGORIES][-1]
+            coldest_score, coldest_category = self._scores.pop(coldest)
+            self._floors.pop(coldest, None)
+            self._remove(coldest, coldest_score, coldest_category)
+
+    def _remove(self, post_id, score, category):
+        for key in {ALL_CATEGORIES, category}:
+            ranking = self._rankings.get(key)
+            if ranking:
+                position = bisect_left(ranking, (-score, post_id))
+                if position < len(ranking) and ranking[position][1] == post_id:
+                    del ranking[position]
+
+    def seed(self, posts):
+        """Score posts not yet tracked from (id, category, created_at,
+        likes_count, comments_count) rows, e.g. after a cold start"""
+        for post_id, category, created_at, likes, comments in posts:
+            if post_id in self._scores:
+                continue
+            at = _timestamp(created_at)
+            self._apply(post_id, 'post', category, at, 1)
+            if likes > 0:
+                self._apply(post_id, 'like', category, at, likes)
+            if comments > 0:
+                self._apply(post_id, 'comment', category, at, comments)
+
+    def sync(self):
+        """Append recorded events to the shared log and apply the events
+        logged since ``last_event``; returns how many were applied"""
+        with self._lock:
+            outbox, self._outbox = self._outbox, []
+        if outbox:
+            try:
+                self.publish(outbox)
+            except Exception:
+                with self._lock:
+                    self._outbox[:0] = outbox
+                raise
+        applied = 0
+        while True:
+            events = self.fetch_since(self.last_event or 0, SYNC_BATCH)
+            for event_id, post_id, event, category, at, count in events:
+                self._apply(post_id, event, category, at, count, event_id)
+            applied += len(events)
+            if len(events) < SYNC_BATCH:
+                return applied
+
+    def load(self, path=None):
+        """Restore the last checkpoint, if any, from path or checkpoint_path"""
+        path = path or self.checkpoint_path
+        if not path or not os.path.exists(path):
+            return False
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Warning: ignoring unreadable trending checkpoint: {e}")
+            return False
+        scale = data.get('decay_rate', self.decay_rate)
+        with self._lock:
+            self.last_event = data.get('last_event')
+            for post_id, category, score, *floor in data['posts']:
+                # Roughly re-express scores saved under a different half-life
+                score = score * self.decay_rate / scale
+                self._scores[post_id] = (score, category)
+                self._rankings[ALL_CATEGORIES].append((-score, post_id))
+                if category is not ALL_CATEGORIES:
+                    self._rankings.setdefault(category, []).append((-score, post_id))
+                if floor and floor[0] is not None:
+                    self._floors[post_id] = floor[0] * self.decay_rate / scale
+            # Sorted once rather than kept sorted per post: a checkpoint
+            # holds thousands of posts
+            for ranking in self._rankings.values():
+                ranking.sort()
+            while len(self._scores) > self.max_posts:
+                _, coldest = self._rankings[ALL_CATEGORIES][-1]
+                coldest_score, coldest_category = self._scores.pop(coldest)
+                self._floors.pop(coldest, None)
+                self._remove(coldest, coldest_score, coldest_category)
+        return True
+
+    def checkpoint(self):
+        """Write the scores to checkpoint_path atomically"""
+        if not self.checkpoint_path:
+            return
+        with self._lock:
+            if not self._dirty:
+                return
+            posts = [[post_id, category, score, self._floors.get(post_id)]
+                     for post_id, (score, category) in self._scores.items()]
+            last_event = self.last_event
+            self._dirty = False
+        temporary = self.checkpoint_path + '.tmp'
+        with open(temporary, 'w') as f:
+            json.dump({'decay_rate': self.decay_rate, 'saved_at': time.time(),
+                       'last_event': last_event, 'posts': posts}, f)
+        os.replace(temporary, self.checkpoint_path)
+
+    def start(self, warm=None):
+        """Sync and checkpoint periodically in a background thread
+
+        warm() runs first in that thread, before the first sync, e.g. to
+        ``load`` a checkpoint and ``seed`` recent posts, so a server can
+        accept requests meanwhile.
+        """
+        if self._thread is None and (self.checkpoint_path or self.publish or warm):
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, args=(warm,), name='trending-sync',
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread, publish what is queued and write a
+        final checkpoint"""
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        if self.publish:
+            try:
+                self.sync()
+            except Exception as e:
+                print(f"Warning: could not sync trending events: {e}")
+        self.checkpoint()
+
+    def _run(self, warm):
+        if warm:
+            try:
+                warm()
+            except Exception as e:
+                print(f"Warning: could not warm trending index: {e}")
+        interval = self.sync_interval if self.publish else self.checkpoint_interval
+        next_checkpoint = time.monotonic() + self.checkpoint_interval
+        while not self._stop.wait(interval):
+            if self.publish:
+                try:
+                    self.sync()
+                except Exception as e:
+                    print(f"Warning: could not sync trending events: {e}")
+            if self.checkpoint_path and time.monotonic() >= next_checkpoint:
+                next_checkpoint = time.monotonic() + self.checkpoint_interval
+                try:
+                    self.checkpoint()
+                    if self.prune:
+                        self.prune(time.time() - EVENT_RETENTION)
+                except Exception as e:
+                    print(f"Warning: could not checkpoint trending index: {e}")
+
+
+def _timestamp(value):
+    """Seconds since the epoch for a SQLite CURRENT_TIMESTAMP string (UTC)"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(calendar.timegm(time.strptime(value, '%Y-%m-%d %H:%M:%S')))
+    except (TypeError, ValueError):
+        return time.time()
@@ -0,0 +1,300 @@
+import hashlib
+import itertools
+import os
+import re
+import tempfile
+import threading
+from collections import namedtuple
+from lazy_import import LazyModule
+
+# Pillow is optional: without it originals are stored and served but no
+# thumbnails or WebP variants are generated.
+PIL_Image = LazyModule('PIL.Image')
+PIL_ImageOps = LazyModule('PIL.ImageOps')
+# The process pool is only needed once an image is resized
+futures = LazyModule('concurrent.futures')
+multiprocessing = LazyModule('multiprocessing')
+
+MEDIA_ROOT = 'media'
+MEDIA_URL = '/media/'
+CHUNK_SIZE = 64 * 1024
+MAX_UPLOAD_BYTES = 15 * 1024 * 1024
+MAX_PART_HEADER_BYTES = 8 * 1024
+# Leading bytes sniff_extension needs to tell every accepted format apart
+SNIFF_BYTES = 12
+# Resized WebP variants generated for every image: name -> longest side
+VARIANTS = {
+    'thumb': 320,
+    'large': 1600,
+}
+# Content-addressed names are immutable, so clients may cache them forever
+CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+CONTENT_TYPES = {
+    '.jpg': 'image/jpeg',
+    '.png': 'image/png',
+    '.gif': 'image/gif',
+    '.webp': 'image/webp',
+}
+MEDIA_NAME = re.compile(r'^([0-9a-f]{64})(\.[a-z]+)?(\.[a-z]+)$')
+
+StoredImage = namedtuple('StoredImage', ['digest', 'extension', 'size', 'created'])
+
+
+class UploadError(Exception):
+    """Upload rejected; ``status`` is the HTTP status to answer with"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def sniff_extension(head):
+    """File extension for an image judged by its first SNIFF_BYTES bytes, or None"""
+    if head.startswith(b'\xff\xd8\xff'):
+        return '.jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return '.png'
+    if head.startswith((b'GIF87a', b'GIF89a')):
+        return '.gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return '.webp'
+    return None
+
+
+def read_field(chunks, limit=1024):
+    """Collect a small text form field, rejecting oversized values"""
+    value = b''
+    for chunk in chunks:
+        value += chunk
+        if len(value) > limit:
+            raise UploadError(400, "Form field too long")
+    return value.decode('utf-8')
+
+
+class MultipartReader:
+    """Streaming multipart/form-data parser over a request body
+
+    ``parts()`` yields (headers, chunks) for each part; the chunks
+    generator yields the body in pieces of at most CHUNK_SIZE and must be
+    consumed before moving on to the next part.
+    """
+
+    def __init__(self, rfile, boundary, content_length):
+        self.rfile = rfile
+        self.remaining = content_length
+        self.delimiter = b'\r\n--' + boundary
+        # The first boundary has no leading CRLF; pretend it does
+        self.buffer = b'\r\n'
+
+    @classmethod
+    def from_headers(cls, rfile, headers):
+        content_type = headers.get('Content-Type', '')
+        match = re.search(r'boundary="?([^";]+)"?', content_type)
+        if not content_type.startswith('multipart/form-data') or not match:
+            raise UploadError(400, "Expected multipart/form-data")
+        if headers.get('Content-Length') is None:
+            raise UploadError(411, "Content-Length required")
+        length = int(headers['Content-Length'])
+        if length > MAX_UPLOAD_BYTES + 64 * 1024:
+            raise UploadError(413, f"Uploads are limited to {MAX_UPLOAD_BYTES // (1024 * 1024)} MB")
+        return cls(rfile, match.group(1).encode('latin-1'), length)
+
+    def _fill(self):
+        if self.remaining <= 0:
+            return False
+        data = self.rfile.read(min(CHUNK_SIZE, self.remaining))
+        if not data:
+            raise UploadError(400, "Upload ended early")
+        self.remaining -= len(data)
+        self.buffer += data
+        return True
+
+    def _body(self):
+        keep = len(self.delimiter) - 1
+        while True:
+            index = self.buffer.find(self.delimiter)
+            if index >= 0:
+                if index:
+                    yield self.buffer[:index]
+                self.buffer = self.buffer[index + len(self.delimiter):]
+                return
+            if len(self.buffer) > keep:
+                yield self.buffer[:-keep]
+                self.buffer = self.buffer[-keep:]
+            if not self._fill():
+                raise UploadError(400, "Malformed multipart body")
+
+    def _headers(self):
+        while b'\r\n\r\n' not in self.buffer:
+            if len(self.buffer) > MAX_PART_HEADER_BYTES or not self._fill():
+                raise UploadError(400, "Malformed multipart headers")
+        raw, self.buffer = self.buffer.split(b'\r\n\r\n', 1)
+        headers = {}
+        for line in raw.decode('utf-8', 'replace').split('\r\n'):
+            name, _, value = line.partition(':')
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        disposition = headers.get('content-disposition', '')
+        headers.update(re.findall(r'(\w+)="([^"]*)"', disposition))
+        return headers
+
+    def parts(self):
+        for _ in self._body():
+            pass  # preamble
+        while True:
+            while len(self.buffer) < 2:
+                if not self._fill():
+                    raise UploadError(400, "Malformed multipart body")
+            if self.buffer.startswith(b'--'):
+                break
+            headers = self._headers()
+            body = self._body()
+            yield headers, body
+            for _ in body:
+                pass
+        # Discard the epilogue
+        while self._fill():
+            self.buffer = b''
+
+
+class MediaStore:
+    """Content-addressed image storage with background variant generation
+
+    Files are named by the SHA-256 of their content, so uploading the same
+    photo twice stores it once. Variants are generated in a process pool
+    so resizing never holds the request threads or the GIL.
+    """
+
+    def __init__(self, root=MEDIA_ROOT, max_bytes=MAX_UPLOAD_BYTES, workers=2):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self._pool = None
+        self._pool_lock = threading.Lock()
+        os.makedirs(os.path.join(root, 'tmp'), exist_ok=True)
+
+    def path_for(self, name):
+        return os.path.join(self.root, name[:2], name)
+
+    def save(self, chunks):
+        """Stream chunks to disk while hashing; returns a StoredImage
+
+        Variants are not queued here: call generate_variants once the image
+        is attached, or discard if it never is.
+        """
+        digest = hashlib.sha256()
+        size = 0
+        extension = None
+        # Chunks can be a few bytes long, so the type is sniffed once
+        # SNIFF_BYTES have arrived, or the body ended
+        head = b''
+        handle, temporary = tempfile.mkstemp(dir=os.path.join(self.root, 'tmp'))
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                for chunk in itertools.chain(chunks, [b'']):
+                    if extension is None:
+                        head += chunk
+                        if chunk and len(head) < SNIFF_BYTES:
+                            continue
+                        if not head:
+                            raise UploadError(400, "Empty upload")
+                        extension = sniff_extension(head[:SNIFF_BYTES])
+                        if extension is None:
+                            raise UploadError(415, "Only JPEG, PNG, GIF and WebP images are accepted")
+                        chunk = head
+                    size += len(chunk)
+                    if size > self.max_bytes:
+                        raise UploadError(
+                            413, f"Uploads are limited to {self.max_bytes // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+
+            name = digest.hexdigest() + extension
+            final = self.path_for(name)
+            created = not os.path.exists(final)
+            if created:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(temporary, final)
+            else:
+                os.remove(temporary)
+        except BaseException:
+            if os.path.exists(temporary):
+                os.remove(temporary)
+            raise
+
+        return StoredImage(digest.hexdigest(), extension, size, created)
+
+    def discard(self, stored):
+        """Remove an image no record ended up pointing at
+
+        Only files this upload created are removed; an identical image
+        stored earlier may still be in use.
+        """
+        if stored.created:
+            try:
+                os.remove(self.path_for(stored.digest + stored.extension))
+            except FileNotFoundError:
+                pass
+
+    def urls(self, stored):
+        """Public URLs of an image and its variants"""
+        urls = {'original': MEDIA_URL + stored.digest + stored.extension}
+        if PIL_Image.available():
+            for variant in VARIANTS:
+                urls[variant] = f"{MEDIA_URL}{stored.digest}.{variant}.webp"
+        return urls
+
+    def generate_variants(self, stored):
+        """Queue variant generation unless every variant already exists"""
+        if not PIL_Image.available():
+            return None
+        stem = self.path_for(stored.digest)
+        if all(os.path.exists(f"{stem}.{variant}.webp") for variant in VARIANTS):
+            return None
+        return self._executor().submit(
+            make_variants, self.path_for(stored.digest + stored.extension), stem, VARIANTS
+        )
+
+    def _executor(self):
+        with self._pool_lock:
+            if self._pool is None:
+                # spawn, not fork: the server process is multi-threaded
+                self._pool = futures.ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._pool
+
+    def shutdown(self):
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+    def open(self, name):
+        """Open a stored file for serving; returns (file, content_type) or None"""
+        match = MEDIA_NAME.match(name)
+        if not match:
+            return None
+        try:
+            return open(self.path_for(name), 'rb'), CONTENT_TYPES[match.group(3)]
+        except (OSError, KeyError):
+            return None
+
+
+def make_variants(source, stem, variants):
+    """Write resized WebP copies of source next to it (runs in a worker process)"""
+    with PIL_Image.open(source) as image:
+        # Decode JPEGs at reduced size when only smaller variants are needed
+        image.draft('RGB', (max(variants.values()),) * 2)
+        image = PIL_ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        for variant, longest_side in variants.items():
+            resized = image.copy()
+            resized.thumbnail((longest_side, longest_side))
+            target = f"{stem}.{variant}.webp"
+            temporary = target + '.tmp'
+            resized.save(temporary, 'WEBP', quality=80)
+            os.replace(temporary, target)
@@ -1,10 +1,15 @@
 import sqlite3
 import hashlib
 from datetime import datetime
+from query_registry import SQLITE_QUERIES, connect
+from geo import normalize_location, spatial_index_name
 
 class UserManager:
-    def __init__(self, db_path='farmconnect.db'):
+    def __init__(self, db_path='farmconnect.db', author_snapshots=None):
         self.db_path = db_path
+        # AuthorSnapshotPropagator that copies profile changes onto posts and
+        # comments; without one they are copied before update_profile returns
+        self.author_snapshots = author_snapshots
     
     def hash_password(self, password):
         """Hash a password using SHA-256"""
@@ -12,18 +17,23 @@ class UserManager:
     
     def create_user(self, full_name, email, password, farming_experience, farm_type, location):
         """Create a new user account"""
-        conn = sqlite3.connect("self.db_path") #self.db_path
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         try:
             password_hash = self.hash_password(password)
-            cursor.execute('''
-                INSERT INTO users (full_name, email, password_hash, farming_experience, farm_type, location)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (full_name, email, password_hash, farming_experience, farm_type, location))
+            coordinates = normalize_location(location) or (None, None)
+            cursor.execute(SQLITE_QUERIES.sql('users.insert'),
+                           (full_name, email, password_hash, farming_experience, farm_type, location,
+                            coordinates[0], coordinates[1]))
+            user_id = cursor.lastrowid
+            
+            # Add the user to the spatial index for location search
+            if coordinates[0] is not None and spatial_index_name(conn) == 'rtree':
+                lat, lon = coordinates
+                cursor.execute(SQLITE_QUERIES.sql('geo.index_user'), (user_id, lat, lat, lon, lon))
             
             conn.commit()
-            user_id = cursor.lastrowid
             conn.close()
             
             print(f"User {full_name} created successfully with ID: {user_id}")
@@ -38,15 +48,11 @@ class UserManager:
     
     def authenticate_user(self, email, password):
         """Authenticate a user login"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
         password_hash = self.hash_password(password)
-        cursor.execute('''
-            SELECT id, full_name, email, farming_experience, farm_type, location, is_mentor
-            FROM users 
-            WHERE email = ? AND password_hash = ?
-        ''', (email, password_hash))
+        cursor.execute(SQLITE_QUERIES.sql('users.authenticate'), (email, password_hash))
         
         user = cursor.fetchone()
         conn.close()
@@ -69,14 +75,10 @@ class UserManager:
 
     def get_user_profile(self, user_id):
         """Get user profile information"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect(self.db_path)
         cursor = conn.cursor()
         
-        cursor.execute('''
-            SELECT id, full_name, email, farming_experience, farm_type, location, is_mentor, created_at
-            FROM users 
-            WHERE id = ?
-        ''', (user_id,))
+        cursor.execute(SQLITE_QUERIES.sql('users.profile'), (user_id,))
         
         user = cursor.fetchone()
         conn.close()
@@ -98,6 +100,71 @@ class UserManager:
         else:
             return {"success": False, "message": "User not found!"}
 
+    def update_profile(self, user_id, full_name=None, farming_experience=None):
+        """Update a user's display name and/or farming experience"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(SQLITE_QUERIES.sql('users.update_profile'),
+                           (full_name, farming_experience, user_id))
+            if cursor.rowcount == 0:
+                conn.close()
+                return {"success": False, "message": "User not found!"}
+            
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            conn.close()
+            return {"success": False, "message": f"Error updating profile: {str(e)}"}
+        
+        if self.author_snapshots:
+            self.author_snapshots.enqueue(user_id)
+        else:
+            while self.sync_author_snapshot(user_id) > 0:
+                pass
+        return {"success": True, "message": "Profile updated successfully!"}
+    
+    def set_profile_image(self, user_id, image_url):
+        """Point a user's profile image at an uploaded file"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute(SQLITE_QUERIES.sql('users.set_profile_image'), (image_url, user_id))
+            updated = cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        
+        if not updated:
+            return {"success": False, "message": "User not found!"}
+        return {"success": True, "message": "Profile image updated successfully!"}
+    
+    def sync_author_snapshot(self, user_id, batch_size=500):
+        """Copy a user's current display fields onto at most batch_size of
+        their posts and comments; returns how many rows were rewritten"""
+        conn = connect(self.db_path)
+        cursor = conn.cursor()
+        
+        cursor.execute(SQLITE_QUERIES.sql('users.author_fields'), (user_id,))
+        user = cursor.fetchone()
+        if not user:
+            conn.close()
+            return 0
+        
+        params = {"user_id": user_id, "full_name": user[0], "farming_experience": user[1],
+                  "batch_size": batch_size}
+        try:
+            cursor.execute(SQLITE_QUERIES.sql('authors.sync_posts'), params)
+            updated = cursor.rowcount
+            cursor.execute(SQLITE_QUERIES.sql('authors.sync_comments'), params)
+            updated += cursor.rowcount
+            conn.commit()
+        finally:
+            conn.close()
+        return updated
+
 # Example usage
 if __name__ == "__main__":
     user_manager = UserManager()
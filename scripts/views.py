@@ -0,0 +1,147 @@
+import threading
+import time
+from collections import Counter, OrderedDict
+
+# A viewer re-reading a post within DEDUP_WINDOW counts once. The web
+# server identifies viewers by address, so view counts are a lower bound
+# where many readers share one (NAT, proxies).
+DEDUP_WINDOW = 30 * 60
+FLUSH_INTERVAL = 5.0
+# Memory bounds: (viewer, post) pairs remembered for deduplication or kept
+# while the database is down, and posts with unflushed views before a
+# flush is forced early
+MAX_TRACKED_VIEWS = 100000
+MAX_PENDING_POSTS = 10000
+
+
+class ViewCounter:
+    """Deduplicated post view counts, written to the database in batches
+
+    ``flush`` is a manager's ``add_unique_views(views, window)``: in one
+    batched write it counts the (post_id, viewer, seen_at) views whose
+    viewer no server process saw on the post within the window, and
+    returns (post_id, category, views) for the posts that gained views.
+    ``counted`` is then called with those rows, e.g. to rank the posts.
+
+    Views are buffered in memory and flushed every ``interval`` seconds by
+    a daemon thread and on ``stop``. Each process also skips viewers it
+    already saw, so re-reads through it are not written at all. Counts it
+    serves include its own unflushed views, and other processes' views
+    once they have flushed them.
+    """
+
+    def __init__(self, flush, window=DEDUP_WINDOW, interval=FLUSH_INTERVAL,
+                 max_tracked=MAX_TRACKED_VIEWS, max_pending=MAX_PENDING_POSTS, counted=None):
+        self.flush_views = flush
+        self.counted = counted
+        self.window = window
+        self.interval = interval
+        self.max_tracked = max_tracked
+        self.max_pending = max_pending
+        self._seen = OrderedDict()  # (viewer, post_id) -> time, oldest first
+        self._views = []  # unflushed (post_id, viewer, seen_at)
+        self._pending = Counter()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, post_id, viewer):
+        """Buffer a view unless viewer saw the post through this process
+        within the window; returns whether it was buffered"""
+        key = (viewer, post_id)
+        now = time.monotonic()
+        with self._lock:
+            seen_at = self._seen.get(key)
+            if seen_at is not None and now - seen_at < self.window:
+                return False
+            self._seen[key] = now
+            self._seen.move_to_end(key)
+            self._expire(now)
+            self._views.append((post_id, viewer, time.time()))
+            self._pending[post_id] += 1
+            if len(self._pending) >= self.max_pending:
+                self._wakeup.set()
+        return True
+
+    def _expire(self, now):
+        seen = self._seen
+        while seen:
+            key, seen_at = next(iter(seen.items()))
+            if now - seen_at < self.window and len(seen) <= self.max_tracked:
+                return
+            seen.popitem(last=False)
+
+    def pending(self, post_id):
+        """Views of a post not yet written to the database"""
+        return self._pending.get(post_id, 0)
+
+    def overlay(self, posts):
+        """Rows with views_count including unflushed views; no query needed"""
+        pending = self._pending
+        if not pending:
+            return posts
+        return [post._replace(views_count=(post.views_count or 0) + pending[post.id])
+                if post.id in pending else post
+                for post in posts]
+
+    def flush(self):
+        """Write buffered views; returns how many posts gained views, or
+        None when the write failed and the views were kept for later"""
+        with self._flush_lock:
+            with self._lock:
+                if not self._views:
+                    return 0
+                views, self._views = self._views, []
+            try:
+                counted = self.flush_views(views, self.window)
+            except Exception as e:
+                with self._lock:
+                    # Keep at most max_tracked views while the database is down
+                    self._views[:0] = views
+                    dropped = len(self._views) - self.max_tracked
+                    if dropped > 0:
+                        self._discard(self._views[:dropped])
+                        del self._views[:dropped]
+                print(f"Warning: could not flush {len(views)} post views: {e}")
+                return None
+            # Subtract rather than clear: views recorded during the write stay
+            with self._lock:
+                self._discard(views)
+            if self.counted and counted:
+                self.counted(counted)
+            return len(counted)
+
+    def _discard(self, views):
+        for post_id, viewer, seen_at in views:
+            remaining = self._pending[post_id] - 1
+            if remaining > 0:
+                self._pending[post_id] = remaining
+            else:
+                del self._pending[post_id]
+
+    def start(self):
+        """Flush periodically in a background thread"""
+        if self._thread is None:
+            self._stop.clear()
+            self._wakeup.clear()
+            self._thread = threading.Thread(target=self._run, name='view-counter', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush what is left"""
+        if self._thread is not None:
+            self._stop.set()
+            self._wakeup.set()
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            if self.flush() is None:
+                # Database unavailable: back off instead of retrying per view
+                self._stop.wait(self.interval)
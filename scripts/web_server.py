@@ -1,40 +1,156 @@
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from concurrent.futures import ThreadPoolExecutor
+import argparse
 import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
 import urllib.parse
 from user_management import UserManager
 from forum_management import ForumManager
 from mentorship_management import MentorshipManager
+from query_registry import query_stats
+import rows
+from geo import normalize_location
+from author_snapshots import AuthorSnapshotPropagator
+from admission import DEFAULT_BUDGETS, AdmissionController, scale_budgets
+from trending import TrendingIndex
+from feeds import SEED_POSTS, FeedStore, reader_segments
+from views import ViewCounter
+import profiling
+from lazy_import import LazyModule
+
+# Uploads pull in multiprocessing; load them with the first upload or media request
+uploads = LazyModule('uploads')
+
+TRENDING_CHECKPOINT = 'trending_checkpoint.json'
+# Seconds a connection may sit idle or trickle a request before it is
+# closed, so keep-alive and slow clients cannot pin worker threads
+REQUEST_TIMEOUT = 10
+# Accepted connections allowed to wait for a worker thread; beyond this
+# they are answered 503 straight from the accept loop
+PENDING_CONNECTIONS = 64
+_overloaded_body = json.dumps({"success": False, "message": "Server is overloaded"}).encode()
+OVERLOADED_RESPONSE = (b'HTTP/1.1 503 Service Unavailable\r\n'
+                       b'Content-Type: application/json\r\n'
+                       b'Retry-After: 1\r\n'
+                       b'Connection: close\r\n'
+                       b'Content-Length: %d\r\n\r\n' % len(_overloaded_body)) + _overloaded_body
+
+# Shared by every request so profile changes reach posts and comments in
+# the background
+author_snapshots = AuthorSnapshotPropagator(UserManager().sync_author_snapshot)
 
 class FarmConnectHandler(BaseHTTPRequestHandler):
+    timeout = REQUEST_TIMEOUT
+    
     def __init__(self, *args, **kwargs):
-        self.user_manager = UserManager()
+        self.user_manager = UserManager(author_snapshots=author_snapshots)
         self.forum_manager = ForumManager()
         self.mentorship_manager = MentorshipManager()
         super().__init__(*args, **kwargs)
     
     def do_GET(self):
         """Handle GET requests"""
-        if self.path == '/api/posts':
+        url = urllib.parse.urlsplit(self.path)
+        self.query = urllib.parse.parse_qs(url.query)
+        
+        if url.path.startswith('/media/'):
+            route = 'media'
+        elif 'near' in self.query or 'lat' in self.query:
+            route = 'search'
+        else:
+            route = 'read'
+        admission = self.admit(route)
+        if admission is None:
+            return
+        try:
+            self.profiled('GET', url.path, self.route_get, url.path)
+        finally:
+            admission.release()
+    
+    def do_POST(self):
+        """Handle POST requests"""
+        route = {'/signup': 'signup', '/signin': 'signin', '/api/upload': 'upload'}.get(self.path, 'write')
+        admission = self.admit(route)
+        if admission is None:
+            return
+        try:
+            self.profiled('POST', self.path, self.route_post)
+        finally:
+            admission.release()
+    
+    def admit(self, route):
+        """Run admission control for this request
+        
+        Returns the Admission to release when done, or None after answering
+        429/503 with Retry-After because the request was shed.
+        """
+        admission = self.server.admission.admit(self.client_address[0], route)
+        if admission.admitted:
+            return admission
+        self.close_connection = True
+        self.send_json_response(
+            {"success": False, "message": admission.message},
+            status=admission.status,
+            headers={'Retry-After': str(admission.retry_after)}
+        )
+        return None
+    
+    def profiled(self, method, path, handler, *args):
+        """Call handler(*args), under the profiler when this request is sampled"""
+        profiler = self.server.profiler
+        profiler.refresh()
+        if profiler.active and profiler.should_profile(self.headers):
+            profiler.run(profiling.route_key(method, path), handler, *args)
+        else:
+            handler(*args)
+    
+    def route_get(self, path):
+        """Dispatch an admitted GET request"""
+        if path == '/api/posts':
             self.handle_get_posts()
-        elif self.path.startswith('/api/mentors'):
+        elif path == '/api/feed':
+            self.handle_get_feed()
+        elif path.startswith('/api/posts/'):
+            self.handle_get_post(path[len('/api/posts/'):])
+        elif path == '/api/mentors':
             self.handle_get_mentors()
+        elif path == '/metrics':
+            self.handle_metrics()
+        elif path == '/admin/profiling':
+            self.handle_profiling()
+        elif path.startswith('/media/'):
+            self.handle_media(path[len('/media/'):])
         else:
             self.send_error(404, "Not Found")
     
-    def do_POST(self):
-        """Handle POST requests"""
+    def route_post(self):
+        """Dispatch an admitted POST request"""
         if self.path == '/signup':
             self.handle_signup()
         elif self.path == '/signin':
             self.handle_signin()
+        elif self.path == '/api/profile':
+            self.handle_update_profile()
         elif self.path == '/api/posts':
             self.handle_create_post()
         elif self.path == '/api/like':
             self.handle_like_post()
         elif self.path == '/api/comment':
             self.handle_add_comment()
+        elif self.path == '/api/upload':
+            self.handle_upload()
+        elif self.path == '/admin/profiling':
+            self.handle_profiling()
         elif self.path == '/api/mentorship/request':
             self.handle_mentorship_request()
+        elif self.path == '/api/subscriptions':
+            self.handle_subscription()
         else:
             self.send_error(404, "Not Found")
     
@@ -81,11 +197,113 @@ class FarmConnectHandler(BaseHTTPRequestHandler):
         except Exception as e:
             self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
     
+    def handle_update_profile(self):
+        """Handle updating a user's display name or experience"""
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        
+        try:
+            data = json.loads(post_data.decode('utf-8'))
+            
+            result = self.user_manager.update_profile(
+                data['user_id'],
+                data.get('full_name'),
+                data.get('farming_experience')
+            )
+            
+            self.send_json_response(result)
+            
+        except Exception as e:
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def query_param(self, name, convert=str, default=None):
+        """Get a single query-string parameter"""
+        values = self.query.get(name)
+        if not values or values[0] == '':
+            return default
+        return convert(values[0])
+    
+    def search_point(self):
+        """Get the (lat, lon) to search around from ?lat=&lon= or ?near=
+        
+        Returns None when the request is not a location search.
+        """
+        lat = self.query_param('lat', float)
+        lon = self.query_param('lon', float)
+        if lat is not None and lon is not None:
+            return lat, lon
+        near = self.query_param('near')
+        if near is None:
+            return None
+        coordinates = normalize_location(near)
+        if coordinates is None:
+            raise ValueError(f"Unknown location: {near}")
+        return coordinates
+    
     def handle_get_posts(self):
         """Handle getting forum posts"""
         try:
-            posts = self.forum_manager.get_posts()
+            category = self.query_param('category')
+            limit = max(1, min(self.query_param('limit', int, 20), 100))
+            offset = self.query_param('offset', int, 0)
+            if offset < 0:
+                raise ValueError("offset must not be negative")
+            point = self.search_point()
+            
+            if self.query_param('sort') == 'hot':
+                # Ranked in memory; the database only hydrates the page
+                post_ids = self.server.trending.top(category, limit, offset)
+                posts = self.forum_manager.get_posts_by_ids(post_ids)
+            elif point:
+                posts = self.forum_manager.get_posts_near(
+                    point[0], point[1], self.query_param('radius_km', float, 100),
+                    category, limit, offset
+                )
+            else:
+                posts = self.forum_manager.get_posts(category, limit, offset)
+            if posts['success']:
+                posts['posts'] = self.server.views.overlay(posts['posts'])
             self.send_json_response(posts)
+        except ValueError as e:
+            self.send_json_response({"success": False, "message": str(e)}, status=400)
+        except Exception as e:
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def handle_get_feed(self):
+        """Handle a user's home feed, paged with ?before=<last post id>"""
+        try:
+            limit = max(1, min(self.query_param('limit', int, 20), 100))
+            before = self.query_param('before', int)
+            user_id = self.query_param('user_id', int)
+            member = user_id is not None and self.forum_manager.get_feed_member(user_id)
+            segments = reader_segments(*member) if member else reader_segments(None, None, None, [])
+            
+            post_ids = self.server.feeds.page(segments, limit, before)
+            posts = self.forum_manager.get_posts_by_ids(post_ids)
+            posts['posts'] = self.server.views.overlay(posts['posts'])
+            posts['next_before'] = post_ids[-1] if len(post_ids) == limit else None
+            self.send_json_response(posts)
+        except ValueError as e:
+            self.send_json_response({"success": False, "message": str(e)}, status=400)
+        except Exception as e:
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def handle_get_post(self, post_id):
+        """Handle reading one post, counting the view"""
+        try:
+            result = self.forum_manager.get_post(int(post_id))
+            if result['success']:
+                post = result['post']
+                # Deduplicated by the connection's address: the user_id
+                # parameter is the client's word and would let anyone inflate
+                # counts. Readers behind one address count once per window.
+                self.server.views.record(post.id, self.client_address[0])
+                result['post'], = self.server.views.overlay([post])
+                self.send_json_response(result)
+            else:
+                self.send_json_response(result, status=404)
+        except ValueError:
+            self.send_error(404, "Not Found")
         except Exception as e:
             self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
     
@@ -103,6 +321,10 @@ class FarmConnectHandler(BaseHTTPRequestHandler):
                 data['content'],
                 data['category']
             )
+            if result['success']:
+                self.server.trending.record(result['post_id'], 'post', data['category'])
+                # Fanned out to the home feeds by the catch-up thread
+                self.server.feeds.notify()
             
             self.send_json_response(result)
             
@@ -121,6 +343,150 @@ class FarmConnectHandler(BaseHTTPRequestHandler):
                 data['user_id'],
                 data['post_id']
             )
+            if result['success']:
+                if result['action'] == 'liked':
+                    self.server.trending.record(data['post_id'], 'like', result['category'])
+                else:
+                    # Takes back the like's weight as of when it was made
+                    self.server.trending.record(data['post_id'], 'unlike', result['category'],
+                                                at=result['liked_at'])
+            
+            self.send_json_response(result)
+            
+        except Exception as e:
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def handle_add_comment(self):
+        """Handle commenting on a post"""
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        
+        try:
+            data = json.loads(post_data.decode('utf-8'))
+            
+            result = self.forum_manager.add_comment(
+                data['user_id'],
+                data['post_id'],
+                data['content']
+            )
+            if result['success']:
+                self.server.trending.record(data['post_id'], 'comment', result['category'])
+            
+            self.send_json_response(result)
+            
+        except Exception as e:
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def handle_upload(self):
+        """Handle a multipart image upload
+        
+        Fields: user_id, an optional post_id, and the image as ``file``. The
+        image becomes the post's image when post_id is given, otherwise the
+        user's profile image. The body is streamed to disk, never held in
+        memory, and variants are generated after the response is sent.
+        """
+        media = self.server.media
+        # Set while the stored file is not attached to anything yet
+        orphan = None
+        try:
+            reader = uploads.MultipartReader.from_headers(self.rfile, self.headers)
+            fields = {}
+            for part, body in reader.parts():
+                if part.get('name') == 'file' and 'filename' in part:
+                    if orphan is not None:
+                        raise uploads.UploadError(400, "Only one file per upload")
+                    orphan = media.save(body)
+                else:
+                    fields[part.get('name')] = uploads.read_field(body)
+            if orphan is None:
+                raise uploads.UploadError(400, "No file uploaded")
+            try:
+                user_id = int(fields['user_id'])
+                post_id = int(fields['post_id']) if fields.get('post_id') else None
+            except (KeyError, ValueError):
+                raise uploads.UploadError(400, "user_id and post_id must be integers")
+            
+            images = media.urls(orphan)
+            if post_id is not None:
+                result = self.forum_manager.set_post_image(user_id, post_id, images['original'])
+            else:
+                result = self.user_manager.set_profile_image(user_id, images['original'])
+            if not result['success']:
+                media.discard(orphan)
+                self.send_json_response(result, status=404)
+                return
+            stored, orphan = orphan, None
+            media.generate_variants(stored)
+            result['images'] = images
+            self.send_json_response(result)
+            
+        except uploads.UploadError as e:
+            if orphan is not None:
+                media.discard(orphan)
+            # The rest of the body may be unread, so the connection cannot be reused
+            self.close_connection = True
+            self.send_json_response({"success": False, "message": e.message}, status=e.status)
+        except Exception as e:
+            if orphan is not None:
+                media.discard(orphan)
+            self.close_connection = True
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def handle_media(self, name):
+        """Serve an uploaded image; names are content hashes, so never stale"""
+        opened = self.server.media.open(name)
+        if opened is None:
+            self.send_error(404, "Not Found")
+            return
+        
+        f, content_type = opened
+        with f:
+            etag = f'"{name}"'
+            if self.headers.get('If-None-Match') == etag:
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', uploads.CACHE_CONTROL)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(os.fstat(f.fileno()).st_size))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', uploads.CACHE_CONTROL)
+            self.end_headers()
+            self.connection.sendfile(f)
+    
+    def handle_mentorship_request(self):
+        """Handle requesting mentorship from a mentor"""
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        
+        try:
+            data = json.loads(post_data.decode('utf-8'))
+            
+            result = self.mentorship_manager.request_mentorship(
+                data['mentee_id'],
+                data['mentor_id']
+            )
+            
+            self.send_json_response(result)
+            
+        except Exception as e:
+            self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
+    
+    def handle_subscription(self):
+        """Handle following or unfollowing a forum category"""
+        content_length = int(self.headers['Content-Length'])
+        post_data = self.rfile.read(content_length)
+        
+        try:
+            data = json.loads(post_data.decode('utf-8'))
+            
+            result = self.forum_manager.set_subscription(
+                data['user_id'],
+                data['category'],
+                data.get('subscribed', True)
+            )
             
             self.send_json_response(result)
             
@@ -130,32 +496,310 @@ class FarmConnectHandler(BaseHTTPRequestHandler):
     def handle_get_mentors(self):
         """Handle getting available mentors"""
         try:
-            mentors = self.mentorship_manager.get_available_mentors()
+            specialty = self.query_param('specialty')
+            point = self.search_point()
+            
+            if point:
+                mentors = self.mentorship_manager.get_mentors_near(
+                    point[0], point[1],
+                    radius_km=self.query_param('radius_km', float),
+                    k=self.query_param('k', int, None if 'radius_km' in self.query else 10),
+                    specialty=specialty
+                )
+            else:
+                mentors = self.mentorship_manager.get_available_mentors(specialty)
             self.send_json_response(mentors)
         except Exception as e:
             self.send_json_response({"success": False, "message": f"Server error: {str(e)}"})
     
-    def send_json_response(self, data):
+    def handle_metrics(self):
+        """Handle reporting per-query counters
+        
+        Under the prefork supervisor the counters are summed over every
+        worker, with each worker's own figures listed under "workers".
+        """
+        stats = self.server.worker_stats
+        if stats is None:
+            self.send_json_response({"success": True, **self.server.metrics()})
+            return
+        
+        from prefork import aggregate_stats
+        stats.write()
+        aggregated = aggregate_stats(stats.stats_dir)
+        self.send_json_response({"success": True, **aggregated["totals"],
+                                 "workers": aggregated["workers"]})
+    
+    def handle_profiling(self):
+        """Handle showing (GET) or changing (POST) the profiler settings
+        
+        Requires the X-Admin-Token header to match FARMCONNECT_ADMIN_TOKEN.
+        A POST takes JSON with any of "enabled", "sample_rate" and "mode"
+        ("cprofile" or "sample"). Both write out the profiles collected so far.
+        """
+        profiler = self.server.profiler
+        if not profiler.is_authorized(self.headers.get(profiling.ADMIN_HEADER)):
+            self.send_json_response({"success": False, "message": "Forbidden"}, status=403)
+            return
+        
+        try:
+            if self.command == 'POST':
+                content_length = int(self.headers['Content-Length'])
+                data = json.loads(self.rfile.read(content_length).decode('utf-8'))
+                profiler.configure(data.get('enabled'), data.get('sample_rate'), data.get('mode'))
+            files = profiler.flush()
+            self.send_json_response({"success": True, "profiling": profiler.settings(),
+                                     "output_dir": profiler.output_dir, "written": files})
+        except ValueError as e:
+            self.send_json_response({"success": False, "message": str(e)}, status=400)
+    
+    def send_json_response(self, data, status=200, headers=None):
         """Send JSON response"""
-        self.send_response(200)
+        self.send_response(status)
         self.send_header('Content-type', 'application/json')
         self.send_header('Access-Control-Allow-Origin', '*')
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
         self.end_headers()
-        self.wfile.write(json.dumps(data).encode('utf-8'))
+        self.wfile.write(rows.dumps(data).encode('utf-8'))
 
-def run_server(port=8000):
-    """Run the web server"""
+class FarmConnectServer(ThreadingMixIn, HTTPServer):
+    """HTTP server handling requests on a fixed pool of worker threads
+    
+    Long-lived workers keep their per-thread database connections and
+    statement caches. The pool is sized so that requests beyond the
+    admission controller's in-flight cap and queue still get a thread
+    quickly, only to be answered with a fast 429/503. Connections time out
+    after REQUEST_TIMEOUT seconds of silence, and at most
+    ``pending_connections`` wait for a thread; the rest get a 503 without
+    reading their request.
+    """
+    daemon_threads = True
+    request_queue_size = 128
+    
+    def __init__(self, server_address, handler_class, admission=None, trending=None, media=None,
+                 profiler=None, views=None, feeds=None, sock=None, reuse_port=False,
+                 pending_connections=PENDING_CONNECTIONS):
+        """sock is an already listening socket to serve on instead of
+        binding server_address; reuse_port binds with SO_REUSEPORT"""
+        self.admission = admission or AdmissionController()
+        self.trending = trending or TrendingIndex()
+        self._media = media
+        self._media_lock = threading.Lock()
+        self.views = views or ViewCounter(ForumManager().add_unique_views, counted=self.rank_views)
+        self.feeds = feeds or FeedStore(ForumManager().get_feed_posts)
+        self.profiler = profiler or profiling.RequestProfiler(token=os.environ.get('FARMCONNECT_ADMIN_TOKEN'))
+        self.reuse_port = reuse_port
+        self.worker_stats = None
+        workers = self.admission.max_in_flight + self.admission.queue_size + 8
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='farmconnect')
+        self.connection_slots = threading.BoundedSemaphore(workers + pending_connections)
+        self.overloaded = 0
+        super().__init__(server_address, handler_class, bind_and_activate=sock is None)
+        if sock is not None:
+            self.socket.close()
+            self.socket = sock
+            self.server_address = sock.getsockname()
+            self.server_name, self.server_port = self.server_address[:2]
+    
+    def server_bind(self):
+        if self.reuse_port:
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        super().server_bind()
+    
+    @property
+    def media(self):
+        """The upload store, created on first use"""
+        with self._media_lock:
+            if self._media is None:
+                self._media = uploads.MediaStore()
+            return self._media
+    
+    def rank_views(self, counted):
+        """Add views the database counted, as (post_id, category, views), to trending"""
+        for post_id, category, views in counted:
+            self.trending.record(post_id, 'view', category, count=views)
+    
+    def metrics(self):
+        """This process's counters for /metrics"""
+        return {
+            "pid": os.getpid(),
+            "queries": query_stats(),
+            "admission": self.admission.snapshot(),
+            "overloaded_connections": self.overloaded
+        }
+    
+    def process_request(self, request, client_address):
+        if not self.connection_slots.acquire(blocking=False):
+            self.overloaded += 1
+            self.reject_request(request)
+            return
+        self.pool.submit(self.serve_connection, request, client_address)
+    
+    def serve_connection(self, request, client_address):
+        try:
+            self.process_request_thread(request, client_address)
+        finally:
+            self.connection_slots.release()
+    
+    def reject_request(self, request):
+        """Answer 503 on a connection no worker can take"""
+        try:
+            request.settimeout(0)
+            request.send(OVERLOADED_RESPONSE)
+        except OSError:
+            pass
+        self.shutdown_request(request)
+    
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=True)
+        if self._media is not None:
+            self._media.shutdown()
+        self.views.stop()
+        self.profiler.flush()
+
+def run_server(port=8000, backup_interval=None, workers=1):
+    """Run the web server, snapshotting the database every backup_interval seconds
+    
+    With workers > 1, pre-forks that many server processes under a
+    supervisor (see prefork.py) so CPU-bound work uses several cores.
+    Workers keep no state of their own that a reader could notice: trending
+    rankings and view deduplication are shared through the database, and
+    a worker's interactions reach the others within about a second.
+    """
+    if workers <= 1:
+        serve(port, backup_interval)
+        return
+    from prefork import Supervisor
+    Supervisor(lambda worker: serve(port, backup_interval, worker), port, workers).run()
+
+def serve(port, backup_interval=None, worker=None):
+    """Serve until SIGTERM, as the only server process or as a prefork worker
+    
+    Everything here, database connections included, is created in the
+    serving process itself, after any fork.
+    """
     server_address = ('', port)
-    httpd = HTTPServer(server_address, FarmConnectHandler)
-    print(f"FarmConnect server running on port {port}")
-    print(f"Visit http://localhost:{port} to access the website")
-    httpd.serve_forever()
+    # Process-wide duties run once, in the first worker. Workers share
+    # trending interactions through the database's event log and all apply
+    # it in the same order, so they rank alike; view deduplication is
+    # shared through the database as well (see ViewCounter).
+    primary = worker is None or worker.index == 0
+    
+    forum_manager = ForumManager()
+    trending = TrendingIndex(checkpoint_path=TRENDING_CHECKPOINT if primary else None,
+                             publish=forum_manager.add_trending_events,
+                             fetch_since=forum_manager.get_trending_events,
+                             prune=forum_manager.prune_trending_events if primary else None)
+    feeds = FeedStore(forum_manager.get_feed_posts)
+    
+    # Rankings and feed timelines are warmed in their own threads, so the
+    # socket accepts as soon as it is bound
+    def warm_trending():
+        # Last checkpoint, the events logged since, and any recent posts it
+        # does not know
+        trending.load(TRENDING_CHECKPOINT)
+        if trending.last_event is None:
+            trending.last_event = forum_manager.get_last_trending_event()
+        trending.seed(forum_manager.get_posts_for_ranking())
+    
+    def warm_feeds():
+        # Recent posts now, newer ones as they commit
+        feeds.seed(forum_manager.get_feed_posts(limit=SEED_POSTS))
+    
+    admission = None
+    if worker:
+        admission = AdmissionController(scale_budgets(DEFAULT_BUDGETS, 1 / worker.count))
+    httpd = FarmConnectServer(server_address, FarmConnectHandler, admission=admission,
+                              trending=trending, feeds=feeds, sock=worker and worker.socket,
+                              reuse_port=bool(worker and worker.reuse_port))
+    # Shut down from another thread: shutdown() waits for serve_forever()
+    signal.signal(signal.SIGTERM,
+                  lambda signum, frame: threading.Thread(target=httpd.shutdown, daemon=True).start())
+    
+    author_snapshots.start()
+    trending.start(warm=warm_trending)
+    feeds.start(warm=warm_feeds)
+    httpd.views.start()
+    scheduler = None
+    if backup_interval and primary:
+        from backup import SnapshotScheduler
+        scheduler = SnapshotScheduler(interval=backup_interval)
+        scheduler.start()
+    stats = None
+    if worker:
+        from prefork import WorkerStats
+        stats = httpd.worker_stats = WorkerStats(worker.stats_dir, httpd.metrics)
+        stats.write()
+        stats.start()
+        print(f"FarmConnect worker {worker.index} (pid {os.getpid()}) running on port {port}")
+    else:
+        print(f"FarmConnect server running on port {port}")
+        print(f"Visit http://localhost:{port} to access the website")
+    try:
+        httpd.serve_forever()
+    finally:
+        if stats:
+            stats.stop()
+        if scheduler:
+            scheduler.stop()
+        httpd.server_close()
+        feeds.stop()
+        trending.stop()
+        author_snapshots.stop()
+
+def benchmark_startup(port=8765, runs=5):
+    """Time from process launch to the first served /api/posts request"""
+    import subprocess
+    import urllib.request
+    from migrations import migrate
+    migrate()
+    
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--port', str(port)],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            while True:
+                try:
+                    urllib.request.urlopen(f'http://127.0.0.1:{port}/api/posts', timeout=1).read()
+                    break
+                except OSError:
+                    if server.poll() is not None:
+                        raise RuntimeError("Server exited during startup benchmark")
+                    time.sleep(0.002)
+            timings.append(time.perf_counter() - started)
+        finally:
+            server.terminate()
+            server.wait()
+    
+    timings.sort()
+    print(f"Cold start to first request: median {timings[len(timings) // 2] * 1000:.1f} ms, "
+          f"best {timings[0] * 1000:.1f} ms over {runs} runs")
 
 if __name__ == "__main__":
-    # Initialize database first
-    from database_setup import create_database, seed_sample_data
-    create_database()
-    seed_sample_data()
+    parser = argparse.ArgumentParser(description="FarmConnect web server")
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--seed', action='store_true', help="add sample data to an empty database")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="pre-fork this many server processes (see prefork.py)")
+    parser.add_argument('--backup-every', type=float, metavar='MINUTES',
+                        help="take a database snapshot every MINUTES (see backup.py)")
+    parser.add_argument('--benchmark-startup', action='store_true',
+                        help="measure cold start to first served request")
+    args = parser.parse_args()
+    
+    if args.benchmark_startup:
+        benchmark_startup()
+        sys.exit(0)
+    
+    # Bring the schema up to date; a single version check when it is current
+    from migrations import migrate
+    migrate()
+    if args.seed:
+        from database_setup import seed_sample_data
+        seed_sample_data()
     
     # Start the server
-    run_server()
+    run_server(args.port, args.backup_every and args.backup_every * 60, args.workers)